@@ -0,0 +1,375 @@
+"""
+Columnar analytics snapshots
+build_snapshot() pages through every ticket (ordered by created_at) and
+writes one flat binary file per column: timestamps as float64 Unix seconds
+(NaN when missing), status/priority/category/assignee as small integer codes
+into per-snapshot category lists. Reports memory-map the current snapshot and
+compute everything with NumPy group-bys (bincount over codes, one sort for
+percentiles), so a report over millions of tickets reads no documents and
+runs no per-ticket Python. Snapshots are rebuilt by
+`manage.py build_analytics_snapshot` (e.g. hourly from cron); reports are as
+fresh as the last build.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .export import iter_ticket_pages
+from .models import Priority, Status
+
+ANALYTICS_DIR = os.environ.get(
+    'ANALYTICS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analytics'))
+KEEP_SNAPSHOTS = 2
+PAGE_SIZE = 1000
+FORMAT_VERSION = 1
+
+# Column -> dtype; categorical columns hold codes into meta['categories'][column]
+COLUMNS = {
+    'created_at': 'f8',
+    'resolved_at': 'f8',
+    'closed_at': 'f8',
+    'sla_deadline': 'f8',
+    'status': 'u1',
+    'priority': 'u1',
+    'category': 'u2',
+    'agent': 'u4',
+    'rating': 'i1',
+    'reopen_count': 'i2',
+}
+TIMESTAMPS = ('created_at', 'resolved_at', 'closed_at', 'sla_deadline')
+# Categorical column -> ticket field
+CATEGORICAL = {'status': 'status', 'priority': 'priority', 'category': 'category', 'agent': 'assigned_to'}
+GROUPINGS = ('status', 'priority', 'category', 'agent')
+
+PERCENTILES = (50, 90, 95, 99)
+DAY = 86400
+WEEK = 7 * DAY
+# 1970-01-05 was the first Monday after the epoch; weeks start on Mondays
+WEEK_ORIGIN = 4 * DAY
+DEFAULT_WEEKS = 12
+MAX_WEEKS = 104
+
+
+class SnapshotMissing(Exception):
+    pass
+
+
+# -- building ---------------------------------------------------------------
+
+class CategoryCodes:
+    """value -> code, assigned in first-seen order after any fixed values"""
+
+    def __init__(self, dtype, fixed=()):
+        self.limit = np.iinfo(dtype).max + 1
+        self.values = []
+        self.codes = {}
+        for value in fixed:
+            self.code(value)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            if code >= self.limit:
+                raise ValueError(f'Too many distinct values for a {self.limit}-code column')
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+def epoch(value):
+    return value.timestamp() if hasattr(value, 'timestamp') else np.nan
+
+
+def build_snapshot(directory=None, page_size=PAGE_SIZE):
+    """Write a new snapshot of all tickets and make it current; returns its meta"""
+    root = directory or ANALYTICS_DIR
+    os.makedirs(root, exist_ok=True)
+    started = time.time()
+    name = 'snapshot-' + datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    building = os.path.join(root, '.' + name)
+    os.makedirs(building)
+
+    codes = {
+        'status': CategoryCodes('u1', [member.value for member in Status]),
+        'priority': CategoryCodes('u1', [member.value for member in Priority]),
+        'category': CategoryCodes('u2'),
+        'agent': CategoryCodes('u4'),
+    }
+    files = {column: open(os.path.join(building, f'{column}.bin'), 'wb') for column in COLUMNS}
+    rows = 0
+    try:
+        # One page of tickets at a time: memory stays at one page plus the category lists
+        for page in iter_ticket_pages(page_size=page_size):
+            tickets = [ticket for _, ticket in page]
+            for column in TIMESTAMPS:
+                values = [epoch(ticket.get(column)) for ticket in tickets]
+                np.array(values, dtype=COLUMNS[column]).tofile(files[column])
+            for column, field in CATEGORICAL.items():
+                encode = codes[column].code
+                np.array([encode(ticket.get(field)) for ticket in tickets], dtype=COLUMNS[column]).tofile(files[column])
+            np.array([ticket.get('rating') or 0 for ticket in tickets], dtype=COLUMNS['rating']).tofile(files['rating'])
+            np.array([ticket.get('reopen_count') or 0 for ticket in tickets],
+                     dtype=COLUMNS['reopen_count']).tofile(files['reopen_count'])
+            rows += len(tickets)
+    except BaseException:
+        for f in files.values():
+            f.close()
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    for f in files.values():
+        f.close()
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'name': name,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'rows': rows,
+        'columns': COLUMNS,
+        'categories': {column: encoder.values for column, encoder in codes.items()},
+        'build_seconds': round(time.time() - started, 3),
+    }
+    with open(os.path.join(building, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    path = os.path.join(root, name)
+    os.replace(building, path)
+    # Readers follow CURRENT; replacing it is atomic
+    pointer = os.path.join(root, '.CURRENT.tmp')
+    with open(pointer, 'w') as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(root, 'CURRENT'))
+    prune(root, keep=name)
+    return meta
+
+
+def prune(root, keep):
+    """Remove all but the KEEP_SNAPSHOTS newest snapshots (processes still mapping one keep their pages)"""
+    names = sorted(entry for entry in os.listdir(root) if entry.startswith('snapshot-'))
+    for name in names[:-KEEP_SNAPSHOTS]:
+        if name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+# -- reading ----------------------------------------------------------------
+
+class Snapshot:
+    """A snapshot's columns as read-only memory maps"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.rows = self.meta['rows']
+        self.categories = self.meta['categories']
+        self.columns = {}
+        for column, dtype in self.meta['columns'].items():
+            if self.rows:
+                self.columns[column] = np.memmap(os.path.join(path, f'{column}.bin'), dtype=dtype, mode='r',
+                                                 shape=(self.rows,))
+            else:
+                self.columns[column] = np.zeros(0, dtype=dtype)
+
+    def window(self, date_from=None, date_to=None):
+        """Columns for tickets created in [date_from, date_to): a slice, since rows are in created_at order"""
+        created = self.columns['created_at']
+        start = 0 if date_from is None else int(np.searchsorted(created, date_from.timestamp(), 'left'))
+        end = self.rows if date_to is None else int(np.searchsorted(created, date_to.timestamp(), 'left'))
+        return {column: values[start:end] for column, values in self.columns.items()}
+
+
+_current = {'name': None, 'snapshot': None}
+_current_lock = threading.Lock()
+
+
+def current_snapshot(directory=None):
+    """The snapshot CURRENT points at, opened once per process and reopened after a rebuild"""
+    root = directory or ANALYTICS_DIR
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        raise SnapshotMissing('No analytics snapshot yet; run manage.py build_analytics_snapshot')
+    with _current_lock:
+        if _current['name'] != (root, name):
+            _current['snapshot'] = Snapshot(os.path.join(root, name))
+            _current['name'] = (root, name)
+        return _current['snapshot']
+
+
+# -- vectorized group-bys ---------------------------------------------------
+
+def group_percentiles(codes, values, n_groups, percentiles=PERCENTILES):
+    """
+    (counts, means, percentiles[n_groups, len(percentiles)]) of values per
+    code, ignoring NaN. Values are offset by code * span so one plain sort
+    orders them by (code, value); every group's percentile positions are
+    then indexed at once (linear interpolation, as np.percentile does).
+    """
+    keep = ~np.isnan(values)
+    codes, values = codes[keep], values[keep]
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=values, minlength=n_groups)
+    present = counts > 0
+    result = np.full((n_groups, len(percentiles)), np.nan)
+    if values.size:
+        low = values.min()
+        span = values.max() - low + 1.0
+        keyed = np.sort(codes * span + (values - low))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        offsets = np.arange(n_groups) * span - low
+        last = keyed.size - 1
+        for j, q in enumerate(percentiles):
+            position = starts + (counts - 1) * (q / 100.0)
+            below = np.clip(np.floor(position).astype(np.int64), 0, last)
+            above = np.clip(np.ceil(position).astype(np.int64), 0, last)
+            value_below = keyed[below] - offsets
+            value_above = keyed[above] - offsets
+            interpolated = value_below + (value_above - value_below) * (position - np.floor(position))
+            result[present, j] = interpolated[present]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(present, sums / np.maximum(counts, 1), np.nan)
+    return counts, means, result
+
+
+def week_index(seconds):
+    return np.floor((seconds - WEEK_ORIGIN) / WEEK).astype(np.int64)
+
+
+def week_start(index):
+    return datetime.fromtimestamp(int(index) * WEEK + WEEK_ORIGIN, timezone.utc).date().isoformat()
+
+
+def _group(frame, categories, by):
+    """(codes, labels) for a grouping column, or one group for the whole window"""
+    if by is None:
+        return np.zeros(len(frame['created_at']), dtype=np.uint8), ['all']
+    return frame[by], categories[by]
+
+
+def _number(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+# -- reports ----------------------------------------------------------------
+
+def resolution_report(frame, categories, by=None, percentiles=PERCENTILES):
+    """Resolution time (hours from creation to resolution) per group: count, mean and percentiles"""
+    codes, labels = _group(frame, categories, by)
+    hours = (frame['resolved_at'] - frame['created_at']) / 3600.0
+    counts, means, values = group_percentiles(codes, hours, len(labels), percentiles)
+    rows = []
+    for code in np.flatnonzero(counts):
+        row = {by or 'group': labels[code], 'resolved': int(counts[code]), 'mean_hours': _number(means[code])}
+        for j, q in enumerate(percentiles):
+            row[f'p{q}_hours'] = _number(values[code, j])
+        rows.append(row)
+    rows.sort(key=lambda row: -row['resolved'])
+    return rows
+
+
+def sla_report(frame, categories, by='category', now=None):
+    """
+    SLA compliance per creation week and group. A ticket met its SLA if it
+    was resolved by its deadline and breached it if resolved later or still
+    unresolved past it; unresolved tickets inside their deadline don't count.
+    """
+    now = time.time() if now is None else now
+    codes, labels = _group(frame, categories, by)
+    deadline, resolved_at = frame['sla_deadline'], frame['resolved_at']
+    resolved = ~np.isnan(resolved_at)
+    has_deadline = ~np.isnan(deadline)
+    with np.errstate(invalid='ignore'):
+        met = has_deadline & resolved & (resolved_at <= deadline)
+        breached = has_deadline & ((resolved & (resolved_at > deadline)) | (~resolved & (deadline < now)))
+    decided = met | breached
+    if not decided.any():
+        return []
+    weeks = week_index(frame['created_at'][decided])
+    first_week = int(weeks.min())
+    n_groups = len(labels)
+    keys = (weeks - first_week) * n_groups + codes[decided]
+    size = int(keys.max()) + 1
+    totals = np.bincount(keys, minlength=size)
+    met_counts = np.bincount(keys, weights=met[decided], minlength=size).astype(np.int64)
+    # Rows built from plain lists: per-element NumPy scalars would dominate at thousands of groups
+    present = np.flatnonzero(totals)
+    week_labels = [week_start(first_week + week) for week in range(size // n_groups + 1)]
+    compliance = np.round(100.0 * met_counts[present] / totals[present], 1)
+    rows = []
+    group = by or 'group'
+    for key, total, on_time, percent in zip(present.tolist(), totals[present].tolist(),
+                                            met_counts[present].tolist(), compliance.tolist()):
+        week, code = divmod(key, n_groups)
+        rows.append({
+            'week': week_labels[week],
+            group: labels[code],
+            'tickets': total,
+            'met': on_time,
+            'breached': total - on_time,
+            'compliance': percent,
+        })
+    return rows
+
+
+def throughput_report(frame, categories, weeks=DEFAULT_WEEKS, now=None):
+    """
+    Tickets resolved per assignee per week over the last `weeks` weeks
+    (oldest first), with a least-squares trend in tickets/week per week
+    """
+    now = time.time() if now is None else now
+    labels = categories['agent']
+    last_week = int(week_index(np.array([now]))[0])
+    first_week = last_week - weeks + 1
+    resolved_at = frame['resolved_at']
+    with np.errstate(invalid='ignore'):
+        in_range = ((resolved_at >= first_week * WEEK + WEEK_ORIGIN)
+                    & (resolved_at < (last_week + 1) * WEEK + WEEK_ORIGIN))
+    resolved_week = week_index(resolved_at[in_range]) - first_week
+    agents = frame['agent'][in_range].astype(np.int64)
+    counts = np.bincount(agents * weeks + resolved_week, minlength=len(labels) * weeks).reshape(len(labels), weeks)
+
+    # Slope of each agent's weekly counts, all agents at once
+    x = np.arange(weeks) - (weeks - 1) / 2.0
+    slopes = counts @ x / max(float(x @ x), 1.0)
+    totals = counts.sum(axis=1)
+    rows = []
+    for code in np.flatnonzero(totals):
+        if labels[code] is None:
+            continue
+        rows.append({
+            'agent': labels[code],
+            'resolved': int(totals[code]),
+            'weekly': counts[code].tolist(),
+            'trend': round(float(slopes[code]), 3),
+        })
+    rows.sort(key=lambda row: -row['resolved'])
+    return {'weeks': [week_start(first_week + i) for i in range(weeks)], 'agents': rows}
+
+
+REPORTS = ('resolution', 'sla', 'throughput')
+
+
+def run_report(report, date_from=None, date_to=None, by=None, weeks=DEFAULT_WEEKS, snapshot=None):
+    """{'snapshot', 'report', 'rows'} for a report over tickets created in [date_from, date_to)"""
+    snapshot = snapshot or current_snapshot()
+    frame = snapshot.window(date_from, date_to)
+    if report == 'resolution':
+        rows = resolution_report(frame, snapshot.categories, by)
+    elif report == 'sla':
+        rows = sla_report(frame, snapshot.categories, by)
+    elif report == 'throughput':
+        rows = throughput_report(frame, snapshot.categories, weeks)
+    else:
+        raise ValueError(f'Unknown report: {report}')
+    return {
+        'snapshot': {'generated_at': snapshot.meta['generated_at'], 'tickets': snapshot.rows},
+        'report': report,
+        'rows': rows,
+    }
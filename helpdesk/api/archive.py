@@ -0,0 +1,321 @@
+"""
+Cold storage for closed tickets
+Tickets that have been Closed/Resolved for more than TICKET_ARCHIVE_AFTER_DAYS
+are moved out of the hot `tickets` collection so list/report scans only pay
+for recent work. Two backends:
+  - firestore: a `tickets_archive` collection (default)
+  - segments: gzip-compressed JSONL segment files on local disk, each with a
+    small offset index (ticket_id -> byte offset, length)
+TicketDetailView falls back to the archive, and write paths restore a ticket
+into the hot collection before changing it (e.g. a user reopening it).
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from google.api_core.exceptions import FailedPrecondition
+
+from .changes import record_tombstone
+from .firebase_config import db
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TICKET_ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BACKEND = os.environ.get('TICKET_ARCHIVE_BACKEND', 'firestore')
+ARCHIVE_DIR = os.environ.get(
+    'TICKET_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archive'))
+ARCHIVABLE_STATUSES = ['Closed', 'Resolved']
+
+# Firestore batches are limited to 500 writes; each move is a set, a delete and a tombstone
+PAGE_SIZE = 160
+# Records per gzip member in a segment file (one member is decompressed per lookup)
+BLOCK_SIZE = 64
+INDEX_SUFFIX = '.index.json'
+
+logger = logging.getLogger('helpdesk.archive')
+
+
+def ticket_number(ticket_id):
+    """T000000042 -> 42 (0 for anything that isn't a generated ticket ID)"""
+    if ticket_id and ticket_id.startswith('T'):
+        try:
+            return int(ticket_id[1:])
+        except ValueError:
+            pass
+    return 0
+
+
+def closed_since(ticket):
+    """When the ticket reached its final state (closed_at, resolved_at, else updated_at)"""
+    for field in ['closed_at', 'resolved_at', 'updated_at']:
+        value = ticket.get(field)
+        if value is not None and hasattr(value, 'timestamp'):
+            return value.replace(tzinfo=None)
+    return None
+
+
+def delete_unchanged(batch, doc):
+    """Delete a hot ticket only if it is unchanged since `doc` was read, and tombstone it"""
+    ticket = doc.to_dict()
+    batch.delete(doc.reference, option=db.write_option(last_update_time=doc.update_time))
+    record_tombstone(batch, doc.id, 'archived', [ticket.get('created_by'), ticket.get('assigned_to')])
+
+
+def commit_moves(docs, stage):
+    """
+    Commit stage(batch, docs) for the page in one batch. When a ticket changed
+    after it was read (reopened, commented) its delete precondition fails the
+    batch, so the page is retried ticket by ticket and the changed ones stay
+    in the hot collection. Returns the docs that moved.
+    """
+    batch = db.batch()
+    stage(batch, docs)
+    try:
+        batch.commit()
+        return docs
+    except FailedPrecondition:
+        logger.info('Tickets changed while archiving a page, moving them one at a time')
+    moved = []
+    for doc in docs:
+        batch = db.batch()
+        stage(batch, [doc])
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            logger.info('Ticket changed since it was read, left in place', extra={'ticket_id': doc.id})
+            continue
+        moved.append(doc)
+    return moved
+
+
+class FirestoreArchive:
+    """Archived tickets live in the tickets_archive collection under the same document ID"""
+
+    collection = 'tickets_archive'
+
+    def __init__(self):
+        self.meta_ref = db.collection('archive_meta').document('tickets')
+
+    def move(self, docs):
+        """Copy each ticket into the archive and delete it from the hot collection atomically; returns how many moved"""
+        known = self.max_ticket_number()
+
+        def stage(batch, page):
+            for doc in page:
+                batch.set(db.collection(self.collection).document(doc.id), doc.to_dict())
+                delete_unchanged(batch, doc)
+            highest = max(ticket_number(doc.to_dict().get('ticket_id', '')) for doc in page)
+            if highest > known:
+                batch.set(self.meta_ref, {'max_ticket_number': highest}, merge=True)
+
+        return len(commit_moves(docs, stage))
+
+    def get(self, ticket_id):
+        doc = db.collection(self.collection).document(ticket_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def restore(self, ticket_id, ticket):
+        batch = db.batch()
+        batch.set(db.collection('tickets').document(ticket_id), ticket)
+        batch.delete(db.collection(self.collection).document(ticket_id))
+        batch.commit()
+
+    def max_ticket_number(self):
+        doc = self.meta_ref.get()
+        return doc.to_dict().get('max_ticket_number', 0) if doc.exists else 0
+
+
+def _encode(value):
+    # Tag datetimes so restored tickets get real timestamps back, not strings
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    raise TypeError(f'Cannot archive value of type {type(value).__name__}')
+
+
+def _decode(obj):
+    if len(obj) == 1 and '$date' in obj:
+        return datetime.fromisoformat(obj['$date'])
+    return obj
+
+
+class SegmentArchive:
+    """
+    Append-only gzip JSONL segments. Each archival run writes one segment made
+    of independent gzip members of BLOCK_SIZE records, so the whole file still
+    reads with zcat but a lookup only seeks to and inflates one member.
+    Each segment has its own index, segment-N.index.json, mapping ticket_id ->
+    [offset, length], so a run writes only the index of the segment it adds.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._indexes = {}  # segment -> (index mtime, index)
+        self._tickets = {}  # ticket_id -> [segment, offset, length], newest segment first
+        self._directory_mtime = None
+
+    def _index_path(self, segment):
+        return os.path.join(self.directory, segment.replace('.jsonl.gz', INDEX_SUFFIX))
+
+    def _segments(self):
+        """Segment names, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name.replace(INDEX_SUFFIX, '.jsonl.gz') for name in names if name.endswith(INDEX_SUFFIX))
+
+    def _load(self):
+        """ticket_id -> [segment, offset, length]; reloads the indexes another process (the archive command) wrote"""
+        try:
+            mtime = os.path.getmtime(self.directory)
+        except OSError:
+            return {}
+        if mtime == self._directory_mtime:
+            return self._tickets
+        indexes = {}
+        for segment in self._segments():
+            path = self._index_path(segment)
+            index_mtime = os.path.getmtime(path)
+            loaded = self._indexes.get(segment)
+            if loaded is None or loaded[0] != index_mtime:
+                with open(path) as f:
+                    loaded = (index_mtime, json.load(f))
+            indexes[segment] = loaded
+        tickets = {}
+        for segment, (_, index) in indexes.items():
+            # A ticket archived again (reopened, closed) is read from its newest segment
+            for ticket_id, (offset, length) in index['tickets'].items():
+                tickets[ticket_id] = [segment, offset, length]
+        self._indexes, self._tickets, self._directory_mtime = indexes, tickets, mtime
+        return tickets
+
+    def _save_index(self, segment, index):
+        path = self._index_path(segment)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._directory_mtime = None
+
+    def move(self, docs):
+        """Write a segment and its index, then delete the hot documents; returns how many moved"""
+        docs = list(docs)
+        if not docs:
+            return 0
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            segments = self._segments()
+            number = int(segments[-1].split('-')[1].split('.')[0]) + 1 if segments else 1
+            segment = f'segment-{number:06d}.jsonl.gz'
+            entries = {}
+            with open(os.path.join(self.directory, segment), 'wb') as f:
+                for start in range(0, len(docs), BLOCK_SIZE):
+                    block = docs[start:start + BLOCK_SIZE]
+                    lines = []
+                    for doc in block:
+                        record = doc.to_dict()
+                        record['id'] = doc.id
+                        lines.append(json.dumps(record, default=_encode, separators=(',', ':')))
+                    data = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+                    offset = f.tell()
+                    f.write(data)
+                    for doc in block:
+                        entries[doc.id] = [offset, len(data)]
+                f.flush()
+                os.fsync(f.fileno())
+            highest = max(ticket_number(doc.to_dict().get('ticket_id', '')) for doc in docs)
+            self._save_index(segment, {'tickets': entries, 'max_ticket_number': highest})
+
+        # Only delete once the segment is durable; a crash here leaves duplicates
+        # in the hot collection, which the next run archives again
+        def stage(batch, page):
+            for doc in page:
+                delete_unchanged(batch, doc)
+
+        moved = commit_moves(docs, stage)
+        if len(moved) < len(docs):
+            # Tickets that changed stay hot; their records stay in the segment, unindexed
+            kept = {doc.id for doc in moved}
+            with self.lock:
+                self._save_index(segment, {'tickets': {ticket_id: entry for ticket_id, entry in entries.items()
+                                                       if ticket_id in kept}, 'max_ticket_number': highest})
+        return len(moved)
+
+    def get(self, ticket_id):
+        entry = self._load().get(ticket_id)
+        if entry is None:
+            return None
+        segment, offset, length = entry
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            data = gzip.decompress(f.read(length))
+        prefix = f'"id":"{ticket_id}"'
+        for line in data.decode('utf-8').splitlines():
+            if prefix in line:
+                record = json.loads(line, object_hook=_decode)
+                if record.get('id') == ticket_id:
+                    record.pop('id')
+                    return record
+        return None
+
+    def restore(self, ticket_id, ticket):
+        db.collection('tickets').document(ticket_id).set(ticket)
+        # The segment bytes stay behind; only the index entries are dropped
+        with self.lock:
+            self._load()
+            for segment, (_, index) in self._indexes.items():
+                if ticket_id in index['tickets']:
+                    tickets = dict(index['tickets'])
+                    del tickets[ticket_id]
+                    self._save_index(segment, dict(index, tickets=tickets))
+
+    def max_ticket_number(self):
+        self._load()
+        return max((index.get('max_ticket_number', 0) for _, index in self._indexes.values()), default=0)
+
+
+def get_archive(backend=None):
+    if (backend or ARCHIVE_BACKEND) == 'segments':
+        return SegmentArchive()
+    return FirestoreArchive()
+
+
+ticket_archive = get_archive()
+
+
+def archive_closed_tickets(days=ARCHIVE_AFTER_DAYS, archive=None, dry_run=False):
+    """Move tickets closed/resolved more than `days` ago into cold storage; returns how many"""
+    archive = archive or ticket_archive
+    cutoff = datetime.now() - timedelta(days=days)
+    moved = 0
+    query = db.collection('tickets').where('status', 'in', ARCHIVABLE_STATUSES).order_by('__name__').limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        if not page:
+            break
+        last = page[-1]
+        due = [doc for doc in page if (closed_since(doc.to_dict()) or cutoff) < cutoff]
+        if due:
+            moved += len(due) if dry_run else archive.move(due)
+        if len(page) < PAGE_SIZE:
+            break
+    return moved
+
+
+def load_ticket(ticket_id):
+    """
+    Look up a ticket in the hot collection, then cold storage.
+    Returns (ticket, archived); write paths call ticket_archive.restore() once
+    every check has passed, right before they update the hot document.
+    """
+    doc = db.collection('tickets').document(ticket_id).get()
+    if doc.exists:
+        return doc.to_dict(), False
+    ticket = ticket_archive.get(ticket_id)
+    return ticket, ticket is not None
@@ -0,0 +1,253 @@
+"""
+Content-addressed ticket attachments
+File bodies live in a blob store keyed by their SHA-256, so the same log or
+screenshot attached to many tickets is stored once; the ticket only keeps a
+small reference ({sha256, name, size, content_type, uploaded_by,
+uploaded_at}) in its `attachments` list, and the timeline records the upload
+by digest. Uploads are hashed and written to a temp file chunk by chunk as
+they arrive (BlobUploadHandler for multipart, write_stream() for raw bodies)
+and moved into place once the digest is known, so a worker never holds a
+whole file. Downloads are streamed in chunks and honour single byte ranges.
+Backends:
+  - local: files under ATTACHMENT_DIR, sharded as ab/cd/<sha256> (default)
+A backend provides writer(), exists(), size() and iter_range(); see
+LocalBlobStore.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils.http import content_disposition_header
+
+ATTACHMENT_BACKEND = os.environ.get('ATTACHMENT_BACKEND', 'local')
+ATTACHMENT_DIR = os.environ.get(
+    'ATTACHMENT_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'attachments'))
+MAX_ATTACHMENT_SIZE = int(os.environ.get('ATTACHMENT_MAX_SIZE', str(25 * 1024 * 1024)))
+# References kept on one ticket document
+MAX_ATTACHMENTS = 20
+CHUNK_SIZE = 64 * 1024
+MAX_NAME_LENGTH = 200
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+# Types a browser may render in place; everything else is served as a download
+INLINE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'text/plain'}
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class StoredBlob:
+    """Result of a finished upload"""
+
+    __slots__ = ('sha256', 'size', 'name', 'content_type', 'created')
+
+    def __init__(self, sha256, size, name=None, content_type=None, created=False):
+        self.sha256 = sha256
+        self.size = size
+        self.name = name
+        self.content_type = content_type
+        # False when an identical file was already stored
+        self.created = created
+
+
+class BlobWriter:
+    """Hashes and spools one upload to a temp file in the store, then moves it to its digest's path"""
+
+    def __init__(self, store, max_size=MAX_ATTACHMENT_SIZE):
+        self.store = store
+        self.max_size = max_size
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.file = tempfile.NamedTemporaryFile(dir=store.temp_dir, prefix='upload-', delete=False)
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            self.abort()
+            raise AttachmentTooLarge(f'Attachments are limited to {self.max_size} bytes')
+        self.hash.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        digest = self.hash.hexdigest()
+        path = self.store.path(digest)
+        if os.path.exists(path):
+            # Identical content already stored
+            os.unlink(self.file.name)
+            return StoredBlob(digest, self.size, created=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic: readers see the whole file or none; a concurrent identical upload just replaces it
+        os.replace(self.file.name, path)
+        return StoredBlob(digest, self.size, created=True)
+
+    def abort(self):
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+class LocalBlobStore:
+    """Blobs as files on local disk (or a shared volume mounted there)"""
+
+    def __init__(self, root=None):
+        self.root = root or ATTACHMENT_DIR
+        self.temp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def writer(self, max_size=MAX_ATTACHMENT_SIZE):
+        return BlobWriter(self, max_size)
+
+    def write_stream(self, read, max_size=MAX_ATTACHMENT_SIZE):
+        """Store everything read(CHUNK_SIZE) returns until it returns b''"""
+        writer = self.writer(max_size)
+        try:
+            while True:
+                chunk = read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def discard(self, blobs):
+        """Delete the blobs a failed request stored (created=True); content stored before it stays"""
+        for blob in blobs:
+            if blob.created:
+                try:
+                    os.unlink(self.path(blob.sha256))
+                except FileNotFoundError:
+                    pass
+
+    def size(self, digest):
+        return os.path.getsize(self.path(digest))
+
+    def iter_range(self, digest, start=0, end=None):
+        """Chunks of bytes start..end (inclusive; end=None for the rest of the file)"""
+        with open(self.path(digest), 'rb') as f:
+            f.seek(start)
+            left = None if end is None else end - start + 1
+            while left is None or left > 0:
+                chunk = f.read(CHUNK_SIZE if left is None else min(CHUNK_SIZE, left))
+                if not chunk:
+                    break
+                if left is not None:
+                    left -= len(chunk)
+                yield chunk
+
+
+BACKENDS = {
+    'local': LocalBlobStore,
+}
+
+
+def get_store(backend=None):
+    backend = backend or ATTACHMENT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown attachment backend: {backend}')
+    return BACKENDS[backend]()
+
+
+attachment_store = get_store()
+
+
+class BlobUploadHandler(FileUploadHandler):
+    """
+    Multipart upload handler that writes each file straight into the blob
+    store; request.FILES then holds StoredBlob objects instead of file data
+    """
+
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, request=None, store=None, max_size=MAX_ATTACHMENT_SIZE):
+        super().__init__(request)
+        self.store = store or attachment_store
+        self.max_size = max_size
+        self.writer = None
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = self.store.writer(self.max_size)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.writer.write(raw_data)
+        except AttachmentTooLarge:
+            self.too_large = True
+            # The parser discards the rest of the body
+            raise StopUpload(connection_reset=False)
+        return None
+
+    def file_complete(self, file_size):
+        blob = self.writer.commit()
+        self.writer = None
+        blob.name = clean_name(self.file_name)
+        blob.content_type = self.content_type or 'application/octet-stream'
+        return blob
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+
+def clean_name(name):
+    """File name as shown to users: no path, no control characters, bounded length"""
+    name = os.path.basename((name or '').replace('\\', '/'))
+    name = re.sub(r'[\x00-\x1f\x7f"]', '', name).strip()
+    return name[:MAX_NAME_LENGTH] or 'attachment'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a `Range: bytes=...` header, or None to send
+    the whole file (no header, or several ranges, which we don't combine).
+    Raises RangeNotSatisfiable for ranges outside the file.
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', header)
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def disposition(reference):
+    """Content-Disposition for a download; only INLINE_TYPES may render in the browser"""
+    as_attachment = reference.get('content_type') not in INLINE_TYPES
+    return content_disposition_header(as_attachment, clean_name(reference.get('name')))
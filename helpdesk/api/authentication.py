@@ -0,0 +1,220 @@
+"""
+Firebase ID token authentication
+Callers send `Authorization: Bearer <Firebase ID token>`. The token is
+verified locally against Google's cached signing keys, and role, verified
+and account_status come from custom claims set whenever the user document
+changes them, so authorizing a request needs no Firestore read.
+Query-param role/uid callers are only accepted while AUTH_ALLOW_QUERY_PARAMS
+is on (local development and the in-memory backend).
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import firebase_admin
+from firebase_admin import auth
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .firebase_config import db
+from .models import Role, enum_converter
+from .structured_logging import bind
+
+logger = logging.getLogger('helpdesk.auth')
+
+ALLOW_QUERY_PARAMS = os.getenv('AUTH_ALLOW_QUERY_PARAMS', 'false').lower() == 'true'
+# Also ask Firebase Auth whether the token was revoked (one Auth API call per token per TOKEN_CACHE_TTL)
+CHECK_REVOKED = os.getenv('AUTH_CHECK_REVOKED', 'false').lower() == 'true'
+TOKEN_CACHE_TTL = 300
+BACKFILL_PAGE_SIZE = 500
+# Role member for a claim or query-param value (unknown values pass through as strings)
+as_role = enum_converter(Role)
+
+
+class AccountBlocked(exceptions.PermissionDenied):
+    default_detail = 'Your account has been blocked. Please contact an administrator.'
+    default_code = 'ACCOUNT_BLOCKED'
+
+
+def claims_for(user_data):
+    """Custom claims mirrored from a users/{uid} document"""
+    return {
+        'role': as_role(user_data.get('role', Role.USER)),
+        # Users need no verification; agents/admins default to verified like the document reads do
+        'verified': bool(user_data.get('verified', True)),
+        'account_status': user_data.get('account_status', 'active'),
+    }
+
+
+def sync_claims(uid, user_data, revoke=False):
+    """
+    Write the user's claims. They reach the caller with its next ID token;
+    revoke=True also revokes refresh tokens so a demoted or blocked user
+    can't mint new ones (already issued tokens live out their hour unless
+    AUTH_CHECK_REVOKED is on).
+    """
+    claims = claims_for(user_data)
+    if not firebase_admin._apps:
+        # Offline in-memory backend: there is no Auth project to write to
+        return claims
+    auth.set_custom_user_claims(uid, claims)
+    if revoke:
+        auth.revoke_refresh_tokens(uid)
+    logger.info('Custom claims updated', extra={'target_uid': uid, 'claims': claims, 'revoked': revoke})
+    return claims
+
+
+def backfill_claims(dry_run=False):
+    """Set claims for every user whose Auth record doesn't match its document; returns how many"""
+    fixed = 0
+    query = db.collection('users').order_by('__name__').limit(BACKFILL_PAGE_SIZE)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        if not page:
+            break
+        last = page[-1]
+        for doc in page:
+            claims = claims_for(doc.to_dict())
+            if firebase_admin._apps:
+                try:
+                    current = auth.get_user(doc.id).custom_claims or {}
+                except auth.UserNotFoundError:
+                    continue
+                if all(current.get(key) == value for key, value in claims.items()):
+                    continue
+            if not dry_run:
+                sync_claims(doc.id, doc.to_dict())
+            fixed += 1
+        if len(page) < BACKFILL_PAGE_SIZE:
+            break
+    return fixed
+
+
+class FirebaseUser:
+    """request.user for token-authenticated callers"""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, uid, claims):
+        self.uid = uid
+        self.pk = uid
+        self.email = claims.get('email')
+        self.role = as_role(claims.get('role', Role.USER))
+        self.verified = claims.get('verified', True)
+        self.account_status = claims.get('account_status', 'active')
+        # Tokens minted before claims existed; LoginView syncs them
+        self.has_claims = 'role' in claims
+        # Unix time the ID token expires (None for claims not read from a token)
+        self.expires_at = claims.get('exp')
+
+    def __str__(self):
+        return self.uid
+
+
+class TokenCache:
+    """sha256(token) -> (expires, FirebaseUser), so repeat requests skip signature checks"""
+
+    def __init__(self, max_entries=10000, ttl=TOKEN_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key, user, token_expires):
+        with self.lock:
+            self.entries[key] = (min(token_expires, time.time() + self.ttl), user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+def user_from_token(token):
+    """FirebaseUser for a verified ID token; raises AuthenticationFailed or AccountBlocked"""
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    user = token_cache.get(key)
+    if user is None:
+        try:
+            decoded = auth.verify_id_token(token, check_revoked=CHECK_REVOKED)
+        except auth.RevokedIdTokenError:
+            raise exceptions.AuthenticationFailed('Session revoked, sign in again')
+        except (auth.ExpiredIdTokenError, auth.InvalidIdTokenError, ValueError):
+            raise exceptions.AuthenticationFailed('Invalid or expired ID token')
+        user = FirebaseUser(decoded['uid'], decoded)
+        token_cache.set(key, user, decoded.get('exp', 0))
+    if user.account_status == 'blocked':
+        raise AccountBlocked()
+    return user
+
+
+class FirebaseAuthentication(BaseAuthentication):
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid Authorization header')
+        user = user_from_token(header[1].decode('ascii', 'ignore'))
+        return user, None
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+def request_user(request):
+    """
+    Token user for plain Django views (SSE, export): EventSource and download
+    links can't set headers, so ?token= is accepted as well
+    """
+    header = request.headers.get('Authorization', '')
+    token = header[7:] if header.lower().startswith('bearer ') else request.GET.get('token')
+    return user_from_token(token) if token else None
+
+
+def caller(request, role_param='role', default_uid='', user=None):
+    """
+    (role, uid) of the caller: token claims, else legacy query params when
+    allowed. The uid is bound to the request's log context.
+    """
+    user = user or getattr(request, 'user', None)
+    if isinstance(user, FirebaseUser):
+        bind(uid=user.uid)
+        return user.role, user.uid
+    if not ALLOW_QUERY_PARAMS:
+        raise exceptions.NotAuthenticated('Sign in required')
+    params = getattr(request, 'query_params', request.GET)
+    uid = params.get('uid', default_uid)
+    bind(uid=uid or None)
+    return as_role(params.get(role_param, Role.USER)), uid
+
+
+def exception_handler(exc, context):
+    """DRF exceptions in the API's {'error': {'code', 'message'}} shape"""
+    # rest_framework.views loads the authentication classes at import, so import it late
+    from rest_framework.views import exception_handler as drf_exception_handler
+    response = drf_exception_handler(exc, context)
+    if response is not None and isinstance(exc, (exceptions.AuthenticationFailed, exceptions.NotAuthenticated,
+                                                 exceptions.PermissionDenied)):
+        code = exc.get_codes() if isinstance(exc.get_codes(), str) else exc.default_code
+        response.data = {'error': {'code': code.upper(), 'message': str(exc.detail)}}
+    return response
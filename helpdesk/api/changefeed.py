@@ -0,0 +1,370 @@
+"""
+Live ticket change feed for HelpDesk API
+Keeps ONE Firestore listener per process on the tickets written since the
+listener's window opened (plus archive tombstones, for tickets that leave the
+collection) and fans each change out to Server-Sent Events subscribers,
+filtered per caller. A subscriber starts from one page of its filtered list,
+read from Firestore, and is only sent changes to that page. The window is
+reopened every TICKET_FEED_WINDOW seconds, so a process holds the tickets
+written in the last window instead of the whole collection.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from firebase_admin import firestore
+
+from .changes import TOMBSTONES
+from .dashboard import count
+from .firebase_config import db
+from .models import Ticket
+from .work_queue import priority_rank
+
+WINDOW = int(os.getenv('TICKET_FEED_WINDOW', '3600'))
+# Writes use the app clock, so a window starts a little before its listener
+OVERLAP = timedelta(seconds=5)
+PAGE_SIZE = 10
+SLA_AT_RISK_HOURS = 4
+SEARCH_FIELDS = ['ticket_id', 'title', 'description', 'category', 'priority', 'status']
+# Filters only matches() applies; with any of them set the first page is filtered here
+LOCAL_FILTERS = ['search', 'sla', 'from', 'to']
+
+
+def timestamp(value):
+    return value.timestamp() if hasattr(value, 'timestamp') else None
+
+
+def sort_key(ticket):
+    """Dashboard order: highest priority first, then newest"""
+    return priority_rank(ticket.get('priority')), -(timestamp(ticket.get('created_at')) or 0), ticket.id
+
+
+def revision(ticket):
+    """Every write path bumps version (and updated_at), so later writes compare greater"""
+    return ticket.get('version') or 0, timestamp(ticket.get('updated_at')) or 0
+
+
+class FeedSubscriber:
+    """
+    One connected SSE client.
+    Holds the caller's role/uid, filters and page plus an asyncio queue that
+    the listener thread pushes events into (thread-safe via call_soon_threadsafe)
+    """
+
+    def __init__(self, loop, role, uid, filters=None, page=1, page_size=PAGE_SIZE, max_queue=500):
+        self.loop = loop
+        self.role = role
+        self.uid = uid
+        self.filters = filters or {}
+        self.page = page
+        self.page_size = page_size
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.visible = {}  # Ticket ID -> sort key, for the page this client holds
+        self.first_key = None  # Sort key of the page's first ticket on pages after the first
+        self.pending = None  # Changes that arrive while the first page is being read
+        self.overflowed = False
+
+    def query_filters(self):
+        """The equality filters Firestore can apply (single-field indexes); matches() does the rest"""
+        wheres = []
+        if self.role == 'user':
+            wheres.append(('created_by', self.uid))
+        elif self.role == 'agent' and self.filters.get('assigned') == 'true':
+            wheres.append(('assigned_to', self.uid))
+        elif self.filters.get('agent'):
+            wheres.append(('assigned_to', self.filters['agent']))
+        for field in ['status', 'priority', 'category']:
+            if self.filters.get(field):
+                wheres.append((field, self.filters[field]))
+        return wheres
+
+    def local_filters(self):
+        """Whether matches() filters more than query_filters() does"""
+        return any(self.filters.get(key) for key in LOCAL_FILTERS)
+
+    def matches(self, ticket):
+        """Role scoping + filters, mirrors TicketListView / Dashboard rules"""
+        if self.role == 'user' and ticket.get('created_by') != self.uid:
+            return False
+        if self.role == 'agent' and self.filters.get('assigned') == 'true':
+            if ticket.get('assigned_to') != self.uid:
+                return False
+
+        for field in ['status', 'priority', 'category']:
+            wanted = self.filters.get(field)
+            if wanted and ticket.get(field) != wanted:
+                return False
+        agent = self.filters.get('agent')
+        if agent and ticket.get('assigned_to') != agent:
+            return False
+
+        # from/to are datetimes from parse_date(); to is exclusive
+        created = timestamp(ticket.get('created_at'))
+        date_from, date_to = self.filters.get('from'), self.filters.get('to')
+        if date_from and (created is None or created < date_from.timestamp()):
+            return False
+        if date_to and (created is None or created >= date_to.timestamp()):
+            return False
+
+        sla = self.filters.get('sla')
+        if sla:
+            deadline = timestamp(ticket.get('sla_deadline'))
+            if deadline is None:
+                return False
+            hours = (deadline - time.time()) / 3600
+            if sla == 'overdue' and hours > 0:
+                return False
+            if sla == 'at-risk' and not 0 < hours <= SLA_AT_RISK_HOURS:
+                return False
+            if sla == 'on-time' and hours <= SLA_AT_RISK_HOURS:
+                return False
+
+        search = (self.filters.get('search') or '').lower()
+        if search:
+            for field in SEARCH_FIELDS:
+                if search in str(ticket.get(field) or '').lower():
+                    return True
+            for field in ['created_by_display', 'assigned_to_display']:
+                display = ticket.get(field) or {}
+                if search in (display.get('username') or '').lower():
+                    return True
+            return any(search in comment.lower() for comment in ticket.comments())
+        return True
+
+    def start_page(self, tickets):
+        """Hold the first page (sorted) this client was sent"""
+        self.visible = {ticket.id: sort_key(ticket) for ticket in tickets}
+        self.first_key = sort_key(tickets[0]) if tickets and self.page > 1 else None
+
+    def in_page(self, key):
+        """Whether a ticket new to this client sorts onto the page it holds"""
+        if self.first_key is not None and key < self.first_key:
+            return False
+        # A short page is the last one, so anything after its start belongs to it
+        return len(self.visible) < self.page_size or key < max(self.visible.values())
+
+    def apply(self, ticket_id, ticket):
+        """Events for one written ticket (None when it left the collection), updating the page held"""
+        if ticket is not None and self.matches(ticket):
+            key = sort_key(ticket)
+            if ticket_id in self.visible:
+                self.visible[ticket_id] = key
+                return [{'type': 'modified', 'id': ticket_id, 'ticket': ticket}]
+            if not self.in_page(key):
+                return []
+            self.visible[ticket_id] = key
+            events = [{'type': 'added', 'id': ticket_id, 'ticket': ticket}]
+            if len(self.visible) > self.page_size:
+                # The page's last ticket moves on to the next page
+                last = max(self.visible, key=self.visible.get)
+                del self.visible[last]
+                events.append({'type': 'removed', 'id': last})
+            return events
+        if ticket_id in self.visible:
+            # Deleted, archived, or no longer matches this client's role/filters
+            del self.visible[ticket_id]
+            return [{'type': 'removed', 'id': ticket_id}]
+        return []
+
+    def offer(self, event):
+        """Runs on the subscriber's event loop"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: stop queueing, the stream tells it to resync
+            self.overflowed = True
+
+
+class _Window:
+    """Listeners on the tickets written since `since`, and on the tombstones of tickets archived since then"""
+
+    def __init__(self, feed, since):
+        self.feed = feed
+        self.since = since
+        self.seeded = threading.Event()
+        self.closed = False
+        self.watches = [
+            db.collection(feed.collection).where('updated_at', '>=', since).on_snapshot(self._on_tickets),
+            db.collection(TOMBSTONES).where('removed_at', '>=', since).on_snapshot(self._on_tombstones),
+        ]
+
+    def _on_tickets(self, col_snapshot, changes, read_time):
+        """Called on the Firestore watch thread; the first call is the window's initial snapshot"""
+        if not self.closed:
+            self.feed._on_tickets(changes)
+        self.seeded.set()
+
+    def _on_tombstones(self, col_snapshot, changes, read_time):
+        if not self.closed:
+            self.feed._on_tombstones(changes)
+
+    def close(self):
+        self.closed = True
+        for watch in self.watches:
+            watch.unsubscribe()
+
+
+class TicketChangeFeed:
+    """
+    Process-wide fan-out hub.
+    The listener is started on the first subscriber. `tickets` holds the
+    latest Ticket record of everything written in the current window; a
+    change is dispatched once, however many windows deliver it, because it
+    only counts when its version is newer than the one held.
+    """
+
+    def __init__(self, collection='tickets', window=WINDOW, ready_timeout=30):
+        self.collection = collection
+        self.window = window
+        self.ready_timeout = ready_timeout
+        self.tickets = {}
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.start_lock = threading.Lock()  # Separate so the first callback can take self.lock
+        self.ready = threading.Event()
+        self.watch = None  # The current _Window
+        self.timer = None
+
+    def start(self):
+        with self.start_lock:
+            if self.watch is None:
+                self.watch = _Window(self, datetime.now() - OVERLAP)
+                self._schedule()
+        self.watch.seeded.wait(self.ready_timeout)
+        self.ready.set()
+
+    def _schedule(self):
+        self.timer = threading.Timer(self.window, self._rotate)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _rotate(self):
+        """Open the next window, then close the old one (the overlap is deduplicated by version)"""
+        with self.start_lock:
+            previous = self.watch
+            if previous is None:
+                return
+            window = _Window(self, datetime.now() - OVERLAP)
+            window.seeded.wait(self.ready_timeout)
+            cutoff = window.since.timestamp()
+            with self.lock:
+                self.tickets = {ticket_id: ticket for ticket_id, ticket in self.tickets.items()
+                                if (timestamp(ticket.get('updated_at')) or 0) >= cutoff}
+            self.watch = window
+            previous.close()
+            self._schedule()
+
+    def stop(self):
+        with self.start_lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.watch is not None:
+                self.watch.close()
+                self.watch = None
+        with self.lock:
+            self.tickets = {}
+            self.ready.clear()
+
+    def subscribe(self, subscriber):
+        """Register a subscriber and return (tickets matching its filters, its page of them)"""
+        self.start()
+        with self.lock:
+            subscriber.pending = []
+            self.subscribers.add(subscriber)
+        try:
+            total, page = self._first_page(subscriber)
+        except Exception:
+            self.unsubscribe(subscriber)
+            raise
+        with self.lock:
+            # Fold in the writes that raced the query
+            subscriber.start_page(page)
+            tickets = {ticket.id: ticket for ticket in page}
+            for ticket_id, ticket in subscriber.pending:
+                for event in subscriber.apply(ticket_id, ticket):
+                    if event['type'] == 'removed':
+                        tickets.pop(event['id'], None)
+                    else:
+                        tickets[event['id']] = event['ticket']
+            subscriber.pending = None
+        return total, sorted(tickets.values(), key=sort_key)
+
+    def _first_page(self, subscriber):
+        """
+        (total, page) in dashboard order, sorted by Firestore. With only equality
+        filters the page is read with offset/limit and the total is a count()
+        aggregation; search, SLA and date filters can't be expressed there, so
+        those pages stream the ordered query and filter it here.
+        """
+        query = db.collection(self.collection)
+        for field, value in subscriber.query_filters():
+            query = query.where(field, '==', value)
+        ordered = (query.order_by('priority_rank')
+                   .order_by('created_at', direction=firestore.Query.DESCENDING)
+                   .order_by('__name__'))
+        skip = (subscriber.page - 1) * subscriber.page_size
+
+        if not subscriber.local_filters():
+            page = ordered.offset(skip).limit(subscriber.page_size).stream()
+            return count(query), [Ticket.from_snapshot(doc) for doc in page]
+
+        total = 0
+        page = []
+        for doc in ordered.stream():
+            ticket = Ticket.from_snapshot(doc)
+            if subscriber.matches(ticket):
+                total += 1
+                if skip < total <= skip + subscriber.page_size:
+                    page.append(ticket)
+        return total, page
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _on_tickets(self, changes):
+        with self.lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    # updated_at only grows, so a ticket leaves the window's query by being deleted
+                    self.tickets.pop(doc.id, None)
+                    self._dispatch(doc.id, None)
+                    continue
+                ticket = Ticket.from_snapshot(doc)
+                held = self.tickets.get(doc.id)
+                if held is not None and revision(held) >= revision(ticket):
+                    continue
+                self.tickets[doc.id] = ticket
+                self._dispatch(doc.id, ticket)
+
+    def _on_tombstones(self, changes):
+        with self.lock:
+            for change in changes:
+                tombstone = change.document.to_dict()
+                if change.type.name == 'ADDED' and tombstone.get('reason') == 'archived':
+                    self.tickets.pop(tombstone['ticket_id'], None)
+                    self._dispatch(tombstone['ticket_id'], None)
+
+    def _dispatch(self, ticket_id, ticket):
+        for subscriber in list(self.subscribers):
+            if subscriber.pending is not None:
+                subscriber.pending.append((ticket_id, ticket))
+                continue
+            for event in subscriber.apply(ticket_id, ticket):
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+                except RuntimeError:
+                    # Event loop already closed - client went away
+                    self.subscribers.discard(subscriber)
+                    break
+
+
+# Shared hub for this process
+ticket_feed = TicketChangeFeed()
@@ -0,0 +1,126 @@
+"""
+Delta sync for tickets
+Clients keep an opaque cursor and ask for tickets changed since it: one
+ordered query on (updated_at, __name__) scoped to the caller, plus tombstones
+for tickets that left their view (archived, or reassigned away from an agent).
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from .firebase_config import db
+
+TOMBSTONES = 'ticket_tombstones'
+# Tombstones carry expires_at for a Firestore TTL policy; older cursors must resync
+TOMBSTONE_RETENTION = timedelta(days=30)
+# Writes use the app clock, so only hand out changes older than this; a write
+# stamped just before the cursor but committed just after it is not skipped
+SETTLE = timedelta(seconds=2)
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+
+
+class CursorError(ValueError):
+    pass
+
+
+class CursorExpired(CursorError):
+    pass
+
+
+def record_tombstone(batch, ticket_id, reason, visible_to, tombstone_id=None):
+    """Add a tombstone to batch; visible_to lists the uids whose view the ticket left"""
+    now = datetime.now()
+    ref = db.collection(TOMBSTONES).document(tombstone_id or f'{ticket_id}-{reason}-{now.timestamp():.6f}')
+    batch.set(ref, {
+        'ticket_id': ticket_id,
+        'reason': reason,
+        'visible_to': [uid for uid in dict.fromkeys(visible_to) if uid],
+        'removed_at': now,
+        'expires_at': now + TOMBSTONE_RETENTION,
+    })
+
+
+def record_reassignment(batch, ticket_id, old_assignee, new_assignee):
+    """Tell the previous assignee's sync client that the ticket left its queue"""
+    if old_assignee and old_assignee != new_assignee:
+        record_tombstone(batch, ticket_id, 'reassigned', [old_assignee])
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = json.loads(raw)
+        for key in ['u', 'r']:
+            if position.get(key):
+                datetime.fromisoformat(position[key])
+    except (ValueError, TypeError, AttributeError):
+        raise CursorError('Invalid sync cursor')
+    if not isinstance(position, dict):
+        raise CursorError('Invalid sync cursor')
+    removed_after = position.get('r')
+    if removed_after and datetime.fromisoformat(removed_after) < datetime.now() - TOMBSTONE_RETENTION:
+        raise CursorExpired('Sync cursor is too old, start a full sync')
+    return position
+
+
+def _scoped(query, role, uid):
+    if role == 'user':
+        return query.where('created_by', '==', uid)
+    if role == 'agent':
+        return query.where('assigned_to', '==', uid)
+    return query
+
+
+def _page(query, field, after, after_id, upper, limit):
+    """Ordered page of (field, __name__) strictly after (after, after_id) and before upper"""
+    query = query.where(field, '<', upper)
+    if after:
+        query = query.where(field, '>=', datetime.fromisoformat(after))
+    query = query.order_by(field).order_by('__name__')
+    if after:
+        query = query.start_after({field: datetime.fromisoformat(after), '__name__': after_id or ''})
+    return list(query.limit(limit + 1).stream())
+
+
+def changes_since(role, uid, token=None, limit=DEFAULT_LIMIT):
+    """
+    Returns (ticket_docs, tombstones, next_token, has_more). Without a token
+    the caller gets every ticket in scope (a full sync, paged by has_more);
+    tombstones start from the moment the full sync began.
+    """
+    upper = datetime.now() - SETTLE
+    if token:
+        position = decode_cursor(token)
+    else:
+        position = {'u': None, 'i': None, 'r': upper.isoformat(), 'ri': None}
+
+    docs = _page(_scoped(db.collection('tickets'), role, uid), 'updated_at', position['u'], position['i'], upper, limit)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if docs:
+        last = docs[-1]
+        position = dict(position, u=last.to_dict()['updated_at'].replace(tzinfo=None).isoformat(), i=last.id)
+
+    tombstone_query = db.collection(TOMBSTONES)
+    if role == 'admin':
+        # Admins see every ticket, so only archival removes one from their view
+        tombstone_query = tombstone_query.where('reason', '==', 'archived')
+    else:
+        tombstone_query = tombstone_query.where('visible_to', 'array_contains', uid)
+    tombstones = _page(tombstone_query, 'removed_at', position['r'], position['ri'], upper, limit)
+    has_more = has_more or len(tombstones) > limit
+    tombstones = tombstones[:limit]
+    if tombstones:
+        last = tombstones[-1]
+        position = dict(position, r=last.to_dict()['removed_at'].replace(tzinfo=None).isoformat(), ri=last.id)
+    elif not position.get('r'):
+        position['r'] = upper.isoformat()
+
+    return docs, [doc.to_dict() for doc in tombstones], encode_cursor(position), has_more
@@ -0,0 +1,132 @@
+"""
+Sharded workload counters for agents and admins
+active_tickets is spread over NUM_SHARDS docs in users/{uid}/counter_shards so
+bursts of assignments to one agent don't hit Firestore's per-document write
+limit. The user doc's own active_tickets (the count kept there before
+sharding) is the baseline: it is set to 0 when a user is created and never
+written after that. The shards hold the changes on top of it. Reads sum
+the baseline and the shards; reconcile_workloads() fixes any drift.
+"""
+
+import random
+
+from firebase_admin import firestore
+
+from .firebase_config import db
+
+NUM_SHARDS = 5
+
+# Tickets in these statuses count towards the assignee's workload
+OPEN_STATUSES = ['Open', 'In Progress', 'Escalated', 'Breached']
+
+# Page size for reconciliation scans (also the Firestore batch write limit)
+PAGE_SIZE = 500
+
+
+def shard_ref(uid, shard):
+    return db.collection('users').document(uid).collection('counter_shards').document(str(shard))
+
+
+def increment_workload(uid, delta, batch=None):
+    """Add delta to a random shard; pass a batch to commit with the ticket write"""
+    if not uid or not delta:
+        return
+    ref = shard_ref(uid, random.randrange(NUM_SHARDS))
+    data = {'active_tickets': firestore.Increment(delta)}
+    if batch is not None:
+        batch.set(ref, data, merge=True)
+    else:
+        ref.set(data, merge=True)
+
+
+def workload_delta(old_status, new_status):
+    """+1 when a ticket becomes open again, -1 when it leaves the open set"""
+    was_open = old_status in OPEN_STATUSES
+    is_open = new_status in OPEN_STATUSES
+    if was_open and not is_open:
+        return -1
+    if is_open and not was_open:
+        return 1
+    return 0
+
+
+def _workload_parts(uids):
+    """uid -> [baseline from the user doc, sum of its shards] - one get_all round trip"""
+    parts = {uid: [0, 0] for uid in uids}
+    # path -> (uid, 0 for the user doc / 1 for a shard); get_all doesn't keep the order
+    refs = {}
+    for uid in uids:
+        refs[db.collection('users').document(uid).path] = (uid, 0)
+        for shard in range(NUM_SHARDS):
+            refs[shard_ref(uid, shard).path] = (uid, 1)
+    if not refs:
+        return parts
+    references = [db.document(path) for path in refs]
+    for doc in db.get_all(references, field_paths=['active_tickets']):
+        if doc.exists:
+            uid, part = refs[doc.reference.path]
+            parts[uid][part] += doc.to_dict().get('active_tickets') or 0
+    return parts
+
+
+def get_workloads(uids):
+    """active_tickets per uid: the user doc's baseline plus its shards"""
+    return {uid: baseline + shards for uid, (baseline, shards) in _workload_parts(uids).items()}
+
+
+def get_workload(uid):
+    return get_workloads([uid])[uid]
+
+
+def count_open_tickets():
+    """True open-ticket count per assignee, paging through open tickets only"""
+    counts = {}
+    query = db.collection('tickets').where('status', 'in', OPEN_STATUSES).order_by('__name__').limit(PAGE_SIZE)
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc else query
+        docs = list(page.stream())
+        for doc in docs:
+            assignee = doc.to_dict().get('assigned_to')
+            if assignee:
+                counts[assignee] = counts.get(assignee, 0) + 1
+        if len(docs) < PAGE_SIZE:
+            return counts
+        last_doc = docs[-1]
+
+
+def reconcile_workloads(dry_run=False):
+    """
+    Recompute workloads from tickets and rewrite the shards of any agent/admin
+    whose summed counter drifted. Returns a list of the corrections made.
+    """
+    actual = count_open_tickets()
+
+    staff = [doc.id for doc in db.collection('users').where('role', 'in', ['agent', 'admin']).stream()]
+    uids = sorted(set(staff) | set(actual))
+    parts = {}
+    users_per_read = PAGE_SIZE // (NUM_SHARDS + 1)
+    for start in range(0, len(uids), users_per_read):
+        parts.update(_workload_parts(uids[start:start + users_per_read]))
+
+    corrections = []
+    for uid in uids:
+        baseline, shards = parts[uid]
+        recorded = baseline + shards
+        true_count = actual.get(uid, 0)
+        if recorded != true_count:
+            corrections.append({'uid': uid, 'recorded': recorded, 'actual': true_count, 'drift': recorded - true_count,
+                                'baseline': baseline})
+
+    if not dry_run:
+        # Shard 0 holds the true value less the baseline, the rest are zeroed
+        users_per_batch = PAGE_SIZE // NUM_SHARDS
+        for start in range(0, len(corrections), users_per_batch):
+            batch = db.batch()
+            for correction in corrections[start:start + users_per_batch]:
+                for shard in range(NUM_SHARDS):
+                    value = correction['actual'] - correction['baseline'] if shard == 0 else 0
+                    batch.set(shard_ref(correction['uid'], shard), {'active_tickets': value})
+            batch.commit()
+
+    return corrections
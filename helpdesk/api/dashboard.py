@@ -0,0 +1,85 @@
+"""
+Dashboard summary counts for admins
+Every number is a Firestore count() aggregation, billed one read per 1000
+matching index entries instead of one per ticket. The counts are independent,
+so they run concurrently; the result is cached for SUMMARY_TTL seconds.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+from .counters import OPEN_STATUSES
+from .firebase_config import db
+from .single_flight import SingleFlight
+from .work_queue import PRIORITY_RANK
+
+STATUSES = ['Open', 'In Progress', 'Escalated', 'Breached', 'Resolved', 'Closed']
+# Open tickets past their deadline count as breached until their status says so
+AT_RISK_STATUSES = ['Open', 'In Progress', 'Escalated']
+
+SUMMARY_TTL = int(os.getenv('DASHBOARD_SUMMARY_TTL', '15'))
+CACHE_KEY = 'dashboard:summary'
+summary_flight = SingleFlight('dashboard_summary')
+MAX_WORKERS = 8
+
+
+def count(query):
+    return int(query.count(alias='total').get()[0][0].value)
+
+
+def summary_queries(now):
+    """(section, key) -> query for every number on the dashboard"""
+    tickets = db.collection('tickets')
+    queries = {('total', None): tickets}
+    for ticket_status in STATUSES:
+        queries[('by_status', ticket_status)] = tickets.where('status', '==', ticket_status)
+    for priority in PRIORITY_RANK:
+        queries[('by_priority', priority)] = tickets.where('priority', '==', priority)
+    queries[('breached', 'marked')] = tickets.where('status', '==', 'Breached')
+    queries[('breached', 'overdue')] = tickets.where('status', 'in', AT_RISK_STATUSES).where('sla_deadline', '<', now)
+    queries[('unassigned_open', None)] = tickets.where('status', 'in', OPEN_STATUSES).where('assigned_to', '==', None)
+
+    agents = db.collection('users').where('role', 'in', ['agent', 'admin']).select(['username', 'name', 'role']).stream()
+    for agent in agents:
+        queries[('open_per_agent', agent.id)] = (
+            tickets.where('status', 'in', OPEN_STATUSES).where('assigned_to', '==', agent.id))
+    return queries
+
+
+def compute_summary():
+    now = datetime.now()
+    queries = summary_queries(now)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        counts = dict(zip(queries, pool.map(count, queries.values())))
+
+    summary = {'by_status': {}, 'by_priority': {}, 'open_per_agent': {}, 'generated_at': now.isoformat()}
+    for (section, key), value in counts.items():
+        if section in ('total', 'unassigned_open'):
+            summary[section] = value
+        elif section != 'breached':
+            summary[section][key] = value
+    summary['breached'] = counts[('breached', 'marked')] + counts[('breached', 'overdue')]
+    summary['open'] = sum(summary['by_status'][s] for s in OPEN_STATUSES)
+    summary['aggregation_queries'] = len(queries)
+    return summary
+
+
+async def get_summary(refresh=False):
+    """Cached summary (shared across workers when the responses cache is Redis)"""
+    cache = caches['responses']
+    summary = None if refresh else await sync_to_async(cache.get)(CACHE_KEY)
+    if summary is None:
+        # Concurrent misses (or refreshes) run the aggregation queries once, off the event loop
+        compute = sync_to_async(store_summary, thread_sensitive=False)
+        summary = await summary_flight.do_async(CACHE_KEY, lambda: compute(cache))
+    return summary
+
+
+def store_summary(cache):
+    summary = compute_summary()
+    cache.set(CACHE_KEY, summary, SUMMARY_TTL)
+    return summary
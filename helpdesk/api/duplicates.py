@@ -0,0 +1,128 @@
+"""
+Near-duplicate ticket detection
+Title and description are shingled and reduced to a MinHash signature
+(one-permutation hashing: one hash per shingle spread over NUM_BINS bins),
+which is cut into LSH bands. Open tickets store their band keys in
+dedupe_bands, so finding candidates is one array-contains-any query on an
+indexed field however large the collection grows. Candidates are then
+checked with exact shingle Jaccard similarity.
+"""
+
+import re
+import struct
+import zlib
+
+from .counters import OPEN_STATUSES
+from .firebase_config import db
+
+SHINGLE_SIZE = 5
+MAX_TEXT = 2000
+NUM_BINS = 32
+BANDS = 8
+ROWS = NUM_BINS // BANDS
+# Pairs above ~(1/BANDS)^(1/ROWS) = 0.59 similarity usually share a band
+DUPLICATE_THRESHOLD = 0.5
+# New tickets this similar to an open one are linked to it and go to its assignee
+LINK_THRESHOLD = 0.8
+MAX_CANDIDATES = 50
+MAX_RESULTS = 5
+
+HASH_MASK = 0xFFFFFFFF
+BIN_SHIFT = 32 - (NUM_BINS - 1).bit_length()
+EMPTY = HASH_MASK + 1
+
+
+def normalize(title, description):
+    text = f'{title or ""} {description or ""}'.lower()[:MAX_TEXT]
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def shingles(title, description):
+    text = normalize(title, description)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(shingle_set):
+    """One-permutation MinHash: min hash per bin, empty bins filled from the next non-empty one"""
+    bins = [EMPTY] * NUM_BINS
+    for shingle in shingle_set:
+        # crc32 is stable across processes; the multiply spreads its bits
+        h = (zlib.crc32(shingle.encode('utf-8')) * 0x9E3779B1) & HASH_MASK
+        b = h >> BIN_SHIFT
+        if h < bins[b]:
+            bins[b] = h
+    if all(value == EMPTY for value in bins):
+        return bins
+    for b in range(NUM_BINS):
+        step = 1
+        while bins[b] == EMPTY:
+            # Rotation densification, offset so borrowed values differ from the source bin
+            source = bins[(b + step) % NUM_BINS]
+            if source != EMPTY:
+                bins[b] = (source + step * 0x61C88647) & HASH_MASK
+            step += 1
+    return bins
+
+
+def band_keys(title, description):
+    """LSH band keys stored on the ticket (empty for tickets without text)"""
+    shingle_set = shingles(title, description)
+    if not shingle_set:
+        return []
+    sig = signature(shingle_set)
+    keys = []
+    for band in range(BANDS):
+        rows = struct.pack(f'>{ROWS}I', *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append((band << 32) | zlib.crc32(rows))
+    return keys
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicates(title, description, bands=None, exclude=None):
+    """Open tickets similar to this text, best first: [{id, ticket_id, title, status, assigned_to, created_by, similarity}]"""
+    bands = band_keys(title, description) if bands is None else bands
+    if not bands:
+        return []
+    wanted = shingles(title, description)
+    docs = (db.collection('tickets').where('dedupe_bands', 'array_contains_any', bands)
+            .select(['ticket_id', 'title', 'description', 'status', 'assigned_to', 'created_by'])
+            .limit(MAX_CANDIDATES).stream())
+    matches = []
+    for doc in docs:
+        ticket = doc.to_dict()
+        if doc.id == exclude or ticket.get('status') not in OPEN_STATUSES:
+            continue
+        similarity = jaccard(wanted, shingles(ticket.get('title'), ticket.get('description')))
+        if similarity >= DUPLICATE_THRESHOLD:
+            matches.append({
+                'id': doc.id,
+                'ticket_id': ticket.get('ticket_id'),
+                'title': ticket.get('title'),
+                'status': ticket.get('status'),
+                'assigned_to': ticket.get('assigned_to'),
+                'created_by': ticket.get('created_by'),
+                'similarity': round(similarity, 3),
+            })
+    matches.sort(key=lambda match: -match['similarity'])
+    return matches[:MAX_RESULTS]
+
+
+def bands_update(ticket, new_status):
+    """
+    dedupe_bands value for a status change, or None to leave it: only open
+    tickets stay in the index, so candidate queries don't grow with history
+    """
+    was_open = ticket.get('status') in OPEN_STATUSES
+    is_open = new_status in OPEN_STATUSES
+    if was_open and not is_open and ticket.get('dedupe_bands'):
+        return []
+    if is_open and not was_open:
+        return band_keys(ticket.get('title'), ticket.get('description'))
+    return None
@@ -0,0 +1,44 @@
+"""
+Conditional requests for ticket detail
+Weak ETags are derived from the ticket ID and its version, which every write
+path bumps. GET answers If-None-Match with a 304 after reading only the
+version and owners, not the ticket's timeline and comments.
+"""
+
+from .firebase_config import db
+
+VERSION_FIELDS = ['version', 'created_by', 'assigned_to']
+
+
+def ticket_etag(ticket_id, version):
+    return f'W/"{ticket_id}-v{version}"'
+
+
+def etag_matches(header, etag):
+    """Weak comparison against an If-None-Match / If-Match header value"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def ticket_version(ticket_id):
+    """
+    (version, created_by, assigned_to) of a ticket in the hot collection, else
+    None. Read from Firestore as a projection on every conditional GET, so a
+    write by any worker is seen at once; the owners are read too so a 304
+    goes through the same access checks as a full read.
+    """
+    doc = db.collection('tickets').document(ticket_id).get(field_paths=VERSION_FIELDS)
+    if not doc.exists:
+        return None
+    ticket = doc.to_dict()
+    return ticket.get('version'), ticket.get('created_by'), ticket.get('assigned_to')
@@ -0,0 +1,103 @@
+"""
+Streaming ticket export
+Tickets are read from Firestore one cursor page at a time and pushed through
+a generator pipeline (page -> rows -> encoded chunks -> optional gzip), so an
+export holds at most one page in memory regardless of how many tickets exist.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from .firebase_config import db
+
+PAGE_SIZE = 500
+
+CSV_FIELDS = [
+    'ticket_id', 'id', 'title', 'description', 'status', 'priority', 'category',
+    'created_by', 'created_by_username', 'assigned_to', 'assigned_to_username',
+    'created_at', 'updated_at', 'sla_deadline', 'resolved_at', 'closed_at',
+    'reopen_count', 'rating', 'feedback',
+]
+
+
+def parse_date(value, end=False):
+    """YYYY-MM-DD (or full ISO) -> datetime; an end date covers the whole day"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def iter_ticket_pages(date_from=None, date_to=None, status=None, agent=None, page_size=PAGE_SIZE):
+    """Yield lists of (doc_id, ticket) ordered by created_at, one Firestore page at a time"""
+    query = db.collection('tickets')
+    if status:
+        query = query.where('status', '==', status)
+    if agent:
+        query = query.where('assigned_to', '==', agent)
+    if date_from:
+        query = query.where('created_at', '>=', date_from)
+    if date_to:
+        query = query.where('created_at', '<', date_to)
+    query = query.order_by('created_at').limit(page_size)
+
+    last = None
+    while True:
+        docs = list((query.start_after(last) if last else query).stream())
+        if not docs:
+            return
+        yield [(doc.id, doc.to_dict()) for doc in docs]
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def _csv_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def csv_chunks(pages):
+    """Header, then one CSV chunk per page"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for page in pages:
+        for doc_id, ticket in page:
+            row = {field: _csv_value(ticket.get(field)) for field in CSV_FIELDS}
+            row['id'] = doc_id
+            row['created_by_username'] = (ticket.get('created_by_display') or {}).get('username', '')
+            row['assigned_to_username'] = (ticket.get('assigned_to_display') or {}).get('username', '')
+            writer.writerow(row)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    remaining = buffer.getvalue()
+    if remaining:
+        yield remaining.encode('utf-8')
+
+
+def jsonl_chunks(pages, serialize):
+    """One JSON object per line, serialized the same way as the ticket API"""
+    for page in pages:
+        lines = []
+        for doc_id, ticket in page:
+            ticket['id'] = doc_id
+            lines.append(json.dumps(serialize(ticket), default=str))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a byte stream on the fly (gzip container, flushed per page)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -2,10 +2,16 @@ import os
 import json
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
+from .instrumented_firestore import instrument
 
 # Initialize Firebase Admin SDK using environment variables
 # This is more secure than hardcoding credentials
 def initialize_firebase():
+    # Offline in-memory backend (benchmarks, local experiments) - no credentials needed
+    if os.environ.get('FIRESTORE_BACKEND') == 'memory':
+        from .memory_firestore import MemoryFirestore
+        return MemoryFirestore()
+
     if not firebase_admin._apps:
         # Check if running in production (using environment variables)
         firebase_creds = os.environ.get('FIREBASE_CREDENTIALS')
@@ -23,5 +29,5 @@ def initialize_firebase():
     
     return firestore.client()
 
-# Initialize and export the Firestore client
-db = initialize_firebase()
\ No newline at end of file
+# Initialize and export the Firestore client (wrapped for metrics)
+db = instrument(initialize_firebase())
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""
+Deadlines, retries and a circuit breaker for Firestore calls
+Every call made through the instrumented client runs here. DeadlineMiddleware
+gives each API request a deadline; each call gets what is left of it as its
+RPC timeout (instead of the client's own minute-long retry policy), and a
+request that is out of time fails without calling Firestore. Idempotent reads
+(document gets, queries until their first document, aggregations, get_all)
+retry transient errors with full-jitter backoff inside the deadline. Writes
+are tried once, since Increment and create() aren't safe to repeat. A circuit
+breaker tracks the outcome of recent calls (after their retries) and, when
+most of them fail, rejects calls for a cool-down period, so a Firestore
+brownout fails fast with 503 and Retry-After instead of tying up every worker.
+"""
+
+import contextvars
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from django.http import JsonResponse
+from google.api_core import exceptions as google_exceptions
+
+from . import metrics
+
+logger = logging.getLogger('helpdesk.firestore')
+
+# Seconds an API request may spend on Firestore in total
+REQUEST_DEADLINE = float(os.getenv('FIRESTORE_REQUEST_DEADLINE', '10'))
+# Cap on a single RPC, also the timeout for calls outside a request (workers, commands)
+CALL_TIMEOUT = float(os.getenv('FIRESTORE_CALL_TIMEOUT', '5'))
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.05
+MAX_BACKOFF = 1.0
+
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 10
+BREAKER_FAILURE_RATIO = 0.5
+BREAKER_COOLDOWN = float(os.getenv('FIRESTORE_BREAKER_COOLDOWN', '15'))
+
+# Errors that say nothing about the request itself; anything else (NotFound,
+# AlreadyExists, FailedPrecondition...) means Firestore answered
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,  # includes DeadlineExceeded
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,  # includes ResourceExhausted
+    google_exceptions.Aborted,
+    ConnectionError,
+)
+
+
+class FirestoreUnavailable(Exception):
+    """Raised instead of calling Firestore: the circuit is open or the request is out of time"""
+
+    def __init__(self, code, message, retry_after=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.retry_after = retry_after
+
+
+# What DeadlineMiddleware answers with 503/504; catch-all handlers in views re-raise these
+UNAVAILABLE_ERRORS = (FirestoreUnavailable,) + TRANSIENT_ERRORS
+
+
+class RequestBudget:
+    __slots__ = ('deadline',)
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+
+_budget = contextvars.ContextVar('helpdesk_firestore_budget', default=None)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass and outcomes fill a sliding window; when at least
+    min_calls are recorded and failure_ratio of them failed, it opens.
+    Open: calls are rejected until cooldown has passed. Half-open: one probe
+    call goes through; success closes the circuit, failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_ratio=BREAKER_FAILURE_RATIO, cooldown=BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.outcomes = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def retry_after(self):
+        return max(1, math.ceil(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def before_call(self):
+        """Raises FirestoreUnavailable if the call must not go out"""
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    raise FirestoreUnavailable('FIRESTORE_UNAVAILABLE', 'Database temporarily unavailable',
+                                               self.retry_after())
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    raise FirestoreUnavailable('FIRESTORE_UNAVAILABLE', 'Database temporarily unavailable', 1)
+                self.probing = True
+
+    def record(self, ok):
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.probing = False
+                self._transition(self.CLOSED if ok else self.OPEN)
+                return
+            if self.state == self.OPEN:
+                return
+            self.outcomes.append(ok)
+            if len(self.outcomes) >= self.min_calls:
+                failures = self.outcomes.count(False)
+                if failures / len(self.outcomes) >= self.failure_ratio:
+                    self._transition(self.OPEN)
+
+    def _transition(self, state):
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        if state == self.CLOSED:
+            self.outcomes.clear()
+        logger.warning('Firestore circuit %s', state, extra={'from_state': self.state, 'to_state': state})
+        metrics.firestore_circuit_transitions.inc(1, (state,))
+        self.state = state
+
+    def reset(self):
+        with self.lock:
+            self.outcomes.clear()
+            self.state = self.CLOSED
+            self.probing = False
+
+
+breaker = CircuitBreaker()
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None outside a request"""
+    budget = _budget.get()
+    return None if budget is None else budget.deadline - time.monotonic()
+
+
+def _attempt_timeout(operation):
+    left = remaining()
+    if left is None:
+        return CALL_TIMEOUT
+    if left <= 0:
+        metrics.firestore_rejections.inc(1, (operation, 'deadline'))
+        raise FirestoreUnavailable('DEADLINE_EXCEEDED', 'Request ran out of time waiting for the database')
+    return min(CALL_TIMEOUT, left)
+
+
+def _admit(operation):
+    try:
+        breaker.before_call()
+    except FirestoreUnavailable as e:
+        metrics.firestore_rejections.inc(1, (operation, 'circuit_open'))
+        raise
+
+
+def _backoff(attempt):
+    """Sleep before another attempt; False when the deadline leaves no room for one"""
+    delay = random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt))
+    left = remaining()
+    if left is not None and delay >= left:
+        return False
+    time.sleep(delay)
+    return True
+
+
+def _transient_failure(operation, error, attempt, idempotent):
+    """Record a transient error; True if the call should be retried"""
+    metrics.firestore_errors.inc(1, (operation, type(error).__name__))
+    if idempotent and attempt < MAX_ATTEMPTS and _backoff(attempt):
+        metrics.firestore_retries.inc(1, (operation,))
+        return True
+    breaker.record(False)
+    return False
+
+
+def rpc_options(kwargs, timeout):
+    """Client kwargs for one attempt: our timeout, and no client-side retries on top of ours"""
+    options = dict(kwargs)
+    options.setdefault('timeout', timeout)
+    options.setdefault('retry', None)
+    return options
+
+
+def call(operation, fn, idempotent=True):
+    """fn(timeout) under the request deadline, retries (if idempotent) and the circuit breaker"""
+    _admit(operation)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = fn(_attempt_timeout(operation))
+        except TRANSIENT_ERRORS as e:
+            if _transient_failure(operation, e, attempt, idempotent):
+                continue
+            raise
+        except FirestoreUnavailable:
+            breaker.record(False)
+            raise
+        except Exception:
+            breaker.record(True)
+            raise
+        breaker.record(True)
+        return result
+
+
+_END = object()
+
+
+def stream(operation, open_stream):
+    """
+    Iterate open_stream(timeout). Attempts are retried until the first
+    document arrives; after that a failure can't be retried without
+    repeating documents, so it propagates.
+    """
+    _admit(operation)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            iterator = iter(open_stream(_attempt_timeout(operation)))
+            first = next(iterator, _END)
+        except TRANSIENT_ERRORS as e:
+            if _transient_failure(operation, e, attempt, True):
+                continue
+            raise
+        except FirestoreUnavailable:
+            breaker.record(False)
+            raise
+        except Exception:
+            breaker.record(True)
+            raise
+        breaker.record(True)
+        break
+    if first is _END:
+        return
+    yield first
+    try:
+        yield from iterator
+    except TRANSIENT_ERRORS as e:
+        metrics.firestore_errors.inc(1, (operation, type(e).__name__))
+        raise
+
+
+def unavailable_response(error):
+    if isinstance(error, FirestoreUnavailable) and error.code == 'DEADLINE_EXCEEDED':
+        return JsonResponse({'error': {'code': error.code, 'message': error.message}}, status=504)
+    retry_after = getattr(error, 'retry_after', None) or 1
+    response = JsonResponse({
+        'error': {
+            'code': 'FIRESTORE_UNAVAILABLE',
+            'message': 'Database temporarily unavailable. Please try again shortly.',
+            'retry_after': retry_after
+        }
+    }, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class DeadlineMiddleware:
+    """
+    Gives each API request REQUEST_DEADLINE seconds of Firestore time. A
+    Firestore failure the view lets through (open circuit, exhausted retries
+    or deadline) answers 503 with Retry-After (504 for the deadline); errors
+    the view handles itself keep its own response. Streaming bodies (SSE,
+    export) run after the view returns and are not bound by the deadline.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+        budget = RequestBudget(time.monotonic() + REQUEST_DEADLINE)
+        token = _budget.set(budget)
+        try:
+            return self.get_response(request)
+        finally:
+            _budget.reset(token)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, UNAVAILABLE_ERRORS):
+            return unavailable_response(exception)
+        return None
@@ -0,0 +1,246 @@
+"""
+Instrumented Firestore client for HelpDesk API
+Thin proxies around the Firestore client, queries, documents and batches
+that report reads/writes/queries (and documents streamed per query) to
+api.metrics, and tell write listeners (e.g. the response cache) which
+collections a committed write touched. Every RPC goes through
+firestore_guard for its deadline, retries and circuit breaker. Anything not
+wrapped passes straight through.
+"""
+
+import logging
+
+from . import firestore_guard, metrics
+
+logger = logging.getLogger('helpdesk.firestore')
+
+_write_listeners = []
+
+
+def add_write_listener(listener):
+    """listener(collections) is called after every committed write with the collection names it touched"""
+    _write_listeners.append(listener)
+
+
+def notify_write(collections):
+    for listener in _write_listeners:
+        try:
+            listener(collections)
+        except Exception:
+            logger.warning('Write listener failed', exc_info=True)
+
+
+def unwrap(ref):
+    return getattr(ref, '_target', ref)
+
+
+def collection_of(ref):
+    collection = getattr(ref, '_collection', None)
+    if collection is None:
+        parent = getattr(ref, 'parent', None)
+        collection = getattr(parent, 'id', None)
+    return collection
+
+
+class _Proxy:
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __eq__(self, other):
+        return self._target == unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+
+class InstrumentedQuery(_Proxy):
+    """Wraps CollectionReference and Query objects"""
+
+    def __init__(self, target, collection):
+        super().__init__(target)
+        self._collection = collection
+
+    def _wrap(self, query):
+        return InstrumentedQuery(query, self._collection)
+
+    def where(self, *args, **kwargs):
+        return self._wrap(self._target.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._wrap(self._target.order_by(*args, **kwargs))
+
+    def limit(self, *args, **kwargs):
+        return self._wrap(self._target.limit(*args, **kwargs))
+
+    def offset(self, *args, **kwargs):
+        return self._wrap(self._target.offset(*args, **kwargs))
+
+    def select(self, *args, **kwargs):
+        return self._wrap(self._target.select(*args, **kwargs))
+
+    def start_after(self, *args, **kwargs):
+        return self._wrap(self._target.start_after(*args, **kwargs))
+
+    def start_at(self, *args, **kwargs):
+        return self._wrap(self._target.start_at(*args, **kwargs))
+
+    def end_before(self, *args, **kwargs):
+        return self._wrap(self._target.end_before(*args, **kwargs))
+
+    def stream(self, *args, **kwargs):
+        metrics.record_firestore('query', 1, self._collection)
+        count = 0
+        try:
+            docs = firestore_guard.stream(
+                'query', lambda timeout: self._target.stream(*args, **firestore_guard.rpc_options(kwargs, timeout)))
+            for doc in docs:
+                count += 1
+                yield doc
+        finally:
+            # Firestore bills at least one read per query
+            metrics.record_firestore('read', max(count, 1), self._collection)
+            metrics.record_query_documents(self._collection, count)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+    def count(self, *args, **kwargs):
+        return InstrumentedAggregation(self._target.count(*args, **kwargs), self._collection, ['count'])
+
+    def sum(self, *args, **kwargs):
+        return InstrumentedAggregation(self._target.sum(*args, **kwargs), self._collection, ['sum'])
+
+    def avg(self, *args, **kwargs):
+        return InstrumentedAggregation(self._target.avg(*args, **kwargs), self._collection, ['avg'])
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._target.document(*args, **kwargs), self._collection)
+
+    def add(self, document_data, *args, **kwargs):
+        metrics.record_firestore('write', 1, self._collection)
+        update_time, ref = firestore_guard.call('write', lambda timeout: self._target.add(
+            document_data, *args, **firestore_guard.rpc_options(kwargs, timeout)), idempotent=False)
+        notify_write({self._collection})
+        return update_time, InstrumentedDocument(ref, self._collection)
+
+
+class InstrumentedAggregation(_Proxy):
+    """Wraps AggregationQuery objects; billed per 1000 index entries matched, not per document"""
+
+    def __init__(self, target, collection, kinds):
+        super().__init__(target)
+        self._collection = collection
+        self._kinds = kinds
+
+    def _wrap(self, aggregation, kind):
+        return InstrumentedAggregation(aggregation, self._collection, self._kinds + [kind])
+
+    def count(self, *args, **kwargs):
+        return self._wrap(self._target.count(*args, **kwargs), 'count')
+
+    def sum(self, *args, **kwargs):
+        return self._wrap(self._target.sum(*args, **kwargs), 'sum')
+
+    def avg(self, *args, **kwargs):
+        return self._wrap(self._target.avg(*args, **kwargs), 'avg')
+
+    def get(self, *args, **kwargs):
+        metrics.record_firestore('query', 1, self._collection)
+        results = firestore_guard.call(
+            'aggregate', lambda timeout: self._target.get(*args, **firestore_guard.rpc_options(kwargs, timeout)))
+        # Entries matched is only known from a count; otherwise bill the minimum
+        matched = max([r.value for row in results for kind, r in zip(self._kinds, row) if kind == 'count'] or [0])
+        metrics.record_firestore('read', max(-(-matched // 1000), 1), self._collection)
+        return results
+
+
+class InstrumentedDocument(_Proxy):
+    def __init__(self, target, collection):
+        super().__init__(target)
+        self._collection = collection
+
+    def collection(self, name):
+        return InstrumentedQuery(self._target.collection(name), name)
+
+    def get(self, *args, **kwargs):
+        metrics.record_firestore('read', 1, self._collection)
+        return firestore_guard.call(
+            'get', lambda timeout: self._target.get(*args, **firestore_guard.rpc_options(kwargs, timeout)))
+
+    def _write(self, method, args, kwargs):
+        metrics.record_firestore('write', 1, self._collection)
+        write = getattr(self._target, method)
+        result = firestore_guard.call(
+            'write', lambda timeout: write(*args, **firestore_guard.rpc_options(kwargs, timeout)), idempotent=False)
+        notify_write({self._collection})
+        return result
+
+    def set(self, *args, **kwargs):
+        return self._write('set', args, kwargs)
+
+    def create(self, *args, **kwargs):
+        return self._write('create', args, kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write('update', args, kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write('delete', args, kwargs)
+
+
+class InstrumentedBatch(_Proxy):
+    def __init__(self, target):
+        super().__init__(target)
+        self._pending = 0
+        self._collections = set()
+
+    def _add(self, reference):
+        self._pending += 1
+        self._collections.add(collection_of(reference))
+        return unwrap(reference)
+
+    def set(self, reference, *args, **kwargs):
+        return self._target.set(self._add(reference), *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        return self._target.create(self._add(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._target.update(self._add(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._target.delete(self._add(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        result = firestore_guard.call('commit', lambda timeout: self._target.commit(
+            *args, **firestore_guard.rpc_options(kwargs, timeout)), idempotent=False)
+        metrics.record_firestore('write', self._pending)
+        collections, self._collections = self._collections, set()
+        self._pending = 0
+        notify_write(collections)
+        return result
+
+
+class InstrumentedClient(_Proxy):
+    def collection(self, path):
+        return InstrumentedQuery(self._target.collection(path), path.rsplit('/', 1)[-1])
+
+    def document(self, path):
+        collection = path.rsplit('/', 2)[-2] if '/' in path else path
+        return InstrumentedDocument(self._target.document(path), collection)
+
+    def batch(self):
+        return InstrumentedBatch(self._target.batch())
+
+    def get_all(self, references, *args, **kwargs):
+        references = [unwrap(ref) for ref in references]
+        metrics.record_firestore('read', len(references))
+        return firestore_guard.stream('get_all', lambda timeout: self._target.get_all(
+            references, *args, **firestore_guard.rpc_options(kwargs, timeout)))
+
+
+def instrument(client):
+    return InstrumentedClient(client)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import ARCHIVE_AFTER_DAYS, archive_closed_tickets, get_archive
+
+
+class Command(BaseCommand):
+    help = 'Move tickets closed or resolved more than N days ago into cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help=f'Archive tickets closed more than this many days ago (default {ARCHIVE_AFTER_DAYS})')
+        parser.add_argument('--backend', choices=['firestore', 'segments'],
+                            help='Override TICKET_ARCHIVE_BACKEND')
+        parser.add_argument('--dry-run', action='store_true', help='Count tickets that would be archived')
+
+    def handle(self, *args, **options):
+        archive = get_archive(options['backend'])
+        moved = archive_closed_tickets(days=options['days'], archive=archive, dry_run=options['dry_run'])
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {moved} ticket(s)'))
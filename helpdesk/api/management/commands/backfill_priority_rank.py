@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.work_queue import backfill_priority_rank
+
+
+class Command(BaseCommand):
+    help = 'Set priority_rank on tickets created before the work queue existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Count tickets without writing')
+
+    def handle(self, *args, **options):
+        fixed = backfill_priority_rank(dry_run=options['dry_run'])
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} ticket(s)'))
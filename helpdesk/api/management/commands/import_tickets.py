@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ticket_import import DEFAULT_BATCH_SIZE, import_tickets
+
+
+class Command(BaseCommand):
+    help = 'Bulk import tickets from a CSV or JSONL file (optionally gzipped), resumable via --checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file (.gz allowed)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Override detection from the file extension')
+        parser.add_argument('--checkpoint', help='Checkpoint file; re-run with the same file to resume')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent batch commits (default 4)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f'Tickets per Firestore batch (default {DEFAULT_BATCH_SIZE}, max 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['batch_size'] <= 500:
+            raise CommandError('--batch-size must be between 1 and 500')
+        started = time.perf_counter()
+        last_report = [0.0]
+
+        def progress(state):
+            now = time.perf_counter()
+            if now - last_report[0] >= 2:
+                last_report[0] = now
+                rate = state['imported'] / (now - started)
+                self.stdout.write(
+                    f"{state['next_row']}/{state['total']} rows, {state['imported']} imported, "
+                    f"{state['failed']} invalid ({rate:.0f} tickets/s)"
+                )
+
+        try:
+            result = import_tickets(
+                options['path'], file_format=options['format'], checkpoint_path=options['checkpoint'],
+                workers=options['workers'], batch_size=options['batch_size'],
+                dry_run=options['dry_run'], progress=progress,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            valid = result['total'] - result['failed']
+            self.stdout.write(self.style.SUCCESS(f"{valid} valid row(s), {result['failed']} invalid"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {result['imported']} ticket(s) in {elapsed:.1f}s, {result['failed']} invalid row(s)"
+            ))
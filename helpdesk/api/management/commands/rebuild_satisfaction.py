@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.satisfaction import rebuild_satisfaction
+
+
+class Command(BaseCommand):
+    help = 'Recompute satisfaction aggregates from rated tickets and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing corrections')
+
+    def handle(self, *args, **options):
+        corrections = rebuild_satisfaction(dry_run=options['dry_run'])
+        for correction in corrections:
+            name = correction['scope'] if correction['key'] is None else f"{correction['scope']} {correction['key']}"
+            self.stdout.write(f"{name}: recorded {correction['recorded']} ratings, actual {correction['actual']}")
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} drift on {len(corrections)} aggregate(s)'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import reconcile_workloads
+
+
+class Command(BaseCommand):
+    help = 'Recompute agent/admin workload counters from open tickets and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing corrections')
+
+    def handle(self, *args, **options):
+        corrections = reconcile_workloads(dry_run=options['dry_run'])
+        for correction in corrections:
+            self.stdout.write(
+                f"{correction['uid']}: recorded {correction['recorded']}, actual {correction['actual']} (drift {correction['drift']:+d})"
+            )
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} drift on {len(corrections)} counter(s)'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.outbox import OutboxWorker, drain
+
+
+class Command(BaseCommand):
+    help = 'Apply ticket side effects from the outbox (use with OUTBOX_WORKER=off on web processes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Events delivered concurrently')
+        parser.add_argument('--once', action='store_true', help='Drain everything due now and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = 0
+            while True:
+                claimed = drain()
+                total += claimed
+                if not claimed:
+                    break
+            self.stdout.write(self.style.SUCCESS(f'Delivered {total} event(s)'))
+            return
+
+        worker = OutboxWorker(workers=options['workers'])
+        worker.start()
+        self.stdout.write(f'Outbox worker running with {worker.workers} worker(s); Ctrl+C to stop')
+        try:
+            while worker.thread.is_alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            worker.stop(timeout=30)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.authentication import backfill_claims
+
+
+class Command(BaseCommand):
+    help = 'Copy role, verified and account_status from user documents into Firebase custom claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Count users without writing')
+
+    def handle(self, *args, **options):
+        fixed = backfill_claims(dry_run=options['dry_run'])
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} claims for {fixed} user(s)'))
@@ -0,0 +1,778 @@
+"""
+In-memory Firestore stand-in for HelpDesk API
+Implements the subset of the google-cloud-firestore client the app uses
+(collections, documents, queries, batches, get_all, on_snapshot, update-time
+preconditions on deletes) and counts reads/writes/queries so benchmarks can
+report Firestore cost per operation.
+set_fault_hook() injects latency and errors into every RPC to exercise the
+retry and circuit-breaker paths in firestore_guard.py.
+Enable with FIRESTORE_BACKEND=memory (see firebase_config.py).
+"""
+
+import datetime
+import math
+import random
+import string
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1.aggregation import AggregationResult
+from google.cloud.firestore_v1.transforms import (
+    ArrayRemove, ArrayUnion, DELETE_FIELD, Increment, SERVER_TIMESTAMP,
+)
+
+AUTO_ID_CHARS = string.ascii_letters + string.digits
+MAX_BATCH_WRITES = 500
+# Aggregation queries are billed one read per this many index entries matched
+AGGREGATION_ENTRIES_PER_READ = 1000
+
+
+class MemoryFirestoreError(Exception):
+    """Raised for requests real Firestore would reject (e.g. oversized batches)"""
+
+
+def copy_value(value):
+    """Copy dicts/lists so callers can't mutate stored data (like deserializing)"""
+    if isinstance(value, dict):
+        return {k: copy_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_value(v) for v in value]
+    return value
+
+
+def type_rank(value):
+    """Firestore's cross-type ordering: null < bool < number < timestamp < string < ..."""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime.datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def sort_key(value):
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    if type_rank(value) >= 8:
+        return (type_rank(value), repr(value))
+    return (type_rank(value), value)
+
+
+def get_field(data, field_path):
+    """Resolve a dotted field path; returns (found, value)"""
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+class Stats:
+    """Firestore cost counters (billed document reads, writes, queries)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.reads = 0
+            self.writes = 0
+            self.deletes = 0
+            self.queries = 0
+
+    def add(self, reads=0, writes=0, deletes=0, queries=0):
+        with self.lock:
+            self.reads += reads
+            self.writes += writes
+            self.deletes += deletes
+            self.queries += queries
+
+    def snapshot(self):
+        with self.lock:
+            return {'reads': self.reads, 'writes': self.writes, 'deletes': self.deletes, 'queries': self.queries}
+
+
+class ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class DocumentChange:
+    def __init__(self, type_name, document):
+        self.type = ChangeType(type_name)
+        self.document = document
+
+
+class Watch:
+    def __init__(self, client, query, callback):
+        self.client = client
+        self.query = query
+        self.callback = callback
+
+    def unsubscribe(self):
+        self.client._remove_watch(self)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, field_paths=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = reference._client._update_time(reference, data)
+        if data is not None and field_paths:
+            data = {f: data[f] for f in field_paths if f in data}
+        self._data = data
+
+    def to_dict(self):
+        return copy_value(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        found, value = get_field(self._data or {}, field_path)
+        if not found:
+            raise KeyError(field_path)
+        return copy_value(value)
+
+
+class DocumentReference:
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f'{collection_path}/{doc_id}'
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._collection_path)
+
+    def collection(self, name):
+        return CollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        self._client._fault('get', self._collection_path, timeout)
+        self._client.stats.add(reads=1)
+        return DocumentSnapshot(self, self._client._read(self._collection_path, self.id), field_paths)
+
+    def set(self, document_data, merge=False, retry=None, timeout=None):
+        self._client._commit([('set', self, document_data, merge)], timeout)
+
+    def create(self, document_data, retry=None, timeout=None):
+        self._client._commit([('create', self, document_data, False)], timeout)
+
+    def update(self, field_updates, retry=None, timeout=None):
+        self._client._commit([('update', self, field_updates, False)], timeout)
+
+    def delete(self, option=None, retry=None, timeout=None):
+        self._client._commit([('delete', self, option, False)], timeout)
+
+
+class Query:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, client, collection_path, filters=(), orders=(), limit=None, offset=0, cursor=None, projection=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes):
+        params = {
+            'filters': self._filters, 'orders': self._orders, 'limit': self._limit,
+            'offset': self._offset, 'cursor': self._cursor, 'projection': self._projection,
+        }
+        params.update(changes)
+        return Query(self._client, self._collection_path, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        # The client spells array ops array_contains / array_contains_any
+        op_string = op_string.replace('_', '-')
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def _matches(self, data):
+        for field_path, op, value in self._filters:
+            found, actual = get_field(data, field_path)
+            if not found:
+                return False
+            if op == '==' and not actual == value:
+                return False
+            if op == '!=' and (actual == value or actual is None):
+                return False
+            if op == 'in' and actual not in value:
+                return False
+            if op == 'not-in' and (actual in value or actual is None):
+                return False
+            if op == 'array-contains' and not (isinstance(actual, list) and value in actual):
+                return False
+            if op == 'array-contains-any' and not (isinstance(actual, list) and any(v in actual for v in value)):
+                return False
+            if op in ('<', '<=', '>', '>='):
+                if type_rank(actual) != type_rank(value):
+                    return False
+                a, b = sort_key(actual), sort_key(value)
+                if (op == '<' and not a < b) or (op == '<=' and not a <= b) \
+                        or (op == '>' and not a > b) or (op == '>=' and not a >= b):
+                    return False
+        return True
+
+    def _order_fields(self):
+        orders = list(self._orders)
+        # Inequality filters imply an order on that field first
+        for field_path, op, _ in self._filters:
+            if op in ('<', '<=', '>', '>=', '!=', 'not-in') and not any(f == field_path for f, _ in orders):
+                orders.insert(0, (field_path, self.ASCENDING))
+        if not any(f == '__name__' for f, _ in orders):
+            direction = orders[-1][1] if orders else self.ASCENDING
+            orders.append(('__name__', direction))
+        return orders
+
+    def _order_key(self, doc_id, data, orders):
+        key = []
+        for field_path, direction in orders:
+            if field_path == '__name__':
+                value = sort_key(doc_id)
+            else:
+                value = sort_key(get_field(data, field_path)[1])
+            key.append(Descending(value) if direction == self.DESCENDING else value)
+        return tuple(key)
+
+    def _run(self, ordered=True):
+        """Matching (doc_id, data) pairs in query order, before billing"""
+        docs = self._client._candidates(self._collection_path, self._filters)
+        matched = [(doc_id, data) for doc_id, data in docs if self._matches(data)]
+
+        orders = self._order_fields()
+        # Documents missing an ordered field are excluded, like Firestore
+        ordered_fields = [f for f, _ in orders if f != '__name__']
+        if ordered_fields:
+            matched = [(i, d) for i, d in matched if all(get_field(d, f)[0] for f in ordered_fields)]
+        if not ordered and self._cursor is None and not self._offset and self._limit is None:
+            # Aggregations don't need the order unless it decides which documents count
+            return matched
+        matched.sort(key=lambda item: self._order_key(item[0], item[1], orders))
+
+        if self._cursor is not None:
+            if isinstance(self._cursor, DocumentSnapshot):
+                cursor_key = self._order_key(self._cursor.id, self._cursor._data or {}, orders)
+            else:
+                values = dict(self._cursor)
+                cursor_id = values.pop('__name__', None)
+                cursor_key = self._order_key(cursor_id, values, orders)
+            matched = [item for item in matched if self._order_key(item[0], item[1], orders) > cursor_key]
+
+        matched = matched[self._offset:]
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        return matched
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        self._client._fault('query', self._collection_path, timeout)
+        matched = self._run()
+        # A query is billed at least one read even when empty
+        self._client.stats.add(reads=max(len(matched), 1), queries=1)
+        for doc_id, data in matched:
+            ref = DocumentReference(self._client, self._collection_path, doc_id)
+            yield DocumentSnapshot(ref, data, self._projection)
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        return list(self.stream(timeout=timeout))
+
+    def on_snapshot(self, callback):
+        return self._client._add_watch(self, callback)
+
+    def count(self, alias=None):
+        return AggregationQuery(self).count(alias)
+
+    def sum(self, field_ref, alias=None):
+        return AggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return AggregationQuery(self).avg(field_ref, alias)
+
+
+class AggregationQuery:
+    """
+    count/sum/avg over a query's matches without returning the documents.
+    get() returns [[AggregationResult, ...]] like the client; sum and avg
+    ignore non-numeric values and avg is None when nothing is numeric.
+    """
+
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def _add(self, kind, field_ref, alias):
+        alias = alias or f'field_{len(self._aggregations) + 1}'
+        self._aggregations.append((kind, field_ref, alias))
+        return self
+
+    def count(self, alias=None):
+        return self._add('count', None, alias)
+
+    def sum(self, field_ref, alias=None):
+        return self._add('sum', field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return self._add('avg', field_ref, alias)
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        self._query._client._fault('aggregate', self._query._collection_path, timeout)
+        matched = self._query._run(ordered=False)
+        reads = max(math.ceil(len(matched) / AGGREGATION_ENTRIES_PER_READ), 1)
+        self._query._client.stats.add(reads=reads, queries=1)
+        results = []
+        for kind, field_ref, alias in self._aggregations:
+            if kind == 'count':
+                results.append(AggregationResult(alias, len(matched)))
+                continue
+            values = []
+            for _, data in matched:
+                found, value = get_field(data, field_ref)
+                if found and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.append(value)
+            if kind == 'sum':
+                results.append(AggregationResult(alias, sum(values)))
+            else:
+                results.append(AggregationResult(alias, sum(values) / len(values) if values else None))
+        return [results]
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        yield from self.get(transaction, timeout=timeout)
+
+
+class Descending:
+    """Sort-key wrapper inverting comparisons for DESCENDING orders"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return other.value > self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self):
+        if '/' not in self.path:
+            return None
+        parent_path, doc_id = self.path.rsplit('/', 1)[0].rsplit('/', 1)
+        return DocumentReference(self._client, parent_path, doc_id)
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = ''.join(random.choices(AUTO_ID_CHARS, k=20))
+        return DocumentReference(self._client, self.path, document_id)
+
+    def add(self, document_data, document_id=None, retry=None, timeout=None):
+        ref = self.document(document_id)
+        ref.create(document_data, timeout=timeout)
+        return datetime.datetime.now(datetime.timezone.utc), ref
+
+    def list_documents(self):
+        for doc_id in list(self._client._collection(self.path)):
+            yield DocumentReference(self._client, self.path, doc_id)
+
+
+class LastUpdateOption:
+    """Precondition from write_option(): the document is unchanged since this update time"""
+
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference, field_updates, False))
+
+    def delete(self, reference, option=None):
+        self._writes.append(('delete', reference, option, False))
+
+    def commit(self, retry=None, timeout=None):
+        if len(self._writes) > MAX_BATCH_WRITES:
+            raise MemoryFirestoreError(f'maximum {MAX_BATCH_WRITES} writes allowed per request')
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes, timeout)
+
+    def __len__(self):
+        return len(self._writes)
+
+
+class FaultInjector:
+    """
+    Fault hook for MemoryFirestore.set_fault_hook(): each matching RPC waits
+    latency (+ up to jitter) seconds and fails with ServiceUnavailable with
+    probability error_rate. A wait longer than the call's timeout is cut off
+    with DeadlineExceeded, like a real RPC deadline.
+    """
+
+    def __init__(self, error_rate=0.0, latency=0.0, jitter=0.0, operations=None, collections=None, seed=None):
+        self.error_rate = error_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.operations = set(operations) if operations else None
+        self.collections = set(collections) if collections else None
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, operation, collection_path, timeout):
+        if self.operations is not None and operation not in self.operations:
+            return
+        if self.collections is not None and collection_path not in self.collections:
+            return
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            with self.lock:
+                self.failures += 1
+            raise google_exceptions.DeadlineExceeded(f'{operation} exceeded its {timeout:.3f}s deadline')
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self.lock:
+                self.failures += 1
+            raise google_exceptions.ServiceUnavailable(f'Injected fault on {operation}')
+
+
+class MemoryFirestore:
+    """
+    Drop-in for firestore.client(): data lives in dicts keyed by collection path.
+    Equality and array-contains filters use lazily built hash indexes (like
+    Firestore's automatic single-field indexes), so scans cost what the
+    matching set costs.
+    """
+
+    def __init__(self):
+        self.stats = Stats()
+        self._lock = threading.RLock()
+        self._data = {}      # collection path -> {doc_id: data}
+        self._indexes = {}   # (collection path, field) -> {value: set(doc_ids)}
+        self._array_indexes = {}  # same, keyed by each element of array fields
+        self._watches = []
+        self._update_times = {}  # (collection path, doc_id) -> (stored data, update time)
+        self._last_commit = None
+        self._fault_hook = None
+
+    # -- client API ---------------------------------------------------------
+
+    def collection(self, path):
+        return CollectionReference(self, path)
+
+    def document(self, path):
+        collection_path, doc_id = path.rsplit('/', 1)
+        return DocumentReference(self, collection_path, doc_id)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    @staticmethod
+    def write_option(last_update_time):
+        return LastUpdateOption(last_update_time)
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        references = list(references)
+        self._fault('get_all', references[0]._collection_path if references else None, timeout)
+        self.stats.add(reads=len(references))
+        for ref in references:
+            yield DocumentSnapshot(ref, self._read(ref._collection_path, ref.id), field_paths)
+
+    def collections(self):
+        return [CollectionReference(self, path) for path in self._data if '/' not in path]
+
+    # -- test/benchmark helpers ---------------------------------------------
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+            self._indexes = {}
+            self._array_indexes = {}
+            self._watches = []
+            self._update_times = {}
+        self._fault_hook = None
+        self.stats.reset()
+
+    def set_fault_hook(self, hook):
+        """
+        hook(operation, collection_path, timeout) runs before every RPC
+        (get, query, aggregate, get_all, commit) and may sleep or raise, e.g.
+        a FaultInjector. None removes it.
+        """
+        self._fault_hook = hook
+
+    def load(self, collection_path, documents):
+        """Bulk-load {doc_id: data} without billing writes or notifying watches"""
+        with self._lock:
+            self._collection(collection_path).update(documents)
+            for indexes in (self._indexes, self._array_indexes):
+                for (path, field) in list(indexes):
+                    if path == collection_path:
+                        del indexes[(path, field)]
+
+    # -- internals ----------------------------------------------------------
+
+    def _collection(self, path):
+        return self._data.setdefault(path, {})
+
+    def _update_time(self, reference, data):
+        """When the stored document `data` was written (None for data that is no longer stored)"""
+        if data is None:
+            return None
+        with self._lock:
+            entry = self._update_times.get((reference._collection_path, reference.id))
+        return entry[1] if entry is not None and entry[0] is data else None
+
+    def _read(self, collection_path, doc_id):
+        with self._lock:
+            return self._data.get(collection_path, {}).get(doc_id)
+
+    def _candidates(self, collection_path, filters):
+        """Docs that may match, narrowed by the most selective equality index"""
+        with self._lock:
+            docs = self._data.get(collection_path, {})
+            best = None
+            for field_path, op, value in filters:
+                if op in ('==', 'in'):
+                    index = self._index(collection_path, field_path)
+                elif op in ('array-contains', 'array-contains-any'):
+                    index = self._index(collection_path, field_path, array=True)
+                else:
+                    continue
+                values = value if op in ('in', 'array-contains-any') else [value]
+                try:
+                    ids = set().union(*(index.get(v, ()) for v in values))
+                except TypeError:
+                    continue  # Unhashable filter value - fall back to scanning
+                if best is None or len(ids) < len(best):
+                    best = ids
+            if best is None:
+                return list(docs.items())
+            return [(doc_id, docs[doc_id]) for doc_id in best if doc_id in docs]
+
+    def _index(self, collection_path, field_path, array=False):
+        indexes = self._array_indexes if array else self._indexes
+        key = (collection_path, field_path)
+        index = indexes.get(key)
+        if index is None:
+            index = {}
+            for doc_id, data in self._data.get(collection_path, {}).items():
+                self._index_add(index, field_path, doc_id, data, array)
+            indexes[key] = index
+        return index
+
+    @staticmethod
+    def _index_values(data, field_path, array):
+        found, value = get_field(data, field_path)
+        if not found:
+            return []
+        if array:
+            return value if isinstance(value, list) else []
+        return [value]
+
+    @classmethod
+    def _index_add(cls, index, field_path, doc_id, data, array=False):
+        for value in cls._index_values(data, field_path, array):
+            try:
+                index.setdefault(value, set()).add(doc_id)
+            except TypeError:
+                pass
+
+    @classmethod
+    def _index_remove(cls, index, field_path, doc_id, data, array=False):
+        for value in cls._index_values(data, field_path, array):
+            try:
+                index.get(value, set()).discard(doc_id)
+            except TypeError:
+                pass
+
+    def _apply(self, old, op, data, merge):
+        if op == 'delete':
+            return None
+        if op == 'update':
+            if old is None:
+                raise MemoryFirestoreError('No document to update')
+            new = copy_value(old)
+            for field_path, value in data.items():
+                self._assign(new, field_path.split('.'), value)
+            return new
+        if op == 'create' and old is not None:
+            raise MemoryFirestoreError('Document already exists')
+        new = copy_value(old) if (merge and old is not None) else {}
+        for key, value in data.items():
+            if merge and isinstance(value, dict):
+                # Merged maps are merged key by key, so transforms inside them apply
+                if not isinstance(new.get(key), dict):
+                    new[key] = {}
+                merged = new[key]
+                for sub_key, sub_value in value.items():
+                    self._assign(merged, [sub_key], sub_value)
+            else:
+                self._assign(new, [key], value)
+        return new
+
+    def _assign(self, target, parts, value):
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        field = parts[-1]
+        if value is DELETE_FIELD:
+            target.pop(field, None)
+        elif value is SERVER_TIMESTAMP:
+            target[field] = datetime.datetime.now(datetime.timezone.utc)
+        elif isinstance(value, Increment):
+            current = target.get(field, 0)
+            target[field] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif isinstance(value, ArrayUnion):
+            current = list(target.get(field) or [])
+            target[field] = current + [v for v in value.values if v not in current]
+        elif isinstance(value, ArrayRemove):
+            target[field] = [v for v in (target.get(field) or []) if v not in value.values]
+        else:
+            target[field] = copy_value(value)
+
+    def _fault(self, operation, collection_path, timeout=None):
+        hook = self._fault_hook
+        if hook is not None:
+            hook(operation, collection_path, timeout)
+
+    def _commit(self, writes, timeout=None):
+        """Apply writes atomically and notify watches"""
+        self._fault('commit', writes[0][1]._collection_path if writes else None, timeout)
+        changes = []
+        with self._lock:
+            # Validate/compute everything before mutating, so a failure applies nothing
+            staged = {}
+            for op, ref, data, merge in writes:
+                key = (ref._collection_path, ref.id)
+                old = staged[key] if key in staged else self._data.get(ref._collection_path, {}).get(ref.id)
+                if op == 'delete' and data is not None:
+                    entry = self._update_times.get(key)
+                    if old is None or entry is None or entry[1] != data.last_update_time:
+                        raise google_exceptions.FailedPrecondition(f'{ref.path} was updated since it was read')
+                staged[key] = self._apply(old, op, data, merge)
+
+            # Update times strictly increase, like commit timestamps
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if self._last_commit is not None and now <= self._last_commit:
+                now = self._last_commit + datetime.timedelta(microseconds=1)
+            self._last_commit = now
+
+            for (collection_path, doc_id), new in staged.items():
+                docs = self._collection(collection_path)
+                old = docs.get(doc_id)
+                for indexes, array in ((self._indexes, False), (self._array_indexes, True)):
+                    for (path, field), index in indexes.items():
+                        if path == collection_path:
+                            if old is not None:
+                                self._index_remove(index, field, doc_id, old, array)
+                            if new is not None:
+                                self._index_add(index, field, doc_id, new, array)
+                if new is None:
+                    docs.pop(doc_id, None)
+                    self._update_times.pop((collection_path, doc_id), None)
+                else:
+                    docs[doc_id] = new
+                    self._update_times[(collection_path, doc_id)] = (new, now)
+                changes.append((collection_path, doc_id, old, new))
+
+            deletes = sum(1 for op, _, _, _ in writes if op == 'delete')
+            self.stats.add(writes=len(writes) - deletes, deletes=deletes)
+            watches = list(self._watches)
+
+        for watch in watches:
+            self._notify(watch, changes)
+        return [now] * len(writes)
+
+    def _add_watch(self, query, callback):
+        watch = Watch(self, query, callback)
+        matched = query._run()
+        self.stats.add(reads=max(len(matched), 1), queries=1)
+        docs = [DocumentSnapshot(DocumentReference(self, query._collection_path, i), d) for i, d in matched]
+        with self._lock:
+            self._watches.append(watch)
+        callback(docs, [DocumentChange('ADDED', doc) for doc in docs], datetime.datetime.now(datetime.timezone.utc))
+        return watch
+
+    def _remove_watch(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, watch, changes):
+        query = watch.query
+        doc_changes = []
+        for collection_path, doc_id, old, new in changes:
+            if collection_path != query._collection_path:
+                continue
+            was_in = old is not None and query._matches(old)
+            is_in = new is not None and query._matches(new)
+            ref = DocumentReference(self, collection_path, doc_id)
+            if is_in:
+                doc_changes.append(DocumentChange('MODIFIED' if was_in else 'ADDED', DocumentSnapshot(ref, new)))
+            elif was_in:
+                doc_changes.append(DocumentChange('REMOVED', DocumentSnapshot(ref, old)))
+        if doc_changes:
+            # Listeners are billed one read per changed document
+            self.stats.add(reads=len(doc_changes))
+            watch.callback([], doc_changes, datetime.datetime.now(datetime.timezone.utc))
@@ -0,0 +1,282 @@
+"""
+Prometheus-style metrics for HelpDesk API
+Counters and histograms keep one cell per label set in a shared dict behind
+a lock held only for the update itself; the /metrics view copies the cells
+when it is scraped. (Per-thread cells would leak under ASGI, which runs each
+request on a new thread.) /metrics needs METRICS_TOKEN, or METRICS_PUBLIC=true
+for a port only the scraper can reach.
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+from django.http import HttpResponse, JsonResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 500, 1000, 10000, 100000)
+
+
+class _Metric:
+    """Base for metrics whose cells ({labels: value}) are updated under self._lock"""
+
+    kind = ''
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def _label_str(self, labels, extra=None):
+        pairs = list(zip(self.labelnames, labels))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+        return '{' + body + '}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._cells[labels] = self._cells.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._cells)
+
+    def render(self):
+        return [f'{self.name}{self._label_str(labels)} {value}' for labels, value in sorted(self.values().items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            cell = self._cells.get(labels)
+            if cell is None:
+                # [per-bucket counts..., +Inf count, sum]
+                cell = [0] * (len(self.buckets) + 1) + [0.0]
+                self._cells[labels] = cell
+            cell[bucket] += 1
+            cell[-1] += value
+
+    def values(self):
+        with self._lock:
+            return {labels: list(cell) for labels, cell in self._cells.items()}
+
+    def render(self):
+        lines = []
+        for labels, cell in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, cell):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._label_str(labels, ("le", bound))} {cumulative}')
+            cumulative += cell[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{self._label_str(labels, ("le", "+Inf"))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_str(labels)} {cell[-1]}')
+            lines.append(f'{self.name}_count{self._label_str(labels)} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Computed at scrape time: fn() returns {labels_tuple: value}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), fn=None):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def render(self):
+        try:
+            values = self.fn() if self.fn else {}
+        except Exception:
+            values = {}
+        return [f'{self.name}{self._label_str(labels)} {value}' for labels, value in sorted(values.items())]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames=(), fn=None):
+        return self.register(Gauge(name, help_text, labelnames, fn))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'helpdesk_http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+http_latency = registry.histogram(
+    'helpdesk_http_request_duration_seconds', 'Request latency by route', ('route', 'method'))
+firestore_ops = registry.counter(
+    'helpdesk_firestore_ops_total', 'Firestore document reads, writes and queries by route', ('route', 'op'))
+firestore_reads_per_request = registry.histogram(
+    'helpdesk_firestore_reads_per_request', 'Firestore documents read per request', ('route',), COUNT_BUCKETS)
+firestore_writes_per_request = registry.histogram(
+    'helpdesk_firestore_writes_per_request', 'Firestore writes per request', ('route',), COUNT_BUCKETS)
+firestore_queries_per_request = registry.histogram(
+    'helpdesk_firestore_queries_per_request', 'Firestore queries per request', ('route',), COUNT_BUCKETS)
+firestore_query_docs = registry.histogram(
+    'helpdesk_firestore_query_documents', 'Documents streamed per query', ('route', 'collection'), COUNT_BUCKETS)
+rate_limit_rejections = registry.counter(
+    'helpdesk_rate_limit_rejections_total', 'Requests rejected with 429 by RateLimitMiddleware')
+outbox_events = registry.counter(
+    'helpdesk_outbox_events_total', 'Outbox events delivered by type and outcome', ('type', 'outcome'))
+outbox_lag = registry.histogram(
+    'helpdesk_outbox_lag_seconds', 'Time from an outbox event being recorded to its side effects committing')
+firestore_retries = registry.counter(
+    'helpdesk_firestore_retries_total', 'Firestore calls retried after a transient error', ('operation',))
+firestore_errors = registry.counter(
+    'helpdesk_firestore_errors_total', 'Transient Firestore errors by operation and error', ('operation', 'error'))
+firestore_rejections = registry.counter(
+    'helpdesk_firestore_rejections_total', 'Firestore calls not made: circuit open or request deadline spent',
+    ('operation', 'reason'))
+firestore_circuit_transitions = registry.counter(
+    'helpdesk_firestore_circuit_transitions_total', 'Firestore circuit breaker state changes', ('state',))
+single_flight_calls = registry.counter(
+    'helpdesk_single_flight_calls_total',
+    'Coalesced expensive reads: leader ran the computation, shared waited for one already in flight',
+    ('group', 'outcome'))
+
+
+def _cache_hit_ratios():
+    from .response_cache import response_cache
+    from .user_lookup import user_resolver
+    ratios = {}
+    for name, cache in [('user_resolver', user_resolver), ('responses', response_cache)]:
+        total = cache.hits + cache.misses
+        if total:
+            ratios[(name,)] = cache.hits / total
+    return ratios
+
+
+cache_hit_ratio = registry.gauge(
+    'helpdesk_cache_hit_ratio', 'Hit ratio of in-process caches', ('cache',), _cache_hit_ratios)
+
+
+def _circuit_state():
+    from .firestore_guard import breaker
+    return {(state,): int(breaker.state == state) for state in (breaker.CLOSED, breaker.HALF_OPEN, breaker.OPEN)}
+
+
+firestore_circuit_state = registry.gauge(
+    'helpdesk_firestore_circuit_state', 'Firestore circuit breaker state (1 for the current state)', ('state',),
+    _circuit_state)
+
+
+# -- per-request Firestore accounting --------------------------------------
+
+class RequestOps:
+    __slots__ = ('route', 'reads', 'writes', 'queries')
+
+    def __init__(self, route):
+        self.route = route
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+
+
+_current_ops = contextvars.ContextVar('helpdesk_request_ops', default=None)
+
+
+def current_route():
+    ops = _current_ops.get()
+    return ops.route if ops else 'background'
+
+
+def record_firestore(op, count=1, collection=None):
+    """Called by the instrumented Firestore client for every operation"""
+    ops = _current_ops.get()
+    route = ops.route if ops else 'background'
+    firestore_ops.inc(count, (route, op))
+    if ops is not None:
+        if op == 'read':
+            ops.reads += count
+        elif op == 'write':
+            ops.writes += count
+        elif op == 'query':
+            ops.queries += count
+
+
+def record_query_documents(collection, count):
+    firestore_query_docs.observe(count, (current_route(), collection))
+
+
+class MetricsMiddleware:
+    """
+    Outermost middleware: times every request and attributes Firestore
+    operations to the matched URL pattern (e.g. api/tickets/<str:ticket_id>/)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        ops = RequestOps('unmatched')
+        token = _current_ops.set(ops)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_ops.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match else 'unmatched'
+        ops.route = route
+        http_requests.inc(1, (route, request.method, str(response.status_code)))
+        http_latency.observe(elapsed, (route, request.method))
+        firestore_reads_per_request.observe(ops.reads, (route,))
+        firestore_writes_per_request.observe(ops.writes, (route,))
+        firestore_queries_per_request.observe(ops.queries, (route,))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Label Firestore ops with the route as soon as it is resolved
+        ops = _current_ops.get()
+        if ops is not None and request.resolver_match:
+            ops.route = request.resolver_match.route
+        return None
+
+
+def metrics_view(request):
+    """Prometheus text exposition; bearer METRICS_TOKEN required unless METRICS_PUBLIC=true"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Invalid metrics token'}}, status=403)
+    elif os.environ.get('METRICS_PUBLIC', 'false').lower() != 'true':
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Set METRICS_TOKEN (or METRICS_PUBLIC=true) to expose metrics'}}, status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -7,6 +7,8 @@ from django.core.cache import cache
 from django.http import JsonResponse
 import time
 
+from . import metrics
+
 
 class RateLimitMiddleware:
     """
@@ -39,6 +41,7 @@ class RateLimitMiddleware:
             else:
                 # Check if rate limit exceeded
                 if rate_data['count'] >= self.rate_limit:
+                    metrics.rate_limit_rejections.inc()
                     retry_after = int(self.window - time_elapsed)
                     return JsonResponse({
                         'error': {
@@ -0,0 +1,308 @@
+"""
+Compact typed records for tickets and users
+Firestore documents decoded into __slots__ classes instead of dicts: no
+per-instance dict, status/priority/role values are shared enum members, and
+strings that repeat across documents (uids, categories, timeline actions)
+are interned. A ticket's timeline and transfer history stay in their raw
+Firestore form until something reads them, so list endpoints and the change
+feed never build entry objects they don't look at. Keys a class
+doesn't know are kept in `extra`, so to_dict() gives back the document and
+to_json() matches serialize_firestore_doc().
+There are no Django ORM models in this app; data lives in Firestore.
+"""
+
+import sys
+from dataclasses import dataclass
+from enum import StrEnum
+
+
+class Status(StrEnum):
+    OPEN = 'Open'
+    IN_PROGRESS = 'In Progress'
+    ESCALATED = 'Escalated'
+    BREACHED = 'Breached'
+    RESOLVED = 'Resolved'
+    CLOSED = 'Closed'
+
+
+class Priority(StrEnum):
+    LOW = 'Low'
+    MEDIUM = 'Medium'
+    HIGH = 'High'
+    CRITICAL = 'Critical'
+
+
+class Role(StrEnum):
+    USER = 'user'
+    AGENT = 'agent'
+    ADMIN = 'admin'
+
+
+class _Missing:
+    """Slot value for a field the document doesn't have"""
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __bool__(self):
+        return False
+
+
+MISSING = _Missing()
+
+
+def intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def enum_converter(enum):
+    """value -> enum member; unknown strings (legacy data) are interned as they are"""
+    members = {member.value: member for member in enum}
+
+    def convert(value):
+        member = members.get(value) if type(value) is str else None
+        return member if member is not None else intern(value)
+    return convert
+
+
+def json_value(value):
+    """Timestamps as Unix seconds; lists of dicts (timeline-like) likewise, one level down"""
+    if hasattr(value, 'timestamp'):
+        return int(value.timestamp())
+    if isinstance(value, list):
+        return [
+            {k: int(v.timestamp()) if hasattr(v, 'timestamp') else v for k, v in item.items()}
+            if isinstance(item, dict) else item
+            for item in value
+        ]
+    return value
+
+
+# -- list entries -----------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class TimelineEntry:
+    action: str
+    timestamp: object = None
+    user: str = None
+    username: str = None
+    comment: str = None
+    reply_to: object = None
+    extra: dict = None
+
+    KEYS = ('action', 'timestamp', 'user', 'username', 'comment', 'reply_to')
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in TIMELINE_KEYS}
+        return cls(intern(data.get('action')), data.get('timestamp'), intern(data.get('user')),
+                   data.get('username'), data.get('comment'), data.get('reply_to'), extra or None)
+
+    def to_dict(self):
+        data = {}
+        for key in self.KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        return {key: json_value(value) for key, value in self.to_dict().items()}
+
+
+TIMELINE_KEYS = frozenset(TimelineEntry.KEYS)
+
+
+@dataclass(frozen=True, slots=True)
+class TransferRecord:
+    from_uid: str
+    to_uid: str
+    timestamp: object = None
+    reason: str = None
+    from_role: str = None
+    to_role: str = None
+    extra: dict = None
+
+    # Document key -> attribute ('from' is a keyword)
+    KEYS = {'from': 'from_uid', 'to': 'to_uid', 'timestamp': 'timestamp', 'reason': 'reason',
+            'from_role': 'from_role', 'to_role': 'to_role'}
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in cls.KEYS}
+        return cls(intern(data.get('from')), intern(data.get('to')), data.get('timestamp'), data.get('reason'),
+                   intern(data.get('from_role')), intern(data.get('to_role')), extra or None)
+
+    def to_dict(self):
+        data = {}
+        for key, attribute in self.KEYS.items():
+            value = getattr(self, attribute)
+            if value is not None:
+                data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        return {key: json_value(value) for key, value in self.to_dict().items()}
+
+
+# -- documents --------------------------------------------------------------
+
+class Record:
+    """
+    A Firestore document with FIELDS in slots (MISSING when absent) and
+    LAZY list fields kept raw in '_<name>' slots until first read
+    """
+
+    __slots__ = ('id', 'extra')
+    FIELDS = ()
+    CONVERTERS = {}
+    LAZY = {}
+    _KNOWN = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._KNOWN = frozenset(cls.FIELDS) | frozenset(cls.LAZY)
+
+    @classmethod
+    def from_dict(cls, doc_id, data):
+        """Record from a Firestore document"""
+        record = object.__new__(cls)
+        record.id = doc_id
+        converters = cls.CONVERTERS
+        for name in cls.FIELDS:
+            value = data.get(name, MISSING)
+            if value is not MISSING and name in converters:
+                value = converters[name](value)
+            setattr(record, name, value)
+        for name in cls.LAZY:
+            setattr(record, '_' + name, data.get(name, MISSING))
+        unknown = data.keys() - cls._KNOWN
+        record.extra = {key: data[key] for key in unknown} if unknown else None
+        return record
+
+    @classmethod
+    def from_snapshot(cls, doc):
+        return cls.from_dict(doc.id, doc.to_dict())
+
+    def _lazy(self, name):
+        """Decoded entries of a LAZY field (decoded once, then the raw list is dropped)"""
+        value = getattr(self, '_' + name)
+        if value is MISSING:
+            return ()
+        if isinstance(value, list):
+            entry_cls = self.LAZY[name]
+            value = tuple(entry_cls.from_dict(item) if isinstance(item, dict) else item for item in value)
+            setattr(self, '_' + name, value)
+        return value
+
+    def get(self, name, default=None):
+        """dict.get() over the document's fields, so records can stand in for documents"""
+        if name == 'id':
+            return self.id
+        if name in self.LAZY:
+            value = getattr(self, '_' + name)
+            return default if value is MISSING else list(self._lazy(name))
+        if name in self.FIELDS:
+            value = getattr(self, name)
+        else:
+            value = self.extra.get(name, MISSING) if self.extra else MISSING
+        return default if value is MISSING else value
+
+    def to_dict(self):
+        """The Firestore document (without the id)"""
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not MISSING:
+                data[name] = value
+        for name in self.LAZY:
+            value = getattr(self, '_' + name)
+            if value is not MISSING:
+                data[name] = value if isinstance(value, list) else [
+                    item.to_dict() if hasattr(item, 'to_dict') else item for item in value]
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        """Same shape as serialize_firestore_doc(document + id), without building the document first"""
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not MISSING:
+                data[name] = json_value(value)
+        for name in self.LAZY:
+            value = getattr(self, '_' + name)
+            if value is not MISSING:
+                data[name] = json_value(value) if isinstance(value, list) else [
+                    item.to_json() if hasattr(item, 'to_json') else item for item in value]
+        if self.extra:
+            for key, value in self.extra.items():
+                data[key] = json_value(value)
+        if self.id is not None:
+            data['id'] = self.id
+        return data
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.id!r})'
+
+
+class Ticket(Record):
+    FIELDS = (
+        'ticket_id', 'title', 'description', 'priority', 'priority_rank', 'category', 'status',
+        'assigned_to', 'assigned_to_display', 'created_by', 'created_by_display',
+        'created_at', 'updated_at', 'version', 'sla_deadline', 'idempotency_key',
+        'feedback', 'rating', 'contact', 'github', 'reopen_count',
+        'dedupe_bands', 'duplicate_of', 'possible_duplicates',
+        'resolved_at', 'resolved_by', 'closed_at', 'attachments',
+    )
+    LAZY = {'timeline': TimelineEntry, 'transfer_history': TransferRecord}
+    CONVERTERS = {
+        'status': enum_converter(Status),
+        'priority': enum_converter(Priority),
+        'category': intern,
+        'assigned_to': intern,
+        'created_by': intern,
+        'resolved_by': intern,
+    }
+    __slots__ = FIELDS + tuple('_' + name for name in LAZY)
+
+    @property
+    def timeline(self):
+        return self._lazy('timeline')
+
+    @property
+    def transfer_history(self):
+        return self._lazy('transfer_history')
+
+    def comments(self):
+        """Timeline comments without decoding the timeline"""
+        entries = self._timeline
+        if entries is MISSING:
+            return
+        for entry in entries:
+            comment = entry.get('comment') if isinstance(entry, dict) else entry.comment
+            if comment:
+                yield comment
+
+
+class User(Record):
+    FIELDS = (
+        'email', 'role', 'name', 'username', 'custom_uid', 'verified', 'account_status',
+        'active_tickets', 'total_resolved', 'created_at', 'updated_at', 'verified_at',
+    )
+    CONVERTERS = {
+        'role': enum_converter(Role),
+        'account_status': intern,
+    }
+    __slots__ = FIELDS
+
+    def to_json(self):
+        data = super().to_json()
+        # Users are keyed by uid in API responses
+        data['uid'] = data.pop('id', self.id)
+        return data
@@ -0,0 +1,237 @@
+"""
+Transactional outbox for ticket side effects
+Ticket writes add an event to ticket_events in the same batch as the ticket
+itself; a background worker pool applies the side effects (workload counters,
+resolved totals, notifications) afterwards, so request latency covers only the
+core write. Delivery is at-least-once with retries and backoff. Firestore side
+effects are committed together with a marker document created with the event
+ID, so a redelivered event cannot apply them twice.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from firebase_admin import firestore
+
+from . import metrics
+from .counters import increment_workload
+from .firebase_config import db
+from .instrumented_firestore import add_write_listener
+
+logger = logging.getLogger('helpdesk.outbox')
+notification_logger = logging.getLogger('helpdesk.notifications')
+
+EVENTS = 'ticket_events'
+APPLIED = 'ticket_events_applied'
+# Processed events and markers carry expires_at for a Firestore TTL policy
+RETENTION = timedelta(days=7)
+# A claimed event is hidden from other workers this long; it reappears if the worker dies
+LEASE = timedelta(seconds=60)
+MAX_ATTEMPTS = 8
+MAX_BACKOFF = 300
+POLL_INTERVAL = 1.0
+POLL_LIMIT = 100
+
+# thread: every web process runs a worker pool; off: run `manage.py run_outbox_worker`
+WORKER_MODE = os.getenv('OUTBOX_WORKER', 'thread')
+WORKERS = int(os.getenv('OUTBOX_WORKERS', '4'))
+
+# event type -> handlers; handler(event, batch) adds Firestore writes to batch
+HANDLERS = {}
+# Handlers with effects outside Firestore; they run before the commit, so a
+# failure retries the event and a crash after them only repeats them
+EXTERNAL_HANDLERS = []
+
+
+def handler(*event_types):
+    def register(fn):
+        for event_type in event_types:
+            HANDLERS.setdefault(event_type, []).append(fn)
+        return fn
+    return register
+
+
+def external_handler(fn):
+    EXTERNAL_HANDLERS.append(fn)
+    return fn
+
+
+def record_event(batch, event_type, ticket_id, payload=None):
+    """Add an event to batch; it is delivered once batch commits"""
+    now = datetime.now()
+    batch.set(db.collection(EVENTS).document(), {
+        'type': event_type,
+        'ticket_id': ticket_id,
+        'payload': payload or {},
+        'status': 'pending',
+        'attempts': 0,
+        'created_at': now,
+        'available_at': now,
+    })
+
+
+def workload_changes(*changes):
+    """{uid: delta} from (uid, delta) pairs, dropping empty ones"""
+    totals = {}
+    for uid, delta in changes:
+        if uid and delta:
+            totals[uid] = totals.get(uid, 0) + delta
+    return {uid: delta for uid, delta in totals.items() if delta}
+
+
+# -- handlers ---------------------------------------------------------------
+
+@handler('ticket.created', 'ticket.updated', 'ticket.transferred')
+def apply_workload(event, batch):
+    for uid, delta in event['payload'].get('workload', {}).items():
+        increment_workload(uid, delta, batch)
+
+
+@handler('ticket.feedback')
+def apply_resolved_total(event, batch):
+    """A ticket counts once: resubmitted feedback only replaces the rating"""
+    payload = event['payload']
+    assignee = payload.get('assigned_to')
+    # Events queued before first_rating existed keep the old behaviour
+    if assignee and payload.get('first_rating', True):
+        batch.update(db.collection('users').document(assignee), {'total_resolved': firestore.Increment(1)})
+
+
+@external_handler
+def notify(event):
+    # Delivery channels (email, chat, webhooks) subscribe to this logger
+    notification_logger.info('Ticket event', extra={
+        'event_type': event['type'], 'ticket_id': event['ticket_id'], 'event_id': event['id'],
+    })
+
+
+# -- delivery ---------------------------------------------------------------
+
+def backoff(attempts):
+    """Full jitter: a random delay up to 2^attempts seconds, capped"""
+    return random.uniform(0, min(MAX_BACKOFF, 2 ** attempts))
+
+
+def claim_batch(limit=POLL_LIMIT):
+    """Due events, each leased to this worker by pushing its available_at forward"""
+    now = datetime.now()
+    docs = list(db.collection(EVENTS).where('status', '==', 'pending').where('available_at', '<=', now)
+                .order_by('available_at').limit(limit).stream())
+    events = []
+    for doc in docs:
+        event = doc.to_dict()
+        event['id'] = doc.id
+        event['attempts'] = event.get('attempts', 0) + 1
+        doc.reference.update({'available_at': now + LEASE, 'attempts': event['attempts']})
+        events.append(event)
+    return events
+
+
+def deliver(event):
+    """Apply one event; returns 'done', 'duplicate', 'retry' or 'dead'"""
+    event_ref = db.collection(EVENTS).document(event['id'])
+    now = datetime.now()
+    try:
+        for fn in EXTERNAL_HANDLERS:
+            fn(event)
+        batch = db.batch()
+        for fn in HANDLERS.get(event['type'], []):
+            fn(event, batch)
+        # create() fails if the marker exists, rolling back the whole batch
+        batch.create(db.collection(APPLIED).document(event['id']), {'applied_at': now, 'expires_at': now + RETENTION})
+        batch.update(event_ref, {'status': 'done', 'processed_at': now, 'expires_at': now + RETENTION})
+        batch.commit()
+    except Exception as e:
+        if db.collection(APPLIED).document(event['id']).get().exists:
+            # Another worker applied it first
+            event_ref.update({'status': 'done', 'processed_at': now, 'expires_at': now + RETENTION})
+            return 'duplicate'
+        dead = event['attempts'] >= MAX_ATTEMPTS
+        logger.warning('Outbox event failed', exc_info=True, extra={
+            'event_id': event['id'], 'event_type': event['type'], 'attempts': event['attempts']})
+        event_ref.update({
+            'status': 'dead' if dead else 'pending',
+            'available_at': now + timedelta(seconds=backoff(event['attempts'])),
+            'last_error': str(e)[:500],
+        })
+        return 'dead' if dead else 'retry'
+    created_at = event.get('created_at')
+    if created_at:
+        metrics.outbox_lag.observe((now - created_at.replace(tzinfo=None)).total_seconds())
+    return 'done'
+
+
+def drain(pool=None, limit=POLL_LIMIT):
+    """Claim and deliver one page of due events; returns how many were claimed"""
+    events = claim_batch(limit)
+    outcomes = pool.map(deliver, events) if pool else map(deliver, events)
+    for event, outcome in zip(events, outcomes):
+        metrics.outbox_events.inc(1, (event['type'], outcome))
+    return len(events)
+
+
+class OutboxWorker:
+    """
+    One poller thread per process feeding a small thread pool. Committing an
+    event in this process starts the worker on first use and wakes it, so
+    events apply within milliseconds; the poll interval picks up retries and
+    other processes' events.
+    """
+
+    def __init__(self, workers=WORKERS, interval=POLL_INTERVAL):
+        self.workers = workers
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.start_lock = threading.Lock()
+        self.thread = None
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def start(self):
+        if self.thread is not None:
+            self.wakeup.set()
+            return
+        with self.start_lock:
+            if self.thread is None:
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name='outbox-worker', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        logger.info('Outbox worker started', extra={'owner': self.owner, 'workers': self.workers})
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox') as pool:
+            while not self.stopping.is_set():
+                self.wakeup.clear()
+                try:
+                    # Keep draining while full pages come back
+                    while drain(pool) == POLL_LIMIT and not self.stopping.is_set():
+                        pass
+                except Exception:
+                    logger.exception('Outbox poll failed')
+                self.wakeup.wait(self.interval)
+
+
+outbox_worker = OutboxWorker()
+
+
+def _wake_on_event(collections):
+    # The worker's own claims and acks write events too; they must not wake it
+    if EVENTS in collections and not threading.current_thread().name.startswith('outbox'):
+        outbox_worker.start()
+
+
+if WORKER_MODE == 'thread':
+    add_write_listener(_wake_on_event)
@@ -0,0 +1,82 @@
+"""
+Response cache for expensive read endpoints
+Entries are keyed by endpoint, role, normalized query params and the current
+generation of every collection the endpoint reads. Committed writes to a
+collection bump its generation (via the instrumented Firestore client), so
+stale entries are simply never looked up again. Uses the 'responses' cache
+alias: in-process by default, shared (Redis) when RESPONSE_CACHE_URL is set.
+"""
+
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+
+from .instrumented_firestore import add_write_listener
+
+# Collections whose writes invalidate cached responses
+TRACKED_COLLECTIONS = {'tickets', 'users'}
+
+
+class ResponseCache:
+    def __init__(self, alias='responses', ttl=30):
+        self.alias = alias
+        # Generations give exact invalidation on writes; the TTL bounds drift
+        # that no write causes (e.g. an SLA deadline passing)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def generation_key(collection):
+        return f'gen:{collection}'
+
+    def generations(self, collections):
+        keys = [self.generation_key(c) for c in collections]
+        found = self.cache.get_many(keys)
+        values = []
+        for collection, key in zip(collections, keys):
+            if key not in found:
+                # Start from the clock, not 0, so an evicted counter can't
+                # line up with entries written under an older generation
+                self.cache.add(key, time.time_ns(), timeout=None)
+                found[key] = self.cache.get(key)
+            values.append(str(found[key]))
+        return values
+
+    def bump(self, collections):
+        for collection in collections:
+            if collection not in TRACKED_COLLECTIONS:
+                continue
+            key = self.generation_key(collection)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns(), timeout=None)
+
+    def lookup(self, name, role, params, depends):
+        """Returns (key, cached data or None); pass the key to store()"""
+        normalized = urlencode(sorted((k, v) for k, v in params.items() if v not in (None, '')))
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+        key = f"resp:{name}:{role}:{'.'.join(self.generations(list(depends)))}:{digest}"
+        data = self.cache.get(key)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return key, data
+
+    def store(self, key, data):
+        self.cache.set(key, data, self.ttl)
+
+
+response_cache = ResponseCache()
+add_write_listener(response_cache.bump)
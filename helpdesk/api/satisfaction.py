@@ -0,0 +1,181 @@
+"""
+Running customer-satisfaction aggregates
+Each feedback submission adds its rating to one document per scope in the
+`satisfaction` collection (overall, the ticket's agent, its category) in the
+same batch as the ticket write: count, sum, sum of squares and a 1-5
+histogram, all as Increment transforms. Mean, variance and CSAT follow from
+those numbers, so a satisfaction report reads one document per agent and
+category instead of every rated ticket. A ticket gets feedback about once,
+far below Firestore's per-document write limit, so the documents aren't
+sharded. rebuild_satisfaction() recomputes them from tickets if they drift.
+"""
+
+from datetime import datetime
+from urllib.parse import quote
+
+from firebase_admin import firestore
+
+from .firebase_config import db
+
+COLLECTION = 'satisfaction'
+RATINGS = (1, 2, 3, 4, 5)
+# CSAT counts 4 and 5 star ratings as satisfied
+SATISFIED = (4, 5)
+UNCATEGORIZED = 'Uncategorized'
+PAGE_SIZE = 500
+
+
+def stats_ref(scope, key=None):
+    doc_id = scope if key is None else f'{scope}:{quote(str(key), safe="")}'
+    return db.collection(COLLECTION).document(doc_id)
+
+
+def scopes(ticket):
+    """(scope, key) of every aggregate a rating on this ticket counts towards"""
+    result = [('overall', None), ('category', ticket.get('category') or UNCATEGORIZED)]
+    if ticket.get('assigned_to'):
+        result.append(('agent', ticket['assigned_to']))
+    return result
+
+
+def record_rating(batch, ticket, rating, previous=None):
+    """
+    Add rating to the ticket's aggregates in batch; previous is the rating
+    it replaces when feedback is submitted again (counted once)
+    """
+    if previous == rating:
+        return
+    old = previous or 0
+    histogram = {str(rating): firestore.Increment(1)}
+    if previous:
+        histogram[str(previous)] = firestore.Increment(-1)
+    for scope, key in scopes(ticket):
+        batch.set(stats_ref(scope, key), {
+            'scope': scope,
+            'key': key,
+            'count': firestore.Increment(0 if previous else 1),
+            'sum': firestore.Increment(rating - old),
+            'sum_sq': firestore.Increment(rating * rating - old * old),
+            'histogram': histogram,
+            'updated_at': datetime.now(),
+        }, merge=True)
+
+
+def summarize(data):
+    """Mean, population variance and CSAT % from an aggregate document"""
+    count = data.get('count', 0)
+    histogram = {str(rating): data.get('histogram', {}).get(str(rating), 0) for rating in RATINGS}
+    if count <= 0:
+        return {'count': 0, 'mean': None, 'variance': None, 'csat': None, 'histogram': histogram}
+    mean = data.get('sum', 0) / count
+    # Clamped: E[x^2] - mean^2 can dip below zero by rounding
+    variance = max(0.0, data.get('sum_sq', 0) / count - mean * mean)
+    satisfied = sum(histogram[str(rating)] for rating in SATISFIED)
+    return {
+        'count': count,
+        'mean': round(mean, 3),
+        'variance': round(variance, 3),
+        'csat': round(100 * satisfied / count, 1),
+        'histogram': histogram,
+    }
+
+
+def get_satisfaction(agent=None, category=None):
+    """
+    {'overall', 'agents', 'categories'} summaries. With agent or category
+    only that aggregate is read; otherwise the whole (small) collection is.
+    """
+    report = {'overall': None, 'agents': {}, 'categories': {}}
+    if agent or category:
+        refs = []
+        if agent:
+            refs.append(stats_ref('agent', agent))
+        if category:
+            refs.append(stats_ref('category', category))
+        docs = db.get_all(refs)
+    else:
+        docs = db.collection(COLLECTION).stream()
+    for doc in docs:
+        if not doc.exists:
+            continue
+        data = doc.to_dict()
+        summary = summarize(data)
+        if data.get('scope') == 'overall':
+            report['overall'] = summary
+        elif data.get('scope') == 'agent':
+            report['agents'][data.get('key')] = summary
+        elif data.get('scope') == 'category':
+            report['categories'][data.get('key')] = summary
+    if agent and agent not in report['agents']:
+        report['agents'][agent] = summarize({})
+    if category and category not in report['categories']:
+        report['categories'][category] = summarize({})
+    if report['overall'] is None and not (agent or category):
+        report['overall'] = summarize({})
+    return report
+
+
+def count_ratings():
+    """True aggregates per (scope, key), paging through rated tickets only"""
+    totals = {}
+    query = db.collection('tickets').where('rating', 'in', list(RATINGS)).order_by('__name__').limit(PAGE_SIZE)
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc else query
+        docs = list(page.stream())
+        for doc in docs:
+            ticket = doc.to_dict()
+            rating = ticket['rating']
+            for scope_key in scopes(ticket):
+                entry = totals.setdefault(scope_key, {'count': 0, 'sum': 0, 'sum_sq': 0,
+                                                      'histogram': {str(r): 0 for r in RATINGS}})
+                entry['count'] += 1
+                entry['sum'] += rating
+                entry['sum_sq'] += rating * rating
+                entry['histogram'][str(rating)] += 1
+        if len(docs) < PAGE_SIZE:
+            return totals
+        last_doc = docs[-1]
+
+
+def rebuild_satisfaction(dry_run=False):
+    """
+    Recompute every aggregate from rated tickets and rewrite the ones that
+    drifted (and drop ones nothing counts towards). Returns the corrections.
+    """
+    actual = count_ratings()
+    recorded = {}
+    for doc in db.collection(COLLECTION).stream():
+        data = doc.to_dict()
+        recorded[(data.get('scope'), data.get('key'))] = (doc.reference, data)
+
+    corrections = []
+    writes = []
+    fields = ('count', 'sum', 'sum_sq', 'histogram')
+    for scope_key in sorted(set(actual) | set(recorded), key=lambda item: (item[0] or '', str(item[1]))):
+        true_values = actual.get(scope_key)
+        ref, data = recorded.get(scope_key, (None, {}))
+        current = {field: data.get(field) for field in fields}
+        # Ratings never given have no histogram key in the document
+        current['histogram'] = {str(r): (data.get('histogram') or {}).get(str(r), 0) for r in RATINGS}
+        if true_values is not None and all(current[field] == true_values[field] for field in fields):
+            continue
+        corrections.append({'scope': scope_key[0], 'key': scope_key[1],
+                            'recorded': data.get('count', 0), 'actual': (true_values or {}).get('count', 0)})
+        if true_values is None:
+            writes.append(('delete', ref, None))
+        else:
+            writes.append(('set', ref or stats_ref(*scope_key),
+                           dict(true_values, scope=scope_key[0], key=scope_key[1], updated_at=datetime.now())))
+
+    if not dry_run:
+        for start in range(0, len(writes), PAGE_SIZE):
+            batch = db.batch()
+            for op, ref, data in writes[start:start + PAGE_SIZE]:
+                if op == 'delete':
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, data)
+            batch.commit()
+
+    return corrections
@@ -0,0 +1,91 @@
+"""
+Single-flight coalescing for expensive reads
+Concurrent calls with the same key share one computation: the first caller
+(the leader) runs it, callers arriving while it is in flight wait for its
+result or exception instead of starting their own collection scan. Nothing
+is kept once the call finishes; caching is the response cache's job, this
+only collapses the herd that misses it at the same moment. do() is for
+threads (sync views, which the ASGI handler runs in a thread per request,
+and workers); do_async() for coroutines on an event loop (async views),
+where the computation runs as its own task so a cancelled caller doesn't
+cancel it for the others. Coalescing is per process.
+"""
+
+import asyncio
+import threading
+
+from . import metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.tasks = {}
+        # Leaders ran a computation, shared callers reused one
+        self.leaders = 0
+        self.shared = 0
+
+    def _record(self, shared):
+        with self.lock:
+            if shared:
+                self.shared += 1
+            else:
+                self.leaders += 1
+        metrics.single_flight_calls.inc(1, (self.name, 'shared' if shared else 'leader'))
+
+    def do(self, key, fn):
+        """fn() once for all threads calling with this key at the same time"""
+        with self.lock:
+            call = self.calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self.calls[key] = _Call()
+        self._record(shared)
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key, fn):
+        """await fn() once for all coroutines on this event loop awaiting this key at the same time"""
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self.lock:
+            task = self.tasks.get(task_key)
+            shared = task is not None
+            if not shared:
+                task = self.tasks[task_key] = loop.create_task(fn())
+                task.add_done_callback(lambda finished: self._forget(task_key, finished))
+        self._record(shared)
+        # shield: one caller being cancelled (client gone) leaves the task running for the rest
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key, task):
+        with self.lock:
+            if self.tasks.get(task_key) is task:
+                del self.tasks[task_key]
+        if not task.cancelled():
+            # Mark the exception retrieved: every awaiting caller may have been cancelled
+            task.exception()
@@ -0,0 +1,141 @@
+"""
+Non-blocking structured logging for HelpDesk API
+Request threads only push records onto a bounded queue; a background
+QueueListener thread formats them as JSON and writes to stdout. Records
+carry the request ID, route and caller UID of the request that logged them.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Per-request context, set by RequestLoggingMiddleware
+_request_context = contextvars.ContextVar('helpdesk_log_context', default=None)
+
+# Standard LogRecord attributes - anything else passed via extra= is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a `rate` fraction of records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler with its own bounded queue and listener thread.
+    When the queue is full the record is dropped (and counted) instead of
+    blocking the request.
+    """
+
+    def __init__(self, max_queue=10000, sample_rate=1.0, stream=None):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        self.dropped = 0
+        self.addFilter(SamplingFilter(float(sample_rate)))
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, writer, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # Capture the request context here (contextvars don't cross threads);
+        # JSON formatting happens on the listener thread
+        context = _request_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        listener = getattr(self, 'listener', None)
+        if listener is not None and listener._thread is not None:
+            listener.stop()  # Flushes queued records
+        super().close()
+
+
+def bind(**fields):
+    """Add fields (e.g. uid once known) to the current request's log context"""
+    context = _request_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+class RequestLoggingMiddleware:
+    """
+    Assigns a request ID (honours an incoming X-Request-ID), binds route and
+    caller UID for every record logged during the request, and writes one
+    access record with the request timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.logger = logging.getLogger('helpdesk.access')
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        # uid is bound by caller() once the token (or legacy param) is read
+        context = {'request_id': request_id, 'uid': None}
+        token = _request_context.set(context)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info('request', extra={
+                    'method': request.method,
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                })
+        finally:
+            _request_context.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match:
+            bind(route=request.resolver_match.route)
+        return None
@@ -0,0 +1,11 @@
+"""
+API tests, run on the in-memory Firestore backend:
+    python manage.py test api
+"""
+
+import os
+
+# Before anything imports api.firebase_config: tests never talk to a real project
+os.environ['FIRESTORE_BACKEND'] = 'memory'
+# Side effects are delivered by the tests calling outbox.drain()
+os.environ['OUTBOX_WORKER'] = 'off'
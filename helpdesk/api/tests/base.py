@@ -0,0 +1,74 @@
+"""
+Shared setup: a fresh in-memory database and empty process caches per test,
+ID tokens that verify to the claims they name, and document factories
+"""
+
+import itertools
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from api.authentication import token_cache
+from api.firebase_config import db
+from api.firestore_guard import breaker
+from api.user_lookup import user_resolver
+from api.user_search import user_search
+from api.work_queue import priority_rank
+
+_numbers = itertools.count(1)
+
+
+def verify_id_token(token, check_revoked=False):
+    """Test tokens are 'uid:role'"""
+    uid, role = token.split(':')
+    return {'uid': uid, 'role': role, 'verified': True, 'account_status': 'active',
+            'exp': (datetime.now() + timedelta(hours=1)).timestamp()}
+
+
+class FirestoreTestCase(SimpleTestCase):
+    def setUp(self):
+        db._target.reset()
+        for cache in caches.all():
+            cache.clear()
+        user_resolver.clear()
+        user_search.index = None
+        token_cache.entries.clear()
+        breaker.reset()
+        patcher = mock.patch('api.authentication.auth.verify_id_token', side_effect=verify_id_token)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def auth(uid, role):
+        return {'HTTP_AUTHORIZATION': f'Bearer {uid}:{role}'}
+
+    @staticmethod
+    def make_user(uid, role='user', **fields):
+        data = {
+            'email': f'{uid}@example.com', 'username': uid, 'name': uid.title(), 'role': role,
+            'custom_uid': uid.upper(), 'verified': True, 'account_status': 'active',
+            'active_tickets': 0, 'total_resolved': 0, 'created_at': datetime.now(),
+        }
+        data.update(fields)
+        db.collection('users').document(uid).set(data)
+        return data
+
+    @staticmethod
+    def make_ticket(created_by, assigned_to=None, **fields):
+        number = next(_numbers)
+        now = datetime.now()
+        priority = fields.get('priority', 'Medium')
+        data = {
+            'ticket_id': f'T{number:09d}', 'title': f'Ticket {number}', 'description': 'Something broke',
+            'priority': priority, 'priority_rank': priority_rank(priority), 'category': 'General',
+            'status': 'Open', 'assigned_to': assigned_to, 'created_by': created_by,
+            'created_at': now, 'updated_at': now, 'version': 1, 'sla_deadline': now + timedelta(hours=24),
+            'timeline': [{'action': 'created', 'timestamp': now, 'user': created_by}],
+            'transfer_history': [], 'attachments': [], 'rating': None, 'feedback': None,
+        }
+        data.update(fields)
+        ref = db.collection('tickets').document(f'doc{number}')
+        ref.set(data)
+        return ref.id
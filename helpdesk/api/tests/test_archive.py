@@ -0,0 +1,72 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from api.archive import FirestoreArchive, SegmentArchive, archive_closed_tickets
+from api.firebase_config import db
+
+from .base import FirestoreTestCase
+
+
+class ArchiveTests(FirestoreTestCase):
+    def make_closed(self, days_ago=120, **fields):
+        return self.make_ticket('u1', status='Closed', closed_at=datetime.now() - timedelta(days=days_ago), **fields)
+
+    def hot(self, ticket_id):
+        return db.collection('tickets').document(ticket_id).get().exists
+
+    def segment_archive(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(lambda: [os.remove(os.path.join(directory, name)) for name in os.listdir(directory)])
+        return SegmentArchive(directory)
+
+    def test_moves_only_long_closed_tickets(self):
+        archive = FirestoreArchive()
+        old, recent = self.make_closed(), self.make_closed(days_ago=10)
+        self.assertEqual(archive_closed_tickets(archive=archive), 1)
+        self.assertFalse(self.hot(old))
+        self.assertTrue(self.hot(recent))
+        self.assertEqual(archive.get(old)['status'], 'Closed')
+        tombstones = [doc.to_dict() for doc in db.collection('ticket_tombstones').stream()]
+        self.assertEqual([(t['ticket_id'], t['reason']) for t in tombstones], [(old, 'archived')])
+
+    def test_ticket_changed_after_it_was_read_stays_hot(self):
+        for archive in [FirestoreArchive(), self.segment_archive()]:
+            with self.subTest(archive=type(archive).__name__):
+                first, reopened = self.make_closed(), self.make_closed()
+                page = [db.collection('tickets').document(ticket_id).get() for ticket_id in [first, reopened]]
+                # A user reopens the ticket between the archive run's read and its delete
+                db.collection('tickets').document(reopened).update({'status': 'Open', 'version': 2})
+
+                self.assertEqual(archive.move(page), 1)
+                self.assertFalse(self.hot(first))
+                self.assertEqual(db.collection('tickets').document(reopened).get().to_dict()['status'], 'Open')
+                self.assertIsNotNone(archive.get(first))
+                self.assertIsNone(archive.get(reopened))
+
+    def test_each_segment_run_writes_only_its_own_index(self):
+        archive = self.segment_archive()
+        first = self.make_closed(ticket_id='T000000007')
+        self.assertEqual(archive_closed_tickets(archive=archive), 1)
+        first_index = os.path.join(archive.directory, 'segment-000001.index.json')
+        with open(first_index) as f:
+            written = f.read()
+
+        second = self.make_closed(ticket_id='T000000009')
+        self.assertEqual(archive_closed_tickets(archive=archive), 1)
+        self.assertEqual(sorted(os.listdir(archive.directory)), [
+            'segment-000001.index.json', 'segment-000001.jsonl.gz',
+            'segment-000002.index.json', 'segment-000002.jsonl.gz'])
+        with open(first_index) as f:
+            self.assertEqual(f.read(), written)
+
+        # A fresh reader (another process) finds both
+        reader = SegmentArchive(archive.directory)
+        self.assertEqual(reader.get(first)['ticket_id'], 'T000000007')
+        self.assertEqual(reader.get(second)['ticket_id'], 'T000000009')
+        self.assertIsInstance(reader.get(second)['closed_at'], datetime)
+        self.assertEqual(reader.max_ticket_number(), 9)
+
+        reader.restore(first, reader.get(first))
+        self.assertTrue(self.hot(first))
+        self.assertIsNone(SegmentArchive(archive.directory).get(first))
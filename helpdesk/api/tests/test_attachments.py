@@ -0,0 +1,77 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from api.attachments import LocalBlobStore
+
+from .base import FirestoreTestCase
+
+DATA = bytes(range(256)) * 400
+
+
+class AttachmentDownloadTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp(prefix='helpdesk-attachments-')
+        self.addCleanup(shutil.rmtree, root)
+        store = LocalBlobStore(root)
+        patcher = mock.patch('api.views.attachment_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        blob = store.write_stream(io.BytesIO(DATA).read)
+        self.digest = blob.sha256
+        self.make_user('u1')
+        self.make_user('u2')
+        ticket = self.make_ticket('u1', attachments=[
+            {'sha256': blob.sha256, 'name': 'dump.bin', 'size': blob.size, 'content_type': 'application/octet-stream'}])
+        self.url = f'/api/tickets/{ticket}/attachments/{self.digest}/'
+
+    async def download(self, uid='u1', role='user', **headers):
+        headers['Authorization'] = f'Bearer {uid}:{role}'
+        response = await self.async_client.get(self.url, headers=headers)
+        body = b''
+        if response.streaming:
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        return response, body
+
+    async def test_whole_file(self):
+        response, body = await self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, DATA)
+        self.assertEqual(response['Content-Length'], str(len(DATA)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+
+    async def test_ranges(self):
+        size = len(DATA)
+        for header, start, end in [('bytes=100-199', 100, 199), ('bytes=70000-', 70000, size - 1),
+                                   ('bytes=-10', size - 10, size - 1), ('bytes=100-999999', 100, size - 1)]:
+            response, body = await self.download(Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, DATA[start:end + 1], header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(response['Content-Length'], str(end - start + 1))
+
+    async def test_unsatisfiable_range(self):
+        for header in [f'bytes={len(DATA)}-', 'bytes=-0', 'bytes=200-100']:
+            response, _ = await self.download(Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(DATA)}')
+
+    async def test_if_range(self):
+        response, body = await self.download(Range='bytes=0-9', **{'If-Range': f'"{self.digest}"'})
+        self.assertEqual((response.status_code, body), (206, DATA[:10]))
+        # A different version: the whole file instead of a range of the wrong bytes
+        response, body = await self.download(Range='bytes=0-9', **{'If-Range': '"0000"'})
+        self.assertEqual((response.status_code, body), (200, DATA))
+
+    async def test_not_modified_and_access(self):
+        response, _ = await self.download(**{'If-None-Match': f'"{self.digest}"'})
+        self.assertEqual(response.status_code, 304)
+        response, _ = await self.download('u2', 'user')
+        self.assertEqual(response.status_code, 403)
+        # A digest the ticket doesn't reference grants nothing
+        self.url = self.url.replace(self.digest, 'f' * 64)
+        response, _ = await self.download()
+        self.assertEqual(response.status_code, 404)
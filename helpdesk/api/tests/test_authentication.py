@@ -0,0 +1,77 @@
+from unittest import mock
+
+from firebase_admin import auth
+
+from api.authentication import claims_for
+from api.firebase_config import db
+from api.models import Role
+
+from . import base
+from .base import FirestoreTestCase
+
+
+class RecordCollections:
+    """Fault hook that records which collections each RPC touched"""
+
+    def __init__(self):
+        self.collections = []
+
+    def __call__(self, operation, collection_path, timeout):
+        self.collections.append(collection_path)
+
+
+def claims(**fields):
+    """verify_id_token stand-in whose tokens carry these claims"""
+    def verify(token, check_revoked=False):
+        return dict(base.verify_id_token(token), **fields)
+    return verify
+
+
+class ClaimsAuthenticationTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_user('u1')
+        self.ticket_id = self.make_ticket('u1')
+        self.url = f'/api/tickets/{self.ticket_id}/'
+
+    def test_token_request_reads_no_user_document(self):
+        hook = RecordCollections()
+        db._target.set_fault_hook(hook)
+        response = self.client.get(self.url, **self.auth('u1', 'user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('users', hook.collections)
+
+    def test_token_is_verified_once_per_cache_lifetime(self):
+        with mock.patch('api.authentication.auth.verify_id_token', side_effect=base.verify_id_token) as verify:
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.url, **self.auth('u1', 'user')).status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_claims_decide_access(self):
+        # The user document says active and user; the token's claims win
+        with mock.patch('api.authentication.auth.verify_id_token', side_effect=claims(account_status='blocked')):
+            response = self.client.get(self.url, **self.auth('u1', 'user'))
+        self.assertEqual((response.status_code, response.json()['error']['code']), (403, 'ACCOUNT_BLOCKED'))
+        with mock.patch('api.authentication.auth.verify_id_token', side_effect=claims(verified=False)):
+            response = self.client.get(self.url, **self.auth('ag1', 'agent'))
+        self.assertEqual((response.status_code, response.json()['error']['code']), (403, 'VERIFICATION_REQUIRED'))
+
+    def test_invalid_token_and_missing_credentials(self):
+        with mock.patch('api.authentication.auth.verify_id_token', side_effect=auth.InvalidIdTokenError('bad')):
+            response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer forged')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        response = self.client.get(self.url, {'role': 'admin', 'uid': 'u1'})
+        self.assertEqual((response.status_code, response.json()['error']['code']), (401, 'NOT_AUTHENTICATED'))
+
+    def test_query_params_only_while_allowed_and_checked_against_the_document(self):
+        self.make_user('u2', account_status='blocked')
+        with mock.patch('api.authentication.ALLOW_QUERY_PARAMS', True):
+            self.assertEqual(self.client.get(self.url, {'role': 'user', 'uid': 'u1'}).status_code, 200)
+            response = self.client.get(self.url, {'role': 'user', 'uid': 'u2'})
+        self.assertEqual((response.status_code, response.json()['error']['code']), (403, 'ACCOUNT_BLOCKED'))
+
+    def test_claims_mirror_the_user_document(self):
+        self.assertEqual(claims_for({'role': 'agent', 'verified': False}),
+                         {'role': Role.AGENT, 'verified': False, 'account_status': 'active'})
+        self.assertEqual(claims_for({}), {'role': Role.USER, 'verified': True, 'account_status': 'active'})
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from api.archive import FirestoreArchive
+from api.changefeed import FeedSubscriber, TicketChangeFeed, sort_key
+from api.firebase_config import db
+from api.models import Ticket
+
+from .base import FirestoreTestCase
+
+PRIORITIES = ['Low', 'Medium', 'High', 'Critical']
+
+
+class TicketFeedTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.feed = TicketChangeFeed()
+        self.addCleanup(self.feed.stop)
+        start = datetime.now() - timedelta(days=1)
+        self.ids = [self.make_ticket('u1' if i % 3 else 'u2', priority=PRIORITIES[i % 4],
+                                     created_at=start + timedelta(minutes=i), title=f'Printer {i}' if i % 2 else f'VPN {i}')
+                    for i in range(25)]
+
+    def expected(self, created_by=None, title=None):
+        tickets = [Ticket.from_snapshot(doc) for doc in db.collection('tickets').stream()]
+        tickets = [t for t in tickets if (created_by is None or t.created_by == created_by)
+                   and (title is None or title.lower() in t.title.lower())]
+        return [ticket.id for ticket in sorted(tickets, key=sort_key)]
+
+    def subscribe(self, role, uid, filters=None, page=1, loop=None):
+        subscriber = FeedSubscriber(loop, role, uid, filters, page=page)
+        total, page = self.feed.subscribe(subscriber)
+        return subscriber, total, [ticket.id for ticket in page]
+
+    def test_pages_come_back_in_dashboard_order(self):
+        expected = self.expected()
+        for page in [1, 2, 3]:
+            _, total, ids = self.subscribe('admin', 'ad1', page=page)
+            self.assertEqual(total, 25)
+            self.assertEqual(ids, expected[(page - 1) * 10:page * 10])
+
+    def test_users_only_see_their_own_tickets(self):
+        _, total, ids = self.subscribe('user', 'u2')
+        self.assertEqual(total, 9)
+        self.assertEqual(ids, self.expected(created_by='u2'))
+
+    def test_search_is_filtered_while_the_ordered_query_streams(self):
+        _, total, ids = self.subscribe('admin', 'ad1', {'search': 'printer'}, page=2)
+        expected = self.expected(title='printer')
+        self.assertEqual(total, len(expected))
+        self.assertEqual(ids, expected[10:20])
+
+    async def test_changes_to_the_page_are_pushed(self):
+        loop = asyncio.get_running_loop()
+        subscriber, _, ids = self.subscribe('admin', 'ad1', loop=loop)
+
+        # A new Critical ticket sorts first; the page's last ticket moves on to page 2
+        new_id = self.make_ticket('u1', priority='Critical')
+        await asyncio.sleep(0)
+        events = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+        self.assertEqual([(e['type'], e['id']) for e in events], [('added', new_id), ('removed', ids[-1])])
+
+        # Archiving a ticket on the page removes it through its tombstone
+        archived = db.collection('tickets').document(ids[0])
+        db.collection('tickets').document(ids[0]).update({'status': 'Closed'})
+        FirestoreArchive().move([archived.get()])
+        await asyncio.sleep(0)
+        events = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+        self.assertEqual([(e['type'], e['id']) for e in events][-1], ('removed', ids[0]))
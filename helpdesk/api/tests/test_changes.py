@@ -0,0 +1,113 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+
+from api.changes import TOMBSTONE_RETENTION, encode_cursor, record_reassignment, record_tombstone
+from api.firebase_config import db
+
+from .base import FirestoreTestCase
+
+
+class TicketChangesTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        # No settle window, so writes made by the test are visible at once
+        patcher = mock.patch('api.changes.SETTLE', timedelta(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.make_user('u1')
+        self.make_user('u2')
+        self.make_user('ag1', 'agent')
+        self.make_user('ad1', 'admin')
+
+    def changes(self, uid, role, since=None, limit=None):
+        params = {}
+        if since:
+            params['since'] = since
+        if limit:
+            params['limit'] = limit
+        return self.client.get('/api/tickets/changes/', params, **self.auth(uid, role))
+
+    def sync(self, uid, role, since=None, limit=None):
+        """Follow has_more to the end; returns (ticket ids in order, removed, cursor)"""
+        ids, removed = [], []
+        while True:
+            body = self.changes(uid, role, since, limit).json()
+            ids += [ticket['id'] for ticket in body['tickets']]
+            removed += body['removed']
+            since = body['cursor']
+            if not body['has_more']:
+                return ids, removed, since
+
+    def touch(self, doc_id, when=None):
+        db.collection('tickets').document(doc_id).update({'updated_at': when or datetime.now()})
+
+    def test_full_sync_pages_through_the_callers_tickets(self):
+        mine = [self.make_ticket('u1') for _ in range(5)]
+        self.make_ticket('u2')
+        first = self.changes('u1', 'user', limit=2).json()
+        self.assertEqual(len(first['tickets']), 2)
+        self.assertTrue(first['has_more'])
+        ids, removed, _ = self.sync('u1', 'user', first['cursor'], limit=2)
+        self.assertEqual([ticket['id'] for ticket in first['tickets']] + ids, mine)
+        self.assertEqual(removed, [])
+
+    def test_cursor_returns_only_later_changes(self):
+        tickets = [self.make_ticket('u1') for _ in range(3)]
+        _, _, cursor = self.sync('u1', 'user')
+        self.assertEqual(self.sync('u1', 'user', cursor)[0], [])
+        self.touch(tickets[1])
+        ids, _, cursor = self.sync('u1', 'user', cursor)
+        self.assertEqual(ids, [tickets[1]])
+        self.assertEqual(self.sync('u1', 'user', cursor)[0], [])
+
+    def test_tickets_with_the_same_timestamp_are_not_skipped_between_pages(self):
+        when = datetime.now()
+        tickets = sorted(self.make_ticket('u1') for _ in range(4))
+        for doc_id in tickets:
+            self.touch(doc_id, when)
+        self.assertEqual(self.sync('u1', 'user', limit=1)[0], tickets)
+
+    def test_reassignment_leaves_a_tombstone_for_the_old_assignee(self):
+        ticket = self.make_ticket('u1', 'ag1')
+        ids, _, agent_cursor = self.sync('ag1', 'agent')
+        self.assertEqual(ids, [ticket])
+        _, _, admin_cursor = self.sync('ad1', 'admin')
+
+        batch = db.batch()
+        batch.update(db.collection('tickets').document(ticket), {'assigned_to': 'ag2', 'updated_at': datetime.now()})
+        record_reassignment(batch, ticket, 'ag1', 'ag2')
+        batch.commit()
+
+        ids, removed, agent_cursor = self.sync('ag1', 'agent', agent_cursor)
+        self.assertEqual(ids, [])
+        self.assertEqual([(r['id'], r['reason']) for r in removed], [(ticket, 'reassigned')])
+        # Delivered once
+        self.assertEqual(self.sync('ag1', 'agent', agent_cursor)[1], [])
+        # Admins still see the ticket, so only the update reaches them
+        ids, removed, _ = self.sync('ad1', 'admin', admin_cursor)
+        self.assertEqual((ids, removed), ([ticket], []))
+
+    def test_archived_tombstone_reaches_admins_and_the_creator(self):
+        ticket = self.make_ticket('u1', status='Closed')
+        _, _, admin_cursor = self.sync('ad1', 'admin')
+        _, _, user_cursor = self.sync('u1', 'user')
+        batch = db.batch()
+        record_tombstone(batch, ticket, 'archived', ['u1'])
+        batch.commit()
+        for uid, role, cursor in [('ad1', 'admin', admin_cursor), ('u1', 'user', user_cursor)]:
+            removed = self.sync(uid, role, cursor)[1]
+            self.assertEqual([(r['id'], r['reason']) for r in removed], [(ticket, 'archived')])
+        self.assertEqual(self.sync('u2', 'user')[1], [])
+
+    def test_expired_and_invalid_cursors(self):
+        old = datetime.now() - TOMBSTONE_RETENTION - timedelta(days=1)
+        expired = encode_cursor({'u': None, 'i': None, 'r': old.isoformat(), 'ri': None})
+        response = self.changes('u1', 'user', expired)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['error']['code'], 'CURSOR_EXPIRED')
+        for bad in ['not-a-cursor', base64.urlsafe_b64encode(json.dumps({'u': 'yesterday'}).encode()).decode()]:
+            response = self.changes('u1', 'user', bad)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error']['code'], 'INVALID_CURSOR')
@@ -0,0 +1,38 @@
+from unittest import mock
+
+from api.counters import get_workload, increment_workload, reconcile_workloads
+from api.firebase_config import db
+
+from .base import FirestoreTestCase
+
+
+class WorkloadCounterTests(FirestoreTestCase):
+    def test_pre_sharding_count_is_the_baseline(self):
+        self.make_user('ag1', 'agent', active_tickets=3)
+        self.assertEqual(get_workload('ag1'), 3)
+        increment_workload('ag1', 1)
+        increment_workload('ag1', 1)
+        increment_workload('ag1', -1)
+        self.assertEqual(get_workload('ag1'), 4)
+
+    def test_reconcile_fixes_drift_against_the_baseline(self):
+        self.make_user('ag1', 'agent', active_tickets=5)
+        self.make_user('u1')
+        for _ in range(2):
+            self.make_ticket('u1', 'ag1')
+        self.make_ticket('u1', 'ag1', status='Resolved')
+
+        corrections = reconcile_workloads()
+        self.assertEqual([(c['uid'], c['recorded'], c['actual']) for c in corrections], [('ag1', 5, 2)])
+        self.assertEqual(get_workload('ag1'), 2)
+        self.assertEqual(reconcile_workloads(dry_run=True), [])
+
+    def test_setting_the_role_again_keeps_the_counters(self):
+        self.make_user('ag1', 'agent', active_tickets=2, total_resolved=7)
+        claims = {'uid': 'ag1', 'email': 'ag1@example.com'}
+        with mock.patch('api.views.auth.verify_id_token', return_value=claims):
+            response = self.client.post('/api/set-role/', {'id_token': 'x', 'role': 'agent'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        user = db.collection('users').document('ag1').get().to_dict()
+        self.assertEqual((user['active_tickets'], user['total_resolved']), (2, 7))
+        self.assertEqual(get_workload('ag1'), 2)
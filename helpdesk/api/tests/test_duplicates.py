@@ -0,0 +1,72 @@
+import random
+
+from api.duplicates import LINK_THRESHOLD, band_keys, bands_update, find_duplicates, jaccard, shingles
+
+from .base import FirestoreTestCase
+
+WORDS = ['printer', 'vpn', 'office', 'laptop', 'error', 'cannot', 'connect', 'email', 'outlook', 'password',
+         'reset', 'screen', 'monitor', 'network', 'slow', 'crash', 'update', 'install', 'license', 'access',
+         'denied', 'server', 'drive', 'shared', 'folder', 'teams', 'meeting', 'audio', 'camera', 'keyboard']
+
+
+def edited(words, count, rng):
+    """words with `count` of them replaced at random"""
+    words = list(words)
+    for i in rng.sample(range(len(words)), count):
+        words[i] = rng.choice(WORDS)
+    return words
+
+
+def share_band(a, b):
+    return bool(set(band_keys('', a)) & set(band_keys('', b)))
+
+
+class BandRecallTests(FirestoreTestCase):
+    def test_similar_pairs_share_a_band(self):
+        rng = random.Random(1)
+        found = total = 0
+        while total < 200:
+            base = [rng.choice(WORDS) for _ in range(25)]
+            a, b = ' '.join(base), ' '.join(edited(base, rng.randint(0, 4), rng))
+            if jaccard(shingles('', a), shingles('', b)) < LINK_THRESHOLD:
+                continue
+            total += 1
+            found += share_band(a, b)
+        # 1 - (1 - 0.8^4)^8 = 99.97% at the link threshold
+        self.assertGreaterEqual(found / total, 0.99)
+
+    def test_unrelated_pairs_rarely_share_a_band(self):
+        rng = random.Random(2)
+        pairs = [(' '.join(rng.choice(WORDS) for _ in range(25)), ' '.join(rng.choice(WORDS) for _ in range(25)))
+                 for _ in range(200)]
+        self.assertLessEqual(sum(share_band(a, b) for a, b in pairs) / len(pairs), 0.05)
+
+
+class FindDuplicatesTests(FirestoreTestCase):
+    TITLE = 'VPN down in Berlin office'
+    DESCRIPTION = 'Nobody in the Berlin office can connect to the VPN since 9am, error 809'
+
+    def add(self, title, description, status='Open'):
+        return self.make_ticket('u1', title=title, description=description, status=status,
+                                dedupe_bands=band_keys(title, description))
+
+    def test_near_duplicates_are_found_best_first(self):
+        exact = self.add(self.TITLE, self.DESCRIPTION)
+        close = self.add(self.TITLE, self.DESCRIPTION + ' (third floor)')
+        self.add('Printer jammed', 'The second floor printer jams on every page')
+        matches = find_duplicates(self.TITLE, self.DESCRIPTION)
+        self.assertEqual([match['id'] for match in matches], [exact, close])
+        self.assertEqual(matches[0]['similarity'], 1.0)
+        self.assertGreaterEqual(matches[1]['similarity'], LINK_THRESHOLD)
+        self.assertEqual([match['id'] for match in find_duplicates(self.TITLE, self.DESCRIPTION, exclude=exact)],
+                         [close])
+
+    def test_closed_tickets_leave_the_index(self):
+        ticket = {'status': 'Open', 'title': self.TITLE, 'description': self.DESCRIPTION,
+                  'dedupe_bands': band_keys(self.TITLE, self.DESCRIPTION)}
+        self.assertEqual(bands_update(ticket, 'Closed'), [])
+        self.assertIsNone(bands_update(ticket, 'In Progress'))
+        self.assertEqual(bands_update(dict(ticket, status='Closed', dedupe_bands=[]), 'Open'), ticket['dedupe_bands'])
+        # Even with stale bands left on it, a closed ticket is not a duplicate
+        self.add(self.TITLE, self.DESCRIPTION, status='Closed')
+        self.assertEqual(find_duplicates(self.TITLE, self.DESCRIPTION), [])
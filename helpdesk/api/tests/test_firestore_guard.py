@@ -0,0 +1,76 @@
+from unittest import mock
+
+from google.api_core import exceptions as google_exceptions
+
+from api.firebase_config import db
+from api.firestore_guard import breaker
+from api.memory_firestore import FaultInjector
+
+from .base import FirestoreTestCase
+
+
+class FailFirst:
+    """Fault hook: the first `count` matching RPCs raise ServiceUnavailable"""
+
+    def __init__(self, count, operations=None):
+        self.count = count
+        self.operations = operations
+        self.calls = 0
+
+    def __call__(self, operation, collection_path, timeout):
+        if self.operations is not None and operation not in self.operations:
+            return
+        self.calls += 1
+        if self.calls <= self.count:
+            raise google_exceptions.ServiceUnavailable(f'Injected fault on {operation}')
+
+
+class DeadlineMiddlewareTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_user('ad1', 'admin')
+        self.make_user('u1')
+
+    def test_retried_failure_keeps_the_views_own_error(self):
+        hook = FailFirst(1)
+        db._target.set_fault_hook(hook)
+        response = self.client.get('/api/tickets/T999999999/', **self.auth('ad1', 'admin'))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error']['code'], 'NOT_FOUND')
+        self.assertGreater(hook.calls, 1)
+
+    def test_swallowed_failure_keeps_the_views_own_error(self):
+        # The legacy account check logs a failed user read and lets the request through
+        db._target.set_fault_hook(FaultInjector(error_rate=1.0, collections={'users'}))
+        with mock.patch('api.authentication.ALLOW_QUERY_PARAMS', True):
+            response = self.client.get('/api/tickets/T999999999/', {'role': 'admin', 'uid': 'ad1'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error']['code'], 'NOT_FOUND')
+
+    def test_unhandled_failure_answers_503_with_retry_after(self):
+        db._target.set_fault_hook(FailFirst(100))
+        response = self.client.get('/api/tickets/T999999999/', **self.auth('ad1', 'admin'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['error']['code'], 'FIRESTORE_UNAVAILABLE')
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_catch_all_handler_does_not_turn_an_outage_into_400(self):
+        # The user read succeeds; the (never retried) update fails
+        db._target.set_fault_hook(FailFirst(1, operations={'commit'}))
+        response = self.client.patch('/api/users/u1/status/', {'status': 'blocked'},
+                                     content_type='application/json', **self.auth('ad1', 'admin'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(db.collection('users').document('u1').get().to_dict()['account_status'], 'active')
+
+    def test_open_circuit_answers_503_with_cooldown(self):
+        for _ in range(breaker.min_calls):
+            breaker.record(False)
+        response = self.client.get('/api/tickets/T999999999/', **self.auth('ad1', 'admin'))
+        self.assertEqual(response.status_code, 503)
+        self.assertGreater(int(response['Retry-After']), 1)
+
+    def test_exhausted_deadline_answers_504(self):
+        with mock.patch('api.firestore_guard.REQUEST_DEADLINE', 0):
+            response = self.client.get('/api/tickets/T999999999/', **self.auth('ad1', 'admin'))
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json()['error']['code'], 'DEADLINE_EXCEEDED')
@@ -0,0 +1,32 @@
+from api import outbox
+from api.counters import get_workload
+from api.firebase_config import db
+
+from .base import FirestoreTestCase
+
+
+class OutboxTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_user('ag1', 'agent')
+        self.make_user('u1')
+
+    def feedback(self, ticket, rating):
+        return self.client.post(f'/api/tickets/{ticket}/feedback/', {'rating': rating}, content_type='application/json',
+                                **self.auth('u1', 'user'))
+
+    def test_resubmitted_feedback_counts_the_ticket_once(self):
+        ticket = self.make_ticket('u1', 'ag1', status='Resolved')
+        self.assertEqual(self.feedback(ticket, 4).status_code, 200)
+        self.assertEqual(self.feedback(ticket, 2).status_code, 200)
+        outbox.drain()
+        self.assertEqual(db.collection('users').document('ag1').get().to_dict()['total_resolved'], 1)
+
+    def test_redelivered_event_applies_once(self):
+        batch = db.batch()
+        outbox.record_event(batch, 'ticket.created', 'T1', {'workload': {'ag1': 1}})
+        batch.commit()
+        event = outbox.claim_batch()[0]
+        self.assertEqual(outbox.deliver(event), 'done')
+        self.assertEqual(outbox.deliver(event), 'duplicate')
+        self.assertEqual(get_workload('ag1'), 1)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+from api import views
+from api.single_flight import SingleFlight
+from api.user_search import user_search
+from helpdesk_project.asgi import application
+
+from .base import FirestoreTestCase
+
+
+async def asgi_get(path, query='', token=''):
+    """
+    One GET through the ASGI application the server runs, which gives each
+    request its own thread for sync code. Call it from asyncio.run(), not an
+    async test: under async_to_sync all sync code would share the test's thread.
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    body = b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+    return messages[0]['status'], json.loads(body)
+
+
+async def gather(requests):
+    return await asyncio.gather(*requests)
+
+
+class SingleFlightTests(FirestoreTestCase):
+    def test_threads_share_one_call(self):
+        flight = SingleFlight('test')
+        calls = []
+        results = []
+        barrier = threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'report'
+
+        def request():
+            barrier.wait()
+            results.append(flight.do('key', compute))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['report'] * 8)
+
+    async def test_a_cancelled_caller_leaves_the_call_running_for_the_rest(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'report'
+
+        first = asyncio.ensure_future(flight.do_async('key', compute))
+        second = asyncio.ensure_future(flight.do_async('key', compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 'report')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.tasks, {})
+
+    def test_concurrent_sla_reports_run_one_scan(self):
+        self.make_user('ad1', 'admin')
+        self.make_ticket('u1', sla_deadline=datetime.now() - timedelta(hours=1))
+        self.make_ticket('u1')
+        breached_report = views.breached_report
+        scans = []
+
+        def slow_report(cache_key):
+            scans.append(cache_key)
+            time.sleep(0.2)
+            return breached_report(cache_key)
+
+        with mock.patch('api.views.breached_report', slow_report):
+            responses = asyncio.run(gather(asgi_get('/api/reports/sla/', token='ad1:admin') for _ in range(8)))
+        self.assertEqual(responses, [(200, {'breached_tickets': mock.ANY, 'count': 1})] * 8)
+        self.assertEqual(len(scans), 1)
+
+    def test_concurrent_sync_views_share_one_index_build(self):
+        # UserSearchView is a sync view: each request runs in its own thread
+        self.make_user('ad1', 'admin')
+        self.make_user('garcia')
+        rebuild = user_search.rebuild
+        builds = []
+
+        def slow_rebuild():
+            builds.append(threading.get_ident())
+            time.sleep(0.2)
+            return rebuild()
+
+        with mock.patch.object(user_search, 'rebuild', slow_rebuild):
+            responses = asyncio.run(gather(asgi_get('/api/users/search/', query='q=garc', token='ad1:admin')
+                                           for _ in range(4)))
+        self.assertEqual([(code, body['count']) for code, body in responses], [(200, 1)] * 4)
+        self.assertEqual(len(builds), 1)
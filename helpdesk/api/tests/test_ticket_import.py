@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from google.api_core import exceptions as google_exceptions
+
+from api.archive import ticket_number
+from api.counters import get_workload
+from api.firebase_config import db
+from api.ticket_import import import_tickets
+
+from .base import FirestoreTestCase
+
+
+class FailTicketCommit:
+    """Fault hook: the nth commit of tickets fails (a worker dying mid-import)"""
+
+    def __init__(self, n):
+        self.n = n
+        self.commits = 0
+
+    def __call__(self, operation, collection_path, timeout):
+        if operation == 'commit' and collection_path == 'tickets':
+            self.commits += 1
+            if self.commits == self.n:
+                raise google_exceptions.ServiceUnavailable('Injected fault on commit')
+
+
+class TicketImportTests(FirestoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_user('u1')
+        self.make_user('ag1', 'agent')
+        directory = tempfile.mkdtemp(prefix='helpdesk-import-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.source = os.path.join(directory, 'tickets.jsonl')
+        self.checkpoint = os.path.join(directory, 'tickets.checkpoint')
+        rows = [{'title': f'Imported {i}', 'description': 'Printer jammed', 'created_by': 'u1',
+                 'assigned_to': 'ag1', 'external_id': f'X{i}'} for i in range(5)]
+        rows.insert(2, {'title': '', 'description': 'No title'})
+        with open(self.source, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+            f.write('not json\n')
+
+    def imported(self):
+        return {doc.to_dict()['external_id']: doc.id
+                for doc in db.collection('tickets').where('external_id', '!=', None).stream()}
+
+    def run_import(self):
+        return import_tickets(self.source, checkpoint_path=self.checkpoint, workers=1, batch_size=2)
+
+    def test_resume_skips_committed_chunks(self):
+        existing = ticket_number(db.collection('tickets').document(self.make_ticket('u1')).get().to_dict()['ticket_id'])
+        db._target.set_fault_hook(FailTicketCommit(2))
+        with mock.patch('api.ticket_import.COMMIT_RETRIES', 1):
+            with self.assertRaises(google_exceptions.ServiceUnavailable):
+                self.run_import()
+        # The chunk after the failed one was already queued and committed
+        self.assertEqual(sorted(self.imported()), ['X0', 'X1', 'X4'])
+        with open(self.checkpoint) as f:
+            saved = json.load(f)
+        self.assertEqual((saved['imported'], saved['next_row'], saved['done']), (3, 2, [5]))
+
+        hook = FailTicketCommit(0)
+        db._target.set_fault_hook(hook)
+        result = self.run_import()
+        self.assertEqual(hook.commits, 1)
+        tickets = self.imported()
+        self.assertEqual(sorted(tickets), [f'X{i}' for i in range(5)])
+        self.assertEqual(result['imported'], 5)
+        self.assertEqual(result['next_row'], result['total'])
+        # Same reserved block on resume, above every ticket already in use
+        self.assertEqual(result['base'], saved['base'])
+        self.assertGreater(min(ticket_number(ticket_id) for ticket_id in tickets.values()), existing)
+        # Workload counted once per ticket, not again for the chunk committed before the failure
+        self.assertEqual(get_workload('ag1'), 5)
+
+        self.assertEqual(self.run_import()['imported'], 5)
+        self.assertEqual(len(self.imported()), 5)
+
+    def test_invalid_rows_are_reported_by_line(self):
+        result = self.run_import()
+        self.assertEqual(result['failed'], 2)
+        self.assertEqual(result['errors'], [{'row': 3, 'error': 'Title and description required'},
+                                            {'row': 7, 'error': 'Row is not a JSON object'}])
+
+    def test_command_dry_run_writes_nothing(self):
+        out = io.StringIO()
+        call_command('import_tickets', self.source, '--dry-run', stdout=out, stderr=io.StringIO())
+        self.assertIn('5 valid row(s), 2 invalid', out.getvalue())
+        self.assertEqual(self.imported(), {})
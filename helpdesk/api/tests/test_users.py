@@ -0,0 +1,37 @@
+from api.authentication import claims_for
+from api.models import Role, User
+
+from .base import FirestoreTestCase
+
+
+class UserRecordTests(FirestoreTestCase):
+    def test_user_list_is_serialized_from_records(self):
+        self.make_user('ad1', 'admin')
+        self.make_user('ag1', 'agent', department='Network')
+        response = self.client.get('/api/users/', **self.auth('ad1', 'admin'))
+        self.assertEqual(response.status_code, 200)
+        users = {user['uid']: user for user in response.json()['users']}
+        self.assertEqual(set(users), {'ad1', 'ag1'})
+        self.assertEqual(users['ag1']['role'], 'agent')
+        # Timestamps as Unix seconds, unknown fields kept
+        self.assertIsInstance(users['ag1']['created_at'], int)
+        self.assertEqual(users['ag1']['department'], 'Network')
+        self.assertNotIn('id', users['ag1'])
+
+    def test_batch_hides_other_regular_users_from_users(self):
+        self.make_user('u1')
+        self.make_user('u2')
+        self.make_user('ag1', 'agent')
+        response = self.client.get('/api/users/batch/', {'uids': 'u1,u2,ag1,nobody'}, **self.auth('u1', 'user'))
+        users = response.json()['users']
+        self.assertEqual(users['u1']['uid'], 'u1')
+        self.assertEqual(users['ag1']['username'], 'ag1')
+        self.assertIsNone(users['u2'])
+        self.assertIsNone(users['nobody'])
+
+    def test_roles_are_shared_enum_members(self):
+        self.assertIs(claims_for({'role': 'agent'})['role'], Role.AGENT)
+        self.assertIs(claims_for({})['role'], Role.USER)
+        user = User.from_dict('ag1', {'role': 'agent', 'account_status': 'active'})
+        self.assertIs(user.role, Role.AGENT)
+        self.assertEqual(user.to_dict(), {'role': 'agent', 'account_status': 'active'})
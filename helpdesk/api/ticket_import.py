@@ -0,0 +1,322 @@
+"""
+Bulk ticket import for migrations
+Streams tickets from a CSV or JSONL file (optionally .gz), validates each row,
+and writes them with chunked Firestore batch commits from a small worker pool.
+Ticket IDs are reserved as one block up front, so rows need no ID scan and no
+per-row agent assignment. Progress is checkpointed to a JSON file; re-running
+with the same checkpoint skips everything already committed.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from .archive import ticket_archive, ticket_number
+from .counters import OPEN_STATUSES, increment_workload
+from .duplicates import band_keys
+from .firebase_config import db
+from .user_lookup import user_resolver
+from .user_snapshots import display_snapshot
+from .work_queue import priority_rank
+
+SLA_HOURS = {'Low': 48, 'Medium': 24, 'High': 12, 'Critical': 4}
+STATUSES = ['Open', 'In Progress', 'Escalated', 'Breached', 'Resolved', 'Closed']
+
+# Firestore batch write limit; ticket sets plus one counter write per assignee
+MAX_BATCH_OPS = 500
+DEFAULT_BATCH_SIZE = 400
+COMMIT_RETRIES = 3
+
+
+def sequence_ref():
+    return db.collection('system').document('ticket_ids')
+
+
+def reserved_ticket_number():
+    """Highest ticket number reserved by an import (generate_ticket_id starts above it)"""
+    doc = sequence_ref().get()
+    return doc.to_dict().get('reserved_through', 0) if doc.exists else 0
+
+
+def reserve_ticket_numbers(count):
+    """Reserve `count` consecutive ticket numbers above everything in use; returns the first"""
+    highest = max(reserved_ticket_number(), ticket_archive.max_ticket_number())
+    for doc in db.collection('tickets').select(['ticket_id']).stream():
+        highest = max(highest, ticket_number(doc.to_dict().get('ticket_id', '')))
+    sequence_ref().set({'reserved_through': highest + count}, merge=True)
+    return highest + 1
+
+
+def open_source(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(path, file_format=None):
+    """Yield row dicts one at a time; a JSONL line that isn't valid JSON yields None"""
+    file_format = file_format or detect_format(path)
+    with open_source(path) as source:
+        if file_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def count_rows(path, file_format=None):
+    return sum(1 for _ in read_rows(path, file_format))
+
+
+def parse_timestamp(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def validate_row(row):
+    """Return (fields, None) or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, 'Row is not a JSON object'
+    title = (row.get('title') or '').strip()
+    description = (row.get('description') or '').strip()
+    if not title or not description:
+        return None, 'Title and description required'
+    priority = row.get('priority') or 'Medium'
+    if priority not in SLA_HOURS:
+        return None, f'Invalid priority: {priority}'
+    ticket_status = row.get('status') or 'Open'
+    if ticket_status not in STATUSES:
+        return None, f'Invalid status: {ticket_status}'
+    try:
+        created_at = parse_timestamp(row.get('created_at')) or datetime.now()
+        resolved_at = parse_timestamp(row.get('resolved_at'))
+        closed_at = parse_timestamp(row.get('closed_at'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None, 'Invalid timestamp'
+    return {
+        'title': title,
+        'description': description,
+        'priority': priority,
+        'category': row.get('category') or 'General',
+        'status': ticket_status,
+        'created_by': row.get('created_by') or None,
+        'assigned_to': row.get('assigned_to') or None,
+        'created_at': created_at,
+        'resolved_at': resolved_at,
+        'closed_at': closed_at,
+        'external_id': row.get('external_id') or row.get('id') or None,
+    }, None
+
+
+def build_ticket(ticket_id, fields, users):
+    created_at = fields['created_at']
+    ticket = {
+        'ticket_id': ticket_id,
+        'title': fields['title'],
+        'description': fields['description'],
+        'priority': fields['priority'],
+        'priority_rank': priority_rank(fields['priority']),
+        'category': fields['category'],
+        'status': fields['status'],
+        'assigned_to': fields['assigned_to'],
+        'assigned_to_display': display_snapshot(users.get(fields['assigned_to'])),
+        'created_by': fields['created_by'],
+        'created_by_display': display_snapshot(users.get(fields['created_by'])),
+        'created_at': created_at,
+        # Import time, not source time, so delta-sync clients pick imported tickets up
+        'updated_at': datetime.now(),
+        'version': 1,
+        'sla_deadline': created_at + timedelta(hours=SLA_HOURS[fields['priority']]),
+        'timeline': [{'action': 'created', 'timestamp': created_at, 'user': fields['created_by']}],
+        'idempotency_key': None,
+        'transfer_history': [],
+        'feedback': None,
+        'rating': None,
+        'contact': None,
+        'github': None,
+        'reopen_count': 0,
+        'external_id': fields['external_id'],
+        'dedupe_bands': band_keys(fields['title'], fields['description']) if fields['status'] in OPEN_STATUSES else [],
+    }
+    for field in ['resolved_at', 'closed_at']:
+        if fields[field]:
+            ticket[field] = fields[field]
+    return ticket
+
+
+class Checkpoint:
+    """
+    JSON file recording the reserved ID block and how far the import got.
+    next_row: every row before it is committed; done: start rows of chunks
+    committed beyond next_row (chunks can finish out of order).
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.state = {'source': os.path.abspath(source), 'base': None, 'total': None,
+                      'next_row': 0, 'done': [], 'imported': 0, 'failed': 0}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('source') != self.state['source']:
+                raise ValueError(f"Checkpoint {path} belongs to {saved.get('source')}")
+            self.state.update(saved)
+
+    def __getitem__(self, key):
+        return self.state[key]
+
+    def __setitem__(self, key, value):
+        self.state[key] = value
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+
+def iter_chunks(path, file_format, start_row, batch_size):
+    """
+    Yield (start_row, end_row, [(row_index, fields)], errors) chunks. A chunk
+    ends at batch_size tickets or when tickets + distinct assignees would fill
+    one Firestore batch. Boundaries depend only on the file, so they are the
+    same on every run.
+    """
+    chunk, errors, assignees = [], [], set()
+    chunk_start = end_row = start_row
+    for row_index, row in enumerate(read_rows(path, file_format)):
+        if row_index < start_row:
+            continue
+        end_row = row_index + 1
+        fields, error = validate_row(row)
+        if error:
+            errors.append({'row': end_row, 'error': error})
+        else:
+            chunk.append((row_index, fields))
+            if fields['assigned_to'] and fields['status'] in OPEN_STATUSES:
+                assignees.add(fields['assigned_to'])
+        if len(chunk) >= batch_size or len(chunk) + len(assignees) >= MAX_BATCH_OPS:
+            yield chunk_start, end_row, chunk, errors
+            chunk, errors, assignees = [], [], set()
+            chunk_start = end_row
+    if chunk or errors:
+        yield chunk_start, end_row, chunk, errors
+
+
+def write_chunk(base, chunk):
+    """Commit one chunk of tickets (and the assignees' workload) in a single batch"""
+    users = user_resolver.resolve(
+        [fields['created_by'] for _, fields in chunk] + [fields['assigned_to'] for _, fields in chunk])
+    batch = db.batch()
+    workload = {}
+    for row_index, fields in chunk:
+        ticket_id = f'T{str(base + row_index).zfill(9)}'
+        # Document ID = ticket ID, so re-running a chunk overwrites instead of duplicating
+        batch.set(db.collection('tickets').document(ticket_id), build_ticket(ticket_id, fields, users))
+        if fields['assigned_to'] and fields['status'] in OPEN_STATUSES:
+            workload[fields['assigned_to']] = workload.get(fields['assigned_to'], 0) + 1
+    for uid, delta in workload.items():
+        increment_workload(uid, delta, batch)
+
+    for attempt in range(COMMIT_RETRIES):
+        try:
+            batch.commit()
+            return len(chunk)
+        except Exception:
+            if attempt == COMMIT_RETRIES - 1:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def import_tickets(path, file_format=None, checkpoint_path=None, workers=4, batch_size=DEFAULT_BATCH_SIZE,
+                   dry_run=False, progress=None, max_errors=1000):
+    """
+    Import tickets from path. progress(state) is called after every committed
+    chunk. Returns the checkpoint state plus the first max_errors row errors.
+    """
+    checkpoint = Checkpoint(checkpoint_path, path)
+    if checkpoint['total'] is None:
+        checkpoint['total'] = count_rows(path, file_format)
+    if checkpoint['base'] is None and not dry_run:
+        checkpoint['base'] = reserve_ticket_numbers(checkpoint['total'])
+        checkpoint.save()
+
+    errors = []
+    done = set(checkpoint['done'])
+    # chunk start row -> end row, for advancing next_row over contiguous chunks
+    boundaries = {}
+
+    def advance():
+        while checkpoint['next_row'] in done:
+            start = checkpoint['next_row']
+            done.discard(start)
+            checkpoint['next_row'] = boundaries.pop(start)
+        checkpoint['done'] = sorted(done)
+
+    in_flight = {}
+
+    def collect(finished):
+        # Record every finished chunk, even when one of them failed, so a
+        # resumed run doesn't commit (and count workload for) them twice
+        failure = None
+        for future in finished:
+            start = in_flight.pop(future)
+            try:
+                checkpoint['imported'] += future.result()
+                done.add(start)
+            except Exception as e:
+                failure = failure or e
+        if failure and in_flight:
+            collect(wait(list(in_flight))[0])
+        advance()
+        checkpoint.save()
+        if progress:
+            progress(checkpoint.state)
+        if failure:
+            raise failure
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start, end, chunk, chunk_errors in iter_chunks(path, file_format, checkpoint['next_row'], batch_size):
+            boundaries[start] = end
+            if start in done:
+                # Committed before an interruption, after the last contiguous checkpoint
+                advance()
+                continue
+            checkpoint['failed'] += len(chunk_errors)
+            errors.extend(chunk_errors[:max(0, max_errors - len(errors))])
+            if dry_run or not chunk:
+                done.add(start)
+                advance()
+                continue
+
+            # Bounded pipeline: at most two chunks per worker queued or running
+            if len(in_flight) >= workers * 2:
+                collect(wait(list(in_flight), return_when=FIRST_COMPLETED)[0])
+            in_flight[pool.submit(write_chunk, checkpoint['base'], chunk)] = start
+
+        if in_flight:
+            collect(wait(list(in_flight))[0])
+
+    if not dry_run:
+        checkpoint.save()
+    return dict(checkpoint.state, errors=errors)
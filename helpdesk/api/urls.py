@@ -1,19 +1,32 @@
 from django.urls import path
-from .views import (RegisterView, LoginView, SetRoleView, TicketListView, 
-                    TicketDetailView, SLAReportView, UsersView, TransferTicketView, SubmitFeedbackView, 
-                    UserRoleUpdateView, UserStatusUpdateView, AgentVerificationView, AdminTransferView)
+from .views import (RegisterView, LoginView, SetRoleView, TicketListView, TicketChangesView, TicketQueueView, 
+                    TicketDetailView, SatisfactionReportView, AnalyticsReportView, UserBatchView, UserSearchView, TransferTicketView, SubmitFeedbackView, 
+                    UserRoleUpdateView, UserStatusUpdateView, AgentVerificationView, AdminTransferView,
+                    TicketAttachmentsView, ticket_stream, ticket_export, ticket_attachment,
+                    sla_report, dashboard_summary, users)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('set-role/', SetRoleView.as_view(), name='set-role'),
     path('login/', LoginView.as_view(), name='login'),
     path('tickets/', TicketListView.as_view(), name='ticket-list'),
+    path('tickets/stream/', ticket_stream, name='ticket-stream'),
+    path('tickets/export/', ticket_export, name='ticket-export'),
+    path('tickets/changes/', TicketChangesView.as_view(), name='ticket-changes'),
+    path('tickets/queue/', TicketQueueView.as_view(), name='ticket-queue'),
     path('tickets/<str:ticket_id>/', TicketDetailView.as_view(), name='ticket-detail'),
     path('tickets/<str:ticket_id>/transfer/', TransferTicketView.as_view(), name='transfer-ticket'),
     path('tickets/<str:ticket_id>/admin-transfer/', AdminTransferView.as_view(), name='admin-transfer-ticket'),
     path('tickets/<str:ticket_id>/feedback/', SubmitFeedbackView.as_view(), name='submit-feedback'),
-    path('reports/sla/', SLAReportView.as_view(), name='sla-report'),
-    path('users/', UsersView.as_view(), name='users'),
+    path('tickets/<str:ticket_id>/attachments/', TicketAttachmentsView.as_view(), name='ticket-attachments'),
+    path('tickets/<str:ticket_id>/attachments/<str:digest>/', ticket_attachment, name='ticket-attachment'),
+    path('reports/sla/', sla_report, name='sla-report'),
+    path('reports/satisfaction/', SatisfactionReportView.as_view(), name='satisfaction-report'),
+    path('reports/analytics/', AnalyticsReportView.as_view(), name='analytics-report'),
+    path('dashboard/summary/', dashboard_summary, name='dashboard-summary'),
+    path('users/', users, name='users'),
+    path('users/batch/', UserBatchView.as_view(), name='user-batch'),
+    path('users/search/', UserSearchView.as_view(), name='user-search'),
     path('users/<str:user_uid>/role/', UserRoleUpdateView.as_view(), name='user-role-update'),
     path('users/<str:user_uid>/status/', UserStatusUpdateView.as_view(), name='user-status-update'),
     path('users/<str:user_uid>/verify/', AgentVerificationView.as_view(), name='agent-verification'),
@@ -0,0 +1,85 @@
+"""
+Batched user lookups for HelpDesk API
+Resolves many users with a single db.get_all() call through a bounded LRU
+cache with TTL, returning a compact projection of each user
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from .firebase_config import db
+
+# Fields returned by the batch endpoint and cached per user
+USER_PROJECTION = ['username', 'custom_uid', 'name', 'role', 'verified', 'account_status']
+
+
+class UserResolver:
+    """
+    LRU + TTL cache in front of users/{uid}.
+    Missing users are cached as None so repeated misses don't hit Firestore.
+    """
+
+    def __init__(self, max_entries=5000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # uid -> (expires_at, projection or None)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, uids):
+        """Return {uid: projection or None} for the given uids"""
+        now = time.time()
+        found = {}
+        missing = []
+        with self.lock:
+            for uid in dict.fromkeys(uid for uid in uids if uid):
+                entry = self.entries.get(uid)
+                if entry and entry[0] > now:
+                    self.entries.move_to_end(uid)
+                    found[uid] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.append(uid)
+                    self.misses += 1
+
+        if missing:
+            refs = [db.collection('users').document(uid) for uid in missing]
+            fetched = {uid: None for uid in missing}
+            for doc in db.get_all(refs, field_paths=USER_PROJECTION):
+                if doc.exists:
+                    fetched[doc.id] = self.project(doc.id, doc.to_dict())
+            with self.lock:
+                expires_at = time.time() + self.ttl
+                for uid, projection in fetched.items():
+                    self.entries[uid] = (expires_at, projection)
+                    self.entries.move_to_end(uid)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            found.update(fetched)
+        return found
+
+    def get(self, uid):
+        """Single-user convenience wrapper around resolve()"""
+        if not uid:
+            return None
+        return self.resolve([uid]).get(uid)
+
+    def invalidate(self, uid):
+        with self.lock:
+            self.entries.pop(uid, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def project(uid, user_data):
+        projection = {field: user_data.get(field) for field in USER_PROJECTION}
+        projection['uid'] = uid
+        return projection
+
+
+# Shared resolver for this process
+user_resolver = UserResolver()
@@ -0,0 +1,290 @@
+"""
+In-process user search index
+Admin lookups by username, name, email or custom_uid are answered from
+memory instead of shipping the whole users collection to the browser. Every
+field is lower-cased into terms (the whole value plus its words); a sorted
+term list answers prefix queries with a binary search, and a trigram ->
+terms map finds words within a typo or two (trigram similarity, as in
+pg_trgm). The index is built from Firestore on first use, updated in place
+by the views that register users or change their role or status, and
+rebuilt in the background every USER_SEARCH_MAX_AGE seconds to pick up
+writes made by other workers.
+"""
+
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from .firebase_config import db
+from .single_flight import SingleFlight
+
+logger = logging.getLogger('helpdesk.user_search')
+
+MAX_AGE = int(os.getenv('USER_SEARCH_MAX_AGE', '300'))
+# Fields searched, and the fields returned for each match
+SEARCH_FIELDS = ('username', 'name', 'email', 'custom_uid')
+RESULT_FIELDS = SEARCH_FIELDS + ('role', 'account_status', 'verified', 'created_at')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_QUERY_LENGTH = 100
+# Terms looked at for one prefix; a one-letter query stops here instead of walking the whole directory
+MAX_PREFIX_TERMS = 5000
+# Minimum trigram similarity for a fuzzy match, and the shortest word matched fuzzily
+SIMILARITY = 0.3
+MIN_FUZZY_LENGTH = 3
+
+WORD = re.compile(r'[^\W_]+')
+
+
+def words(value):
+    return WORD.findall(value)
+
+
+def fuzzy(term):
+    """
+    Only plain words are matched fuzzily: whole emails share 'com' with
+    everyone, and U000123 is no near miss for U000124
+    """
+    return WORD.fullmatch(term) is not None and not any(c.isdigit() for c in term)
+
+
+def terms_of(record):
+    """Lower-cased terms a user is found by: each field whole, and its words"""
+    terms = set()
+    for field in SEARCH_FIELDS:
+        value = str(record.get(field) or '').casefold().strip()
+        if value:
+            terms.add(value)
+            terms.update(words(value))
+    return terms
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def project(uid, user_data):
+    record = {field: user_data.get(field) for field in RESULT_FIELDS}
+    created_at = record['created_at']
+    if hasattr(created_at, 'timestamp'):
+        record['created_at'] = int(created_at.timestamp())
+    record['uid'] = uid
+    return record
+
+
+class _Index:
+    """The index proper; not thread-safe, UserSearchIndex locks around it"""
+
+    def __init__(self):
+        self.records = {}
+        self.user_terms = {}
+        self.term_users = {}
+        self.sorted_terms = []
+        # Trigrams of the terms fuzzy() accepts
+        self.trigram_terms = {}
+
+    def add(self, uid, record, keep_sorted=True):
+        """keep_sorted=False for bulk loads, which call sort_terms() once at the end"""
+        self.remove(uid)
+        terms = terms_of(record)
+        self.records[uid] = record
+        self.user_terms[uid] = terms
+        for term in terms:
+            users = self.term_users.get(term)
+            if users is None:
+                users = self.term_users[term] = set()
+                if keep_sorted:
+                    bisect.insort(self.sorted_terms, term)
+                if fuzzy(term):
+                    for trigram in trigrams(term):
+                        self.trigram_terms.setdefault(trigram, set()).add(term)
+            users.add(uid)
+
+    def sort_terms(self):
+        self.sorted_terms = sorted(self.term_users)
+
+    def remove(self, uid):
+        self.records.pop(uid, None)
+        for term in self.user_terms.pop(uid, ()):
+            users = self.term_users[term]
+            users.discard(uid)
+            if users:
+                continue
+            del self.term_users[term]
+            del self.sorted_terms[bisect.bisect_left(self.sorted_terms, term)]
+            if fuzzy(term):
+                for trigram in trigrams(term):
+                    found = self.trigram_terms[trigram]
+                    found.discard(term)
+                    if not found:
+                        del self.trigram_terms[trigram]
+
+    def match(self, token):
+        """
+        {uid: score} for one query token: 1 exact, 0.6-0.9 prefix; only a
+        token that prefixes no term is matched fuzzily (scored below 0.6)
+        """
+        matched = []
+        start = bisect.bisect_left(self.sorted_terms, token)
+        for term in self.sorted_terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            matched.append((1.0 if term == token else 0.6 + 0.3 * len(token) / len(term), term))
+
+        if not matched and len(token) >= MIN_FUZZY_LENGTH and fuzzy(token):
+            wanted = trigrams(token)
+            shared = Counter()
+            for trigram in wanted:
+                shared.update(self.trigram_terms.get(trigram, ()))
+            # similarity <= common / len(wanted), so fewer shared trigrams can't reach the threshold
+            least = SIMILARITY * len(wanted)
+            for term, common in shared.items():
+                if common < least:
+                    continue
+                similarity = common / (len(wanted) + len(trigrams(term)) - common)
+                if similarity >= SIMILARITY:
+                    matched.append((0.6 * similarity, term))
+
+        # Lowest first, so a user's best-scoring term is written last
+        matched.sort()
+        scores = {}
+        for score, term in matched:
+            scores.update(dict.fromkeys(self.term_users[term], score))
+        return scores
+
+    def search(self, query, role=None, account_status=None, limit=DEFAULT_LIMIT):
+        """(number of users matching every token of query, the best `limit` as (score, record))"""
+        tokens = query.casefold().split()
+        combined = None
+        for token in tokens:
+            scores = self.match(token)
+            if combined is None:
+                combined = scores
+            else:
+                combined = {uid: combined[uid] + scores[uid] for uid in combined.keys() & scores.keys()}
+            if not combined:
+                return 0, []
+        records = self.records
+        if role or account_status:
+            combined = {uid: score for uid, score in combined.items()
+                        if (not role or records[uid].get('role') == role)
+                        and (not account_status or (records[uid].get('account_status') or 'active') == account_status)}
+        # Plain tuples rank in C: best score, then username, then uid (unique, so records are never compared)
+        best = heapq.nsmallest(limit, ((-score, records[uid].get('username') or '', uid) for uid, score in combined.items()))
+        return len(combined), [(-score / len(tokens), records[uid]) for score, _, uid in best]
+
+    def usernames(self, prefix):
+        start = bisect.bisect_left(self.sorted_terms, prefix)
+        taken = set()
+        for term in self.sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            for uid in self.term_users[term]:
+                username = self.records[uid].get('username')
+                if username and username.casefold() == term:
+                    taken.add(username)
+        return taken
+
+
+class UserSearchIndex:
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.index = None
+        self.built_at = 0
+        self.building = False
+        # Updates made while a rebuild is reading the collection, replayed onto the new index
+        self.pending = None
+        self.flight = SingleFlight('user_search_build')
+
+    def rebuild(self):
+        with self.lock:
+            self.building = True
+            self.pending = []
+        started = time.time()
+        index = _Index()
+        try:
+            for doc in db.collection('users').stream():
+                index.add(doc.id, project(doc.id, doc.to_dict()), keep_sorted=False)
+            index.sort_terms()
+        except Exception:
+            with self.lock:
+                self.building = False
+                self.pending = None
+            raise
+        with self.lock:
+            for uid, user_data in self.pending:
+                self._apply(index, uid, user_data)
+            self.index = index
+            self.built_at = started
+            self.building = False
+            self.pending = None
+        logger.info('User search index built', extra={'users': len(index.records),
+                                                        'duration_ms': round((time.time() - started) * 1000)})
+        return index
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self.rebuild()
+            except Exception:
+                logger.warning('User search index rebuild failed', exc_info=True)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def ready(self):
+        """The index, building it on first use and refreshing it (in the background) once stale"""
+        with self.lock:
+            index = self.index
+            stale = index is not None and not self.building and time.time() - self.built_at > self.max_age
+            if stale:
+                self.building = True
+        if index is None:
+            return self.flight.do('build', self.rebuild)
+        if stale:
+            self._refresh_in_background()
+        return index
+
+    def search(self, query, role=None, account_status=None, limit=DEFAULT_LIMIT):
+        """(total matches, the best `limit` records with their score)"""
+        index = self.ready()
+        with self.lock:
+            total, best = index.search(query, role, account_status, limit)
+        return total, [dict(record, score=round(score, 3)) for score, record in best]
+
+    @staticmethod
+    def _apply(index, uid, user_data):
+        if user_data is None:
+            index.remove(uid)
+            return
+        record = index.records.get(uid, {})
+        merged = project(uid, {field: user_data.get(field, record.get(field)) for field in RESULT_FIELDS})
+        index.add(uid, merged)
+
+    def update(self, uid, user_data):
+        """
+        Apply a committed write to users/{uid}: user_data holds the fields
+        written (others keep their indexed values), None for a deleted user
+        """
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((uid, user_data))
+            if self.index is not None:
+                self._apply(self.index, uid, user_data)
+
+    def taken_usernames(self, prefix):
+        """Usernames starting with prefix, or None while the index isn't built (never builds it)"""
+        with self.lock:
+            if self.index is None:
+                return None
+            return self.index.usernames(prefix.casefold())
+
+
+# Shared index for this process
+user_search = UserSearchIndex()
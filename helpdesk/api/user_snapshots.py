@@ -0,0 +1,73 @@
+"""
+Denormalized user display info for tickets
+Tickets carry small creator/assignee snapshots (username, custom_uid) so list
+views can render names without reading users/{uid} for every row
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from firebase_admin import firestore
+
+from .firebase_config import db
+
+logger = logging.getLogger('helpdesk.user_snapshots')
+
+# Firestore batches are limited to 500 writes
+BATCH_SIZE = 500
+
+
+def display_snapshot(user_data):
+    """Compact display info stored on tickets as created_by_display / assigned_to_display"""
+    if not user_data:
+        return None
+    return {
+        'username': user_data.get('username') or user_data.get('email', '').split('@')[0],
+        'custom_uid': user_data.get('custom_uid', '')
+    }
+
+
+def display_name(user_data, default='Unknown'):
+    """Name used in timeline comments, e.g. 'Automatically assigned to jdoe'"""
+    if not user_data:
+        return default
+    return user_data.get('username') or user_data.get('custom_uid') or user_data.get('email', '').split('@')[0] or default
+
+
+def fan_out_user_display(uid, snapshot):
+    """Rewrite the display snapshot on every ticket created by or assigned to uid"""
+    updated = 0
+    for field in ['created_by', 'assigned_to']:
+        batch = db.batch()
+        pending = 0
+        for doc in db.collection('tickets').where(field, '==', uid).stream():
+            # Bump version/updated_at so conditional GETs and delta sync see the new name
+            batch.update(doc.reference, {
+                f'{field}_display': snapshot, 'version': firestore.Increment(1), 'updated_at': datetime.now()
+            })
+            pending += 1
+            if pending == BATCH_SIZE:
+                batch.commit()
+                updated += pending
+                batch = db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+            updated += pending
+    return updated
+
+
+def schedule_display_fan_out(uid, user_data):
+    """Run fan_out_user_display off the request thread (username or role changed)"""
+    snapshot = display_snapshot(user_data)
+
+    def run():
+        try:
+            fan_out_user_display(uid, snapshot)
+        except Exception:
+            logger.exception('Display fan-out failed', extra={'target_uid': uid})
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -1,14 +1,48 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import exceptions, status
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from firebase_admin import auth, firestore
 from .firebase_config import db
+from .changefeed import FeedSubscriber, ticket_feed
+from .user_snapshots import display_snapshot, display_name, schedule_display_fan_out
+from .user_lookup import user_resolver
+from .user_search import user_search, DEFAULT_LIMIT as SEARCH_DEFAULT_LIMIT, MAX_LIMIT as SEARCH_MAX_LIMIT, MAX_QUERY_LENGTH
+from .counters import workload_delta, get_workloads, OPEN_STATUSES
+from .archive import load_ticket, ticket_archive
+from .attachments import (attachment_store, BlobUploadHandler, AttachmentTooLarge, RangeNotSatisfiable, clean_name,
+                          disposition, parse_range, DIGEST_PATTERN, MAX_ATTACHMENTS, MAX_ATTACHMENT_SIZE)
+from .etags import ticket_etag, etag_matches, ticket_version
+from .response_cache import response_cache
+from .single_flight import SingleFlight
+from .dashboard import get_summary
+from .outbox import record_event, workload_changes
+from .satisfaction import get_satisfaction, record_rating
+from .analytics import (run_report, SnapshotMissing, REPORTS as ANALYTICS_REPORTS, GROUPINGS as ANALYTICS_GROUPINGS,
+                        DEFAULT_WEEKS as ANALYTICS_DEFAULT_WEEKS, MAX_WEEKS as ANALYTICS_MAX_WEEKS)
+from .duplicates import band_keys, bands_update, find_duplicates, LINK_THRESHOLD
+from .models import Role, Ticket, User
+from .authentication import FirebaseUser, caller, claims_for, request_user, sync_claims
+from .work_queue import next_tickets, priority_rank, DEFAULT_LIMIT as QUEUE_DEFAULT_LIMIT, MAX_LIMIT as QUEUE_MAX_LIMIT
+from .changes import changes_since, record_reassignment, CursorError, CursorExpired, DEFAULT_LIMIT, MAX_LIMIT
+from .ticket_import import reserved_ticket_number
+from .export import iter_ticket_pages, csv_chunks, jsonl_chunks, gzip_chunks, parse_date
+from .firestore_guard import UNAVAILABLE_ERRORS
+import asyncio
 import json
+import logging
 import re
+import time
 from datetime import datetime, timedelta
 from rest_framework.pagination import PageNumberPagination
 
+logger = logging.getLogger('helpdesk.views')
+
+# How often a live ticket stream re-checks the caller's token expiry and account status (seconds)
+STREAM_AUTH_CHECK = 60
+
 class TicketPagination(PageNumberPagination):
     page_size = 10
 
@@ -29,6 +63,49 @@ def serialize_firestore_doc(doc_dict):
             serialized[key] = value
     return serialized
 
+def without_duplicate_links(ticket):
+    """
+    A serialized ticket as its creator sees it: duplicate links point at other
+    users' tickets, so only staff get them
+    """
+    ticket = {key: value for key, value in ticket.items() if key not in ('duplicate_of', 'possible_duplicates', 'dedupe_bands')}
+    if isinstance(ticket.get('timeline'), list):
+        ticket['timeline'] = [entry for entry in ticket['timeline']
+                              if not (isinstance(entry, dict) and entry.get('action') == 'linked_duplicate')]
+    return ticket
+
+def account_error(role, verified, account_status):
+    if account_status == 'blocked':
+        return {'code': 'ACCOUNT_BLOCKED', 'message': 'Your account has been blocked. Please contact an administrator.'}
+    if role in ['agent', 'admin'] and not verified:
+        return {
+            'code': 'VERIFICATION_REQUIRED',
+            'message': f'Your {role} account is pending verification. Please contact an administrator to verify your account.'
+        }
+    return None
+
+def access_denied(request, user_role, user_uid):
+    """403 for blocked accounts and unverified agents/admins, else None; token callers need no read"""
+    user = request.user
+    if isinstance(user, FirebaseUser):
+        error = account_error(user.role, user.verified, user.account_status)
+    else:
+        # Legacy query-param callers: check the user document
+        if not user_uid:
+            return None
+        try:
+            user_doc = db.collection('users').document(user_uid).get()
+        except Exception:
+            logger.warning('Verification check error', exc_info=True)
+            return None
+        if not user_doc.exists:
+            return None
+        user_data = user_doc.to_dict()
+        error = account_error(user_role, user_data.get('verified', True), user_data.get('account_status', 'active'))
+    if error:
+        return Response({'error': error}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
 def generate_uid(role):
     """Generate unique UID based on role: U+6digits, AG+5digits, AD+3digits"""
     prefix_map = {'user': 'U', 'agent': 'AG', 'admin': 'AD'}
@@ -65,19 +142,21 @@ def generate_username(name, email):
         base_username = email.split('@')[0]
         base_username = re.sub(r'[^a-zA-Z0-9]', '', base_username.lower())
     
-    # Check if username exists
+    # Check if username exists; names the search index already knows are taken skip the query
+    taken = user_search.taken_usernames(base_username) or set()
     username = base_username
     counter = 1
     
     while True:
-        existing = db.collection('users').where('username', '==', username).limit(1).stream()
-        exists = False
-        for _ in existing:
-            exists = True
-            break
-        
-        if not exists:
-            return username
+        if username not in taken:
+            existing = db.collection('users').where('username', '==', username).limit(1).stream()
+            exists = False
+            for _ in existing:
+                exists = True
+                break
+            
+            if not exists:
+                return username
         
         # Add 2-digit number
         username = f"{base_username}{str(counter).zfill(2)}"
@@ -95,7 +174,9 @@ def generate_ticket_id():
     """Generate unique ticket ID: T000000001 to T999999999"""
     # Get all tickets and find the highest ticket number
     tickets_ref = db.collection('tickets').stream()
-    last_num = 0
+    # Archived tickets are no longer in the collection and bulk imports reserve
+    # a block up front; never reuse either
+    last_num = max(ticket_archive.max_ticket_number(), reserved_ticket_number())
     
     for ticket_doc in tickets_ref:
         ticket_data = ticket_doc.to_dict()
@@ -118,30 +199,29 @@ class RegisterView(APIView):
         role = request.data.get('role', 'user')
         name = request.data.get('name', '')
         
-        print(f"Registration attempt - Email: {email}, Name: {name}, Role: {role}")
+        logger.info('Registration attempt', extra={'email': email, 'role': role})
         
         if not email or not password:
-            print("Error: Missing email or password")
+            logger.info('Registration rejected: missing email or password')
             return Response({'error': {'code': 'FIELD_REQUIRED', 'field': 'email', 'message': 'Email and password required'}}, status=status.HTTP_400_BAD_REQUEST)
         
         if not name or not name.strip():
-            print("Error: Missing name")
+            logger.info('Registration rejected: missing name')
             return Response({'error': {'code': 'FIELD_REQUIRED', 'field': 'name', 'message': 'Name is required'}}, status=status.HTTP_400_BAD_REQUEST)
         
         if role not in ['user', 'agent', 'admin']:
-            print(f"Error: Invalid role - {role}")
+            logger.info('Registration rejected: invalid role', extra={'role': role})
             return Response({'error': {'code': 'INVALID_ROLE', 'message': 'Role must be user, agent, or admin'}}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            print("Creating Firebase Auth user...")
             # Create Firebase Auth user
             user = auth.create_user(email=email, password=password)
-            print(f"Firebase user created: {user.uid}")
+            logger.debug('Firebase user created', extra={'new_uid': user.uid})
             
             # Generate UID and username
             custom_uid = generate_uid(role)
             username = generate_username(name, email)
-            print(f"Generated custom_uid: {custom_uid}, username: {username}")
+            logger.debug('Generated identifiers', extra={'custom_uid': custom_uid, 'username': username})
             
             # Check if this is the first admin (auto-verify first admin)
             is_verified = False
@@ -153,7 +233,7 @@ class RegisterView(APIView):
                     # This is the first admin - auto verify
                     is_verified = True
                     verified_at = datetime.now()
-                    print("First admin detected - auto-verifying")
+                    logger.info('First admin detected - auto-verifying', extra={'new_uid': user.uid})
             elif role == 'agent':
                 # Agents need manual verification
                 is_verified = False
@@ -177,8 +257,12 @@ class RegisterView(APIView):
                 if verified_at:
                     user_data['verified_at'] = verified_at
             
+            # Claims first: they authorize every later request
+            sync_claims(user.uid, user_data)
             db.collection('users').document(user.uid).set(user_data)
-            print(f"Firestore document created successfully (verified: {is_verified})")
+            user_resolver.invalidate(user.uid)
+            user_search.update(user.uid, user_data)
+            logger.info('User registered', extra={'new_uid': user.uid, 'role': role, 'verified': is_verified})
             
             return Response({
                 'uid': user.uid, 
@@ -191,17 +275,19 @@ class RegisterView(APIView):
             }, status=status.HTTP_201_CREATED)
             
         except auth.EmailAlreadyExistsError:
-            print(f"Error: Email already exists - {email}")
+            logger.info('Registration rejected: email exists', extra={'email': email})
             return Response({'error': {'code': 'EMAIL_EXISTS', 'message': 'Email already registered'}}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            print(f"Error during registration: {str(e)}")
+            logger.exception('Registration failed')
             # If Firestore fails but Auth succeeded, clean up Auth user
             try:
                 if 'user' in locals():
                     auth.delete_user(user.uid)
-                    print(f"Cleaned up Firebase user: {user.uid}")
+                    logger.warning('Cleaned up Firebase user after failed registration', extra={'new_uid': user.uid})
             except:
                 pass
+            if isinstance(e, UNAVAILABLE_ERRORS):
+                raise
             return Response({'error': {'code': 'AUTH_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
 class SetRoleView(APIView):
@@ -227,15 +313,20 @@ class SetRoleView(APIView):
                 custom_uid = generate_uid(role)
                 username = generate_username(name or email.split('@')[0], email)
             
-            db.collection('users').document(uid).set({
+            user_data = {
                 'email': email, 
                 'role': role,
                 'name': name or email.split('@')[0],
                 'custom_uid': custom_uid,
-                'username': username,
-                'active_tickets': 0,
-                'total_resolved': 0
-            }, merge=True)
+                'username': username
+            }
+            if not user_doc.exists:
+                # Counters start at 0 for new users only; an existing user's
+                # active_tickets is the workload baseline (api/counters.py)
+                user_data.update({'active_tickets': 0, 'total_resolved': 0})
+            db.collection('users').document(uid).set(user_data, merge=True)
+            user_resolver.invalidate(uid)
+            user_search.update(uid, user_data)
             
             return Response({
                 'uid': uid, 
@@ -243,6 +334,8 @@ class SetRoleView(APIView):
                 'custom_uid': custom_uid,
                 'username': username
             }, status=status.HTTP_200_OK)
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'AUTH_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -260,17 +353,27 @@ class LoginView(APIView):
                 role = user_data.get('role', 'user')
                 verified = user_data.get('verified', True)
                 
-                print(f"Login attempt - UID: {uid}, Role: {role}, Verified: {verified}")
+                logger.debug('Login attempt', extra={'role': role, 'verified': verified})
                 
                 # Block unverified agents/admins from logging in
                 if role in ['agent', 'admin'] and not verified:
-                    print(f"Blocking unverified {role} from login")
+                    logger.info('Blocked unverified login', extra={'role': role})
                     return Response({
                         'error': {
                             'code': 'VERIFICATION_PENDING',
                             'message': f'Your {role} account is pending verification. Please wait for an admin to verify your account before logging in.'
                         }
                     }, status=status.HTTP_403_FORBIDDEN)
+
+                if user_data.get('account_status') == 'blocked':
+                    return Response({'error': {'code': 'ACCOUNT_BLOCKED', 'message': 'Your account has been blocked. Please contact an administrator.'}}, status=status.HTTP_403_FORBIDDEN)
+
+                # Accounts created before claims existed (or changed out of band) get them now;
+                # the client refreshes its ID token to pick them up
+                claims = claims_for(user_data)
+                claims_updated = any(decoded_token.get(key) != value for key, value in claims.items())
+                if claims_updated:
+                    sync_claims(uid, user_data)
                 
                 return Response({
                     'uid': uid, 
@@ -278,10 +381,13 @@ class LoginView(APIView):
                     'username': user_data.get('username', ''),
                     'custom_uid': user_data.get('custom_uid', ''),
                     'name': user_data.get('name', ''),
-                    'verified': verified
+                    'verified': verified,
+                    'claims_updated': claims_updated
                 }, status=status.HTTP_200_OK)
             else:
                 return Response({'error': {'code': 'USER_NOT_FOUND', 'message': 'User not registered through the app'}}, status=status.HTTP_404_NOT_FOUND)
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'AUTH_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -289,46 +395,55 @@ class TicketListView(APIView):
     pagination_class = TicketPagination
 
     def get(self, request):
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', 'user1')
+        user_role, user_uid = caller(request, default_uid='user1')
         search = request.query_params.get('search', '')
         page = int(request.query_params.get('page', 1))
 
+        # Agent/admin lists are the same for everyone with that role - serve repeats from the response cache
+        cache_key = None
+        if user_role != 'user':
+            cache_key, cached = response_cache.lookup('ticket_list', user_role, {'search': search, 'page': page}, depends=['tickets'])
+            if cached is not None:
+                return Response(cached)
+
         query = db.collection('tickets')
         if user_role == 'user':
             query = query.where('created_by', '==', user_uid)
 
         tickets_ref = query.stream()
         tickets = []
+        needle = search.lower()
         for doc in tickets_ref:
-            ticket = doc.to_dict()
-            ticket['id'] = doc.id
+            data = doc.to_dict()
             if search:
-                if search.lower() not in ticket['title'].lower() and search.lower() not in ticket['description'].lower() and not any(search.lower() in entry.get('comment', '') for entry in ticket.get('timeline', [])):
+                if needle not in data['title'].lower() and needle not in data['description'].lower() and not any(needle in entry.get('comment', '') for entry in data.get('timeline', [])):
                     continue
-            # Serialize Firestore Timestamps
-            ticket = serialize_firestore_doc(ticket)
-            tickets.append(ticket)
+            # Matches are held as compact records until the page is cut
+            tickets.append(Ticket.from_dict(doc.id, data))
 
-        # Simple pagination
+        # Simple pagination; only the returned page is serialized
         start = (page - 1) * 10
         end = start + 10
-        paginated_tickets = tickets[start:end]
+        paginated_tickets = [ticket.to_json() for ticket in tickets[start:end]]
+        if user_role == 'user':
+            paginated_tickets = [without_duplicate_links(ticket) for ticket in paginated_tickets]
 
-        return Response({
+        data = {
             'results': paginated_tickets,
             'count': len(tickets),
             'next': page + 1 if end < len(tickets) else None,
             'previous': page - 1 if page > 1 else None
-        })
+        }
+        if cache_key:
+            response_cache.store(cache_key, data)
+        return Response(data)
 
     def post(self, request):
         title = request.data.get('title')
         description = request.data.get('description')
         priority = request.data.get('priority', 'Medium')
         category = request.data.get('category', 'General')
-        user_uid = request.query_params.get('uid', 'user1')
-        user_role = request.query_params.get('role', 'user')
+        user_role, user_uid = caller(request, default_uid='user1')
 
         if not title or not description:
             return Response({'error': {'code': 'FIELD_REQUIRED', 'field': 'title', 'message': 'Title and description required'}}, status=status.HTTP_400_BAD_REQUEST)
@@ -337,7 +452,10 @@ class TicketListView(APIView):
         if idempotency_key:
             existing = db.collection('tickets').where('idempotency_key', '==', idempotency_key).limit(1).stream()
             for doc in existing:
-                return Response(doc.to_dict(), status=status.HTTP_200_OK)
+                ticket = serialize_firestore_doc(dict(doc.to_dict(), id=doc.id))
+                if user_role == 'user':
+                    ticket = without_duplicate_links(ticket)
+                return Response(ticket, status=status.HTTP_200_OK)
 
         sla_hours = {'Low': 48, 'Medium': 24, 'High': 12, 'Critical': 4}[priority]
         sla_deadline = datetime.now() + timedelta(hours=sla_hours)
@@ -345,18 +463,37 @@ class TicketListView(APIView):
         # Generate unique ticket ID
         ticket_id = generate_ticket_id()
         
+        # Near-duplicates of an open ticket (e.g. during an outage) go to the
+        # agent already working on it instead of the next free one
+        bands = band_keys(title, description)
+        duplicates = find_duplicates(title, description, bands)
+        primary = duplicates[0] if duplicates and duplicates[0]['similarity'] >= LINK_THRESHOLD else None
+        agent = None
+        if primary and primary['assigned_to']:
+            agent = user_resolver.get(primary['assigned_to'])
+            if agent:
+                agent = dict(agent, uid=primary['assigned_to'])
+
         # Smart agent assignment algorithm
-        assigned_agent = self.assign_to_best_agent(priority)
+        if agent is None:
+            agent = self.assign_to_best_agent(priority)
+        assigned_agent = agent['uid'] if agent else None
+
+        # Creator display snapshot so list views need no user reads
+        creator_data = user_resolver.get(user_uid)
 
         ticket_data = {
             'ticket_id': ticket_id,
             'title': title,
             'description': description,
             'priority': priority,
+            'priority_rank': priority_rank(priority),
             'category': category,
             'status': 'Open',
             'assigned_to': assigned_agent,
+            'assigned_to_display': display_snapshot(agent),
             'created_by': user_uid,
+            'created_by_display': display_snapshot(creator_data),
             'created_at': datetime.now(),
             'updated_at': datetime.now(),
             'version': 1,
@@ -368,17 +505,24 @@ class TicketListView(APIView):
             'rating': None,
             'contact': None,
             'github': None,
-            'reopen_count': 0
+            'reopen_count': 0,
+            'dedupe_bands': bands,
+            'duplicate_of': primary['id'] if primary else None,
+            'possible_duplicates': [match['ticket_id'] for match in duplicates]
         }
         
+        if primary:
+            ticket_data['timeline'].append({
+                'action': 'linked_duplicate',
+                'timestamp': datetime.now(),
+                'user': user_uid,
+                'comment': f"Possible duplicate of {primary['ticket_id']}"
+            })
+
         # Add assignment to timeline
         if assigned_agent:
-            # Get agent username for display
-            agent_doc = db.collection('users').document(assigned_agent).get()
-            agent_name = 'Agent'
-            if agent_doc.exists:
-                agent_data = agent_doc.to_dict()
-                agent_name = agent_data.get('username') or agent_data.get('custom_uid') or agent_data.get('email', '').split('@')[0]
+            # Agent data comes from the assignment scan - no extra read
+            agent_name = display_name(agent, 'Agent')
             
             ticket_data['timeline'].append({
                 'action': 'auto_assigned',
@@ -386,19 +530,26 @@ class TicketListView(APIView):
                 'user': assigned_agent,
                 'comment': f'Automatically assigned to {agent_name}'
             })
-            # Update agent workload
-            agent_ref = db.collection('users').document(assigned_agent)
-            agent_ref.update({'active_tickets': firestore.Increment(1)})
         
-        doc_ref = db.collection('tickets').add(ticket_data)
-        ticket_data['id'] = doc_ref[1].id
+        # Create ticket with its outbox event; the worker bumps agent workload
+        doc_ref = db.collection('tickets').document()
+        batch = db.batch()
+        batch.set(doc_ref, ticket_data)
+        record_event(batch, 'ticket.created', ticket_id, {'workload': workload_changes((assigned_agent, 1))})
+        batch.commit()
+        ticket_data['id'] = doc_ref.id
         
         # Serialize before returning
         ticket_data = serialize_firestore_doc(ticket_data)
+        if user_role == 'user':
+            # Only the caller's own earlier tickets, not other users'
+            ticket_data = without_duplicate_links(ticket_data)
+            duplicates = [match for match in duplicates if match['created_by'] == user_uid]
+        ticket_data['possible_duplicates'] = duplicates
         return Response(ticket_data, status=status.HTTP_201_CREATED)
     
     def assign_to_best_agent(self, priority):
-        """Smart assignment: distribute based on workload"""
+        """Smart assignment: distribute based on workload, returns the agent's data (with uid) or None"""
         # Get all active and verified agents
         agents_ref = db.collection('users').where('role', '==', 'agent').stream()
         agents = []
@@ -412,46 +563,122 @@ class TicketListView(APIView):
         if not agents:
             return None  # No verified agents available
         
+        # Current workload from the sharded counters
+        workloads = get_workloads([agent['uid'] for agent in agents])
+        for agent in agents:
+            agent['active_tickets'] = workloads[agent['uid']]
+        
         if len(agents) == 1:
-            return agents[0]['uid']  # Only one agent, assign to them
+            return agents[0]  # Only one agent, assign to them
         
         # For Critical priority, assign to agent with least workload
         if priority == 'Critical':
             agents.sort(key=lambda x: x.get('active_tickets', 0))
-            return agents[0]['uid']
+            return agents[0]
         
         # For other priorities, round-robin based on workload
         agents.sort(key=lambda x: x.get('active_tickets', 0))
-        return agents[0]['uid']
+        return agents[0]
+
+class TicketQueueView(APIView):
+    """
+    Next tickets to work on: /api/tickets/queue/?limit=N
+    Open tickets by priority, then SLA deadline, then age. Agents get their
+    own queue; admins get everything open, or one agent's queue with ?agent=
+    """
+    def get(self, request):
+        user_role, user_uid = caller(request)
+
+        if user_role not in ['agent', 'admin']:
+            return Response({'error': {'code': 'FORBIDDEN', 'message': 'Agents and admins only'}}, status=status.HTTP_403_FORBIDDEN)
+
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', QUEUE_DEFAULT_LIMIT)), 1), QUEUE_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': {'code': 'INVALID_LIMIT', 'message': 'Limit must be a number'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        assignee = user_uid if user_role == 'agent' else request.query_params.get('agent') or None
+        tickets = []
+        for doc in next_tickets(assignee, limit):
+            ticket = doc.to_dict()
+            ticket['id'] = doc.id
+            tickets.append(serialize_firestore_doc(ticket))
+        return Response({'results': tickets, 'count': len(tickets)})
+
+class TicketChangesView(APIView):
+    """
+    Delta sync: /api/tickets/changes/?since=<cursor>
+    Returns tickets in the caller's scope updated after the cursor, tombstones
+    for tickets that left it, and the cursor for the next call. Omit `since`
+    for a full sync; keep calling while has_more is true.
+    """
+    def get(self, request):
+        user_role, user_uid = caller(request)
+
+        if not user_uid:
+            return Response({'error': {'code': 'FIELD_REQUIRED', 'field': 'uid', 'message': 'UID required'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return Response({'error': {'code': 'INVALID_LIMIT', 'message': 'Limit must be a number'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            docs, tombstones, cursor, has_more = changes_since(user_role, user_uid, request.query_params.get('since'), limit)
+        except CursorExpired as e:
+            return Response({'error': {'code': 'CURSOR_EXPIRED', 'message': str(e)}}, status=status.HTTP_410_GONE)
+        except CursorError as e:
+            return Response({'error': {'code': 'INVALID_CURSOR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
+
+        tickets = []
+        for doc in docs:
+            ticket = doc.to_dict()
+            ticket['id'] = doc.id
+            ticket = serialize_firestore_doc(ticket)
+            tickets.append(without_duplicate_links(ticket) if user_role == 'user' else ticket)
+
+        return Response({
+            'tickets': tickets,
+            'removed': [
+                {'id': tombstone['ticket_id'], 'reason': tombstone['reason'], 'removed_at': int(tombstone['removed_at'].timestamp())}
+                for tombstone in tombstones
+            ],
+            'cursor': cursor,
+            'has_more': has_more
+        })
 
 class TicketDetailView(APIView):
     def get(self, request, ticket_id):
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', 'user1')
+        user_role, user_uid = caller(request, default_uid='user1')
 
-        # Check if agent/admin is verified
-        if user_role in ['agent', 'admin']:
-            try:
-                user_ref = db.collection('users').document(user_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': f'Your {user_role} account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
-
-        doc = db.collection('tickets').document(ticket_id).get()
-        if not doc.exists:
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        # Conditional GET: an unchanged version is answered after reading only the version and owners
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            current = ticket_version(ticket_id)
+            if current is not None and etag_matches(if_none_match, ticket_etag(ticket_id, current[0])):
+                version, created_by, assigned_to = current
+                if (user_role != 'user' or created_by == user_uid) and (user_role != 'agent' or assigned_to == user_uid):
+                    return self.not_modified(ticket_id, version)
+
+        # Falls back to cold storage for long-closed tickets
+        ticket, archived = load_ticket(ticket_id)
+        if ticket is None:
             return Response({'error': {'code': 'NOT_FOUND', 'message': 'Ticket not found'}}, status=status.HTTP_404_NOT_FOUND)
 
-        ticket = doc.to_dict()
-        ticket['id'] = doc.id
+        ticket['id'] = ticket_id
+        ticket['archived'] = archived
 
         # Security: users can only view their own tickets, agents can only view assigned tickets
         if user_role == 'user' and ticket['created_by'] != user_uid:
@@ -460,39 +687,35 @@ class TicketDetailView(APIView):
         if user_role == 'agent' and ticket.get('assigned_to') != user_uid:
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'You can only view assigned tickets'}}, status=status.HTTP_403_FORBIDDEN)
 
+        etag = ticket_etag(ticket_id, ticket.get('version'))
+        if etag_matches(if_none_match, etag):
+            return self.not_modified(ticket_id, ticket.get('version'))
+
         # Serialize Firestore Timestamps
         ticket = serialize_firestore_doc(ticket)
-        return Response(ticket)
+        if user_role == 'user':
+            ticket = without_duplicate_links(ticket)
+        # no-cache: browsers may keep the body but must revalidate with If-None-Match
+        return Response(ticket, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+    @staticmethod
+    def not_modified(ticket_id, version):
+        return Response(status=status.HTTP_304_NOT_MODIFIED,
+                        headers={'ETag': ticket_etag(ticket_id, version), 'Cache-Control': 'private, no-cache'})
 
     def patch(self, request, ticket_id):
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', 'user1')
+        user_role, user_uid = caller(request, default_uid='user1')
         version = request.data.get('version')
 
-        # Check if agent/admin is verified
-        if user_role in ['agent', 'admin']:
-            try:
-                user_ref = db.collection('users').document(user_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': f'Your {user_role} account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
 
         doc_ref = db.collection('tickets').document(ticket_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        ticket, archived = load_ticket(ticket_id)
+        if ticket is None:
             return Response({'error': {'code': 'NOT_FOUND', 'message': 'Ticket not found'}}, status=status.HTTP_404_NOT_FOUND)
 
-        ticket = doc.to_dict()
-
         # Security validation: users can only update own tickets, agents can only update assigned tickets
         if user_role == 'user' and ticket['created_by'] != user_uid:
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Access denied'}}, status=status.HTTP_403_FORBIDDEN)
@@ -500,11 +723,18 @@ class TicketDetailView(APIView):
         if user_role == 'agent' and ticket.get('assigned_to') != user_uid:
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'You can only update assigned tickets'}}, status=status.HTTP_403_FORBIDDEN)
 
-        if version and int(version) != ticket['version']:
+        # Optimistic locking: If-Match carries the ETag from the last read;
+        # the body `version` field is still accepted from older clients
+        if_match = request.headers.get('If-Match')
+        if if_match:
+            if not etag_matches(if_match, ticket_etag(ticket_id, ticket['version'])):
+                return Response({'error': {'code': 'PRECONDITION_FAILED', 'message': 'Ticket was modified, reload and try again'}}, status=status.HTTP_412_PRECONDITION_FAILED)
+        elif version and int(version) != ticket['version']:
             return Response({'error': {'code': 'CONFLICT', 'message': 'Version mismatch'}}, status=status.HTTP_409_CONFLICT)
 
         updates = {}
-        timeline = ticket.get('timeline', [])
+        # Copy: the ticket restored from the archive must not carry this request's entries
+        timeline = list(ticket.get('timeline', []))
         
         # Workflow validation: only agents and admins can update status
         if 'status' in request.data:
@@ -512,11 +742,7 @@ class TicketDetailView(APIView):
             old_status = ticket.get('status')
             
             # Get username for display
-            user_doc = db.collection('users').document(user_uid).get()
-            username = 'Unknown'
-            if user_doc.exists:
-                userData = user_doc.to_dict()
-                username = userData.get('username', userData.get('email', 'Unknown').split('@')[0])
+            username = display_name(user_resolver.get(user_uid))
             
             # Allow users to reopen Closed tickets one time only
             if user_role == 'user' and old_status == 'Closed' and new_status == 'Open':
@@ -579,15 +805,12 @@ class TicketDetailView(APIView):
         # Only admin can reassign tickets
         if 'assigned_to' in request.data and user_role == 'admin':
             # Get username for display
-            user_doc = db.collection('users').document(user_uid).get()
-            username = 'Unknown'
-            if user_doc.exists:
-                userData = user_doc.to_dict()
-                username = userData.get('username', userData.get('email', 'Unknown').split('@')[0])
+            username = display_name(user_resolver.get(user_uid))
             
             old_agent = ticket.get('assigned_to')
             new_agent = request.data['assigned_to']
             updates['assigned_to'] = new_agent
+            updates['assigned_to_display'] = display_snapshot(user_resolver.get(new_agent))
             timeline.append({
                 'action': 'reassigned',
                 'timestamp': datetime.now(),
@@ -606,11 +829,7 @@ class TicketDetailView(APIView):
 
         if 'comment' in request.data:
             # Get username for display
-            user_doc = db.collection('users').document(user_uid).get()
-            username = 'Unknown'
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                username = user_data.get('username', user_data.get('email', 'Unknown').split('@')[0])
+            username = display_name(user_resolver.get(user_uid))
             
             new_entry = {
                 'action': 'commented', 
@@ -634,30 +853,55 @@ class TicketDetailView(APIView):
         if datetime.now() > ticket['sla_deadline'].replace(tzinfo=None):
             updates['status'] = 'Breached'
 
-        doc_ref.update(updates)
+        # Only open tickets stay in the duplicate-detection index
+        bands = bands_update(ticket, updates.get('status', ticket.get('status')))
+        if bands is not None:
+            updates['dedupe_bands'] = bands
+
+        # Updating an archived ticket (e.g. reopening it) brings it back to the
+        # hot collection; only now, once every check has passed
+        if archived:
+            ticket_archive.restore(ticket_id, ticket)
+
+        # Keep assignee workload in step with open/closed transitions and reassignment
+        batch = db.batch()
+        batch.update(doc_ref, updates)
+        old_status = ticket.get('status')
+        new_status = updates.get('status', old_status)
+        old_assignee = ticket.get('assigned_to')
+        new_assignee = updates.get('assigned_to', old_assignee)
+        if new_assignee != old_assignee:
+            record_reassignment(batch, ticket_id, old_assignee, new_assignee)
+            workload = workload_changes((old_assignee, -1 if old_status in OPEN_STATUSES else 0),
+                                        (new_assignee, 1 if new_status in OPEN_STATUSES else 0))
+        else:
+            workload = workload_changes((old_assignee, workload_delta(old_status, new_status)))
+        record_event(batch, 'ticket.updated', ticket_id, {'workload': workload, 'status': new_status})
+        batch.commit()
         updated_doc = doc_ref.get()
         updated_ticket = updated_doc.to_dict()
         updated_ticket['id'] = updated_doc.id
         
         # Serialize Firestore Timestamps
         updated_ticket = serialize_firestore_doc(updated_ticket)
-        return Response(updated_ticket)
+        etag = ticket_etag(ticket_id, updated_ticket['version'])
+        if user_role == 'user':
+            updated_ticket = without_duplicate_links(updated_ticket)
+        return Response(updated_ticket, headers={'ETag': etag})
     
     def delete(self, request, ticket_id):
         """Delete a comment/reply from timeline - only by the person who created it"""
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', '')
+        user_role, user_uid = caller(request)
         comment_index = request.data.get('comment_index')
         
         if comment_index is None:
             return Response({'error': {'code': 'MISSING_INDEX', 'message': 'Comment index required'}}, status=status.HTTP_400_BAD_REQUEST)
         
         doc_ref = db.collection('tickets').document(ticket_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        ticket, archived = load_ticket(ticket_id)
+        if ticket is None:
             return Response({'error': {'code': 'NOT_FOUND', 'message': 'Ticket not found'}}, status=status.HTTP_404_NOT_FOUND)
         
-        ticket = doc.to_dict()
         timeline = ticket.get('timeline', [])
         
         # Validate comment index
@@ -675,7 +919,8 @@ class TicketDetailView(APIView):
         if not is_comment_or_reply:
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Cannot delete system actions'}}, status=status.HTTP_403_FORBIDDEN)
         
-        # Remove the comment
+        # Remove the comment (from a copy: an archived ticket is restored as it was)
+        timeline = [dict(entry) for entry in timeline]
         del timeline[comment_index]
         
         # Update all reply_to indices that reference indices after the deleted one
@@ -683,131 +928,221 @@ class TicketDetailView(APIView):
             if 'reply_to' in entry and entry['reply_to'] > comment_index:
                 entry['reply_to'] -= 1
         
+        if archived:
+            ticket_archive.restore(ticket_id, ticket)
         doc_ref.update({
             'timeline': timeline,
-            'updated_at': datetime.now()
+            'updated_at': datetime.now(),
+            'version': firestore.Increment(1)
         })
         
         return Response({'message': 'Comment deleted successfully'})
 
-class SLAReportView(APIView):
+class TicketAttachmentsView(APIView):
+    """
+    Attach files to a ticket: multipart `file` fields, or a raw request body
+    named by ?name= (or X-File-Name). Bodies go straight into the blob store
+    in chunks; the ticket only gets references.
+    """
+    def post(self, request, ticket_id):
+        user_role, user_uid = caller(request, default_uid='user1')
+
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        # Refuse oversized bodies before reading them
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > MAX_ATTACHMENT_SIZE + 64 * 1024:
+            return Response({'error': {'code': 'ATTACHMENT_TOO_LARGE', 'message': f'Attachments are limited to {MAX_ATTACHMENT_SIZE} bytes'}}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        doc_ref = db.collection('tickets').document(ticket_id)
+        ticket, archived = load_ticket(ticket_id)
+        if ticket is None:
+            return Response({'error': {'code': 'NOT_FOUND', 'message': 'Ticket not found'}}, status=status.HTTP_404_NOT_FOUND)
+
+        # Same rule as updates: users attach to their own tickets, agents to assigned ones
+        if user_role == 'user' and ticket['created_by'] != user_uid:
+            return Response({'error': {'code': 'FORBIDDEN', 'message': 'Access denied'}}, status=status.HTTP_403_FORBIDDEN)
+
+        if user_role == 'agent' and ticket.get('assigned_to') != user_uid:
+            return Response({'error': {'code': 'FORBIDDEN', 'message': 'You can only update assigned tickets'}}, status=status.HTTP_403_FORBIDDEN)
+
+        existing = ticket.get('attachments', [])
+        if len(existing) >= MAX_ATTACHMENTS:
+            return Response({'error': {'code': 'TOO_MANY_ATTACHMENTS', 'message': f'A ticket can have at most {MAX_ATTACHMENTS} attachments'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            blobs = self.receive(request)
+        except AttachmentTooLarge as e:
+            return Response({'error': {'code': 'ATTACHMENT_TOO_LARGE', 'message': str(e)}}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if not blobs:
+            return Response({'error': {'code': 'MISSING_FILE', 'message': 'No file uploaded'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A file already on the ticket (same content and name) isn't referenced twice
+        attached = {(ref.get('sha256'), ref.get('name')) for ref in existing}
+        username = display_name(user_resolver.get(user_uid))
+        now = datetime.now()
+        refs, new_refs, entries = [], [], []
+        for blob in blobs:
+            ref = {
+                'sha256': blob.sha256,
+                'name': blob.name,
+                'size': blob.size,
+                'content_type': blob.content_type,
+                'uploaded_by': user_uid,
+                'uploaded_at': now,
+            }
+            refs.append(ref)
+            if (blob.sha256, blob.name) in attached:
+                continue
+            attached.add((blob.sha256, blob.name))
+            new_refs.append(ref)
+            entries.append({
+                'action': 'attached',
+                'timestamp': now,
+                'user': user_uid,
+                'username': username,
+                'comment': f'Attached {blob.name}',
+                'attachment': blob.sha256,
+            })
+        if len(existing) + len(new_refs) > MAX_ATTACHMENTS:
+            attachment_store.discard(blobs)
+            return Response({'error': {'code': 'TOO_MANY_ATTACHMENTS', 'message': f'A ticket can have at most {MAX_ATTACHMENTS} attachments'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        if new_refs:
+            if archived:
+                ticket_archive.restore(ticket_id, ticket)
+            # ArrayUnion/Increment so a concurrent comment or upload isn't overwritten
+            batch = db.batch()
+            batch.update(doc_ref, {
+                'attachments': firestore.ArrayUnion(new_refs),
+                'timeline': firestore.ArrayUnion(entries),
+                'updated_at': now,
+                'version': firestore.Increment(1)
+            })
+            for ref in new_refs:
+                record_event(batch, 'ticket.attached', ticket_id, {'sha256': ref['sha256'], 'name': ref['name'], 'size': ref['size']})
+            try:
+                batch.commit()
+            except Exception:
+                attachment_store.discard(blobs)
+                raise
+
+        return Response({
+            'attachments': [serialize_firestore_doc(ref) for ref in refs],
+            'added': len(new_refs)
+        }, status=status.HTTP_201_CREATED if new_refs else status.HTTP_200_OK)
+
+    @staticmethod
+    def receive(request):
+        """StoredBlobs for the request's files, written to the store as the body is read"""
+        if request.content_type.startswith('multipart/form-data'):
+            handler = BlobUploadHandler(request._request)
+            # Must be set before anything parses the body
+            request._request.upload_handlers = [handler]
+            files = request.FILES.getlist('file')
+            if handler.too_large:
+                # Files before the oversized one were already stored
+                attachment_store.discard(files)
+                raise AttachmentTooLarge(f'Attachments are limited to {MAX_ATTACHMENT_SIZE} bytes')
+            return files
+        name = request.query_params.get('name') or request.headers.get('X-File-Name')
+        if not name or request.stream is None:
+            return []
+        blob = attachment_store.write_stream(request.stream.read)
+        blob.name = clean_name(name)
+        blob.content_type = request.content_type.split(';')[0].strip() or 'application/octet-stream'
+        return [blob]
+
+class SatisfactionReportView(APIView):
+    """
+    Satisfaction (mean, variance, CSAT %, histogram) overall and per agent
+    and category, from the running aggregates. ?agent= / ?category= narrow
+    it to one aggregate; agents only see their own.
+    """
     def get(self, request):
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', '')
-        
+        user_role, user_uid = caller(request)
+
+        if user_role not in ['agent', 'admin']:
+            return Response({'error': {'code': 'FORBIDDEN', 'message': 'Agents and admins only'}}, status=status.HTTP_403_FORBIDDEN)
+
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        agent = request.query_params.get('agent')
+        category = request.query_params.get('category')
+        if user_role == 'agent':
+            if agent and agent != user_uid:
+                return Response({'error': {'code': 'FORBIDDEN', 'message': 'Agents can only view their own satisfaction'}}, status=status.HTTP_403_FORBIDDEN)
+            agent = user_uid
+            category = None
+
+        return Response(get_satisfaction(agent=agent, category=category))
+
+class AnalyticsReportView(APIView):
+    """
+    Admin analytics over the latest columnar snapshot (api/analytics.py):
+    ?report=resolution|sla|throughput, optional from/to (created_at,
+    YYYY-MM-DD), by=status|priority|category|agent and weeks (throughput)
+    """
+    def get(self, request):
+        user_role, user_uid = caller(request)
+
         if user_role != 'admin':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
 
-        # Check if admin is verified
-        if user_role == 'admin' and user_uid:
-            try:
-                user_ref = db.collection('users').document(user_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': 'Your admin account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
-
-        # Get all tickets and check SLA breach dynamically
-        tickets_ref = db.collection('tickets').stream()
-        breached = []
-        for doc in tickets_ref:
-            ticket = doc.to_dict()
-            ticket['id'] = doc.id
-            
-            # Check if ticket has breached SLA (only for open/in-progress tickets)
-            if ticket.get('status') in ['Open', 'In Progress', 'Escalated'] and 'sla_deadline' in ticket:
-                try:
-                    if datetime.now() > ticket['sla_deadline'].replace(tzinfo=None):
-                        ticket['sla_breached'] = True
-                        breached.append(ticket)
-                except (AttributeError, TypeError):
-                    # Handle timezone issues gracefully
-                    pass
-            # Also include tickets that are already marked as Breached
-            elif ticket.get('status') == 'Breached':
-                ticket['sla_breached'] = True
-                breached.append(ticket)
-
-        return Response({'breached_tickets': breached, 'count': len(breached)})
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        report = request.query_params.get('report', 'resolution')
+        if report not in ANALYTICS_REPORTS:
+            return Response({'error': {'code': 'INVALID_REPORT', 'message': f'Report must be one of {", ".join(ANALYTICS_REPORTS)}'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        by = request.query_params.get('by') or ('category' if report == 'sla' else None)
+        if by is not None and by not in ANALYTICS_GROUPINGS:
+            return Response({'error': {'code': 'INVALID_GROUPING', 'message': f'Group by one of {", ".join(ANALYTICS_GROUPINGS)}'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            date_from = parse_date(request.query_params.get('from'))
+            date_to = parse_date(request.query_params.get('to'), end=True)
+            weeks = min(max(int(request.query_params.get('weeks', ANALYTICS_DEFAULT_WEEKS)), 1), ANALYTICS_MAX_WEEKS)
+        except ValueError:
+            return Response({'error': {'code': 'INVALID_PARAMS', 'message': 'Dates must be YYYY-MM-DD and weeks a number'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            data = run_report(report, date_from, date_to, by=by, weeks=weeks)
+        except SnapshotMissing as e:
+            return Response({'error': {'code': 'SNAPSHOT_MISSING', 'message': str(e)}}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
 
 class UsersView(APIView):
-    def get(self, request):
-        user_role = request.query_params.get('user_role', 'user')
-        user_uid = request.query_params.get('uid', '')
-        filter_role = request.query_params.get('role', None)
-        
-        # Allow agents to fetch agent list only (for filtering), admins can fetch all
-        if user_role == 'agent':
-            # Agents can only fetch agent list
-            if filter_role != 'agent':
-                return Response({'error': {'code': 'FORBIDDEN', 'message': 'Agents can only fetch agent list'}}, status=status.HTTP_403_FORBIDDEN)
-            
-            # Check if agent is verified
-            try:
-                user_ref = db.collection('users').document(user_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    verified = user_data.get('verified', True)  # Default True for backward compatibility
-                    print(f"Agent {user_uid} verified status: {verified}")
-                    if not verified:
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': 'Your agent account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-                else:
-                    print(f"Agent {user_uid} not found in database")
-            except Exception as e:
-                print(f"Verification check error: {e}")
-        elif user_role == 'admin':
-            # Check if admin is verified
-            if user_uid:
-                try:
-                    user_ref = db.collection('users').document(user_uid)
-                    user_doc = user_ref.get()
-                    if user_doc.exists:
-                        user_data = user_doc.to_dict()
-                        if not user_data.get('verified', True):
-                            return Response({
-                                'error': {
-                                    'code': 'VERIFICATION_REQUIRED',
-                                    'message': 'Your admin account is pending verification. Please contact an administrator to verify your account.'
-                                }
-                            }, status=status.HTTP_403_FORBIDDEN)
-                except Exception as e:
-                    print(f"Verification check error: {e}")
-        else:
-            # Regular users can't access this endpoint
-            return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin or agent only'}}, status=status.HTTP_403_FORBIDDEN)
+    """POST creates a user; GET /api/users/ is served by users() below"""
 
+    @staticmethod
+    def list_users(cache_key, filter_role):
         # Apply role filter if specified
         if filter_role and filter_role in ['user', 'agent', 'admin']:
             users_ref = db.collection('users').where('role', '==', filter_role).stream()
         else:
             users_ref = db.collection('users').stream()
             
-        users = []
-        for doc in users_ref:
-            user = doc.to_dict()
-            user['uid'] = doc.id
-            users.append(user)
+        users = [User.from_snapshot(doc).to_json() for doc in users_ref]
 
-        return Response({'users': users})
+        data = {'users': users}
+        response_cache.store(cache_key, data)
+        return data
     
     def post(self, request):
-        user_role = request.query_params.get('role', 'user')
+        user_role, user_uid = caller(request)
         if user_role != 'admin':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
+
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
         
         email = request.data.get('email')
         role = request.data.get('role', 'user')
@@ -831,7 +1166,7 @@ class UsersView(APIView):
                 # First admin is auto-verified, rest need verification
                 verified = (role == 'admin' and admin_count == 0)
             
-            db.collection('users').document(user.uid).set({
+            user_data = {
                 'email': email, 
                 'role': role,
                 'name': name,
@@ -840,7 +1175,11 @@ class UsersView(APIView):
                 'active_tickets': 0,
                 'total_resolved': 0,
                 'verified': verified
-            })
+            }
+            sync_claims(user.uid, user_data)
+            db.collection('users').document(user.uid).set(user_data)
+            user_resolver.invalidate(user.uid)
+            user_search.update(user.uid, user_data)
             return Response({
                 'uid': user.uid, 
                 'email': email, 
@@ -849,35 +1188,83 @@ class UsersView(APIView):
                 'username': username,
                 'verified': verified
             }, status=status.HTTP_201_CREATED)
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'CREATE_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
+class UserBatchView(APIView):
+    """
+    Resolve many users in one request: /api/users/batch/?uids=a,b,c
+    Regular users can resolve themselves and staff (the agents and admins on
+    their tickets); other users come back as None, like unknown uids.
+    """
+    MAX_UIDS = 300
+
+    def get(self, request):
+        user_role, user_uid = caller(request)
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        uids = [uid.strip() for uid in request.query_params.get('uids', '').split(',') if uid.strip()]
+        
+        if not uids:
+            return Response({'error': {'code': 'FIELD_REQUIRED', 'field': 'uids', 'message': 'At least one uid required'}}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(uids) > self.MAX_UIDS:
+            return Response({'error': {'code': 'TOO_MANY_UIDS', 'message': f'At most {self.MAX_UIDS} uids per request'}}, status=status.HTTP_400_BAD_REQUEST)
+        
+        users = {uid: User.from_dict(uid, data) if data else None for uid, data in user_resolver.resolve(uids).items()}
+        if user_role not in [Role.AGENT, Role.ADMIN]:
+            users = {uid: user if user and (uid == user_uid or user.role in [Role.AGENT, Role.ADMIN]) else None
+                     for uid, user in users.items()}
+        return Response({'users': {uid: user.to_json() if user else None for uid, user in users.items()}})
+
+class UserSearchView(APIView):
+    """Admin user lookup by username, name, email or custom_uid prefix (or a near miss): /api/users/search/?q="""
+    def get(self, request):
+        user_role, user_uid = caller(request, role_param='user_role')
+        if user_role != 'admin':
+            return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
+
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
+
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': {'code': 'FIELD_REQUIRED', 'field': 'q', 'message': 'Search query required'}}, status=status.HTTP_400_BAD_REQUEST)
+        if len(query) > MAX_QUERY_LENGTH:
+            return Response({'error': {'code': 'QUERY_TOO_LONG', 'message': f'Search queries are limited to {MAX_QUERY_LENGTH} characters'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        role_filter = request.query_params.get('role') or None
+        if role_filter and role_filter not in ['user', 'agent', 'admin']:
+            return Response({'error': {'code': 'INVALID_ROLE', 'message': 'Role must be user, agent, or admin'}}, status=status.HTTP_400_BAD_REQUEST)
+        status_filter = request.query_params.get('status') or None
+        if status_filter and status_filter not in ['active', 'blocked']:
+            return Response({'error': {'code': 'INVALID_STATUS', 'message': 'Invalid status'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT)), 1), SEARCH_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': {'code': 'INVALID_LIMIT', 'message': 'Limit must be a number'}}, status=status.HTTP_400_BAD_REQUEST)
+
+        total, users = user_search.search(query, role_filter, status_filter, limit)
+        return Response({'query': query, 'users': users, 'count': total})
+
 class TransferTicketView(APIView):
     """Transfer ticket from agent to admin when agent can't solve it"""
     def post(self, request, ticket_id):
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', 'user1')
+        user_role, user_uid = caller(request, default_uid='user1')
         reason = request.data.get('reason', 'Escalation required')
         
         if user_role != 'agent':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Only agents can transfer tickets'}}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if agent is verified
-        if user_role == 'agent':
-            try:
-                user_ref = db.collection('users').document(user_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': 'Your agent account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
         
         doc_ref = db.collection('tickets').document(ticket_id)
         doc = doc_ref.get()
@@ -900,7 +1287,8 @@ class TransferTicketView(APIView):
             return Response({'error': {'code': 'NO_ADMIN', 'message': 'No verified admin available'}}, status=status.HTTP_400_BAD_REQUEST)
         
         # Assign to admin with least workload
-        admins.sort(key=lambda x: x.get('active_tickets', 0))
+        workloads = get_workloads([admin['uid'] for admin in admins])
+        admins.sort(key=lambda x: workloads[x['uid']])
         target_admin = admins[0]['uid']
         
         # Update transfer history
@@ -923,38 +1311,40 @@ class TransferTicketView(APIView):
             'comment': f'Transferred to admin: {reason}'
         })
         
-        # Update workload counters
-        db.collection('users').document(user_uid).update({'active_tickets': firestore.Increment(-1)})
-        db.collection('users').document(target_admin).update({'active_tickets': firestore.Increment(1)})
-        
-        # Update ticket
-        doc_ref.update({
+        # Update ticket and workload counters in one batch
+        batch = db.batch()
+        batch.update(doc_ref, {
             'assigned_to': target_admin,
+            'assigned_to_display': display_snapshot(admins[0]),
             'transfer_history': transfer_history,
             'timeline': timeline,
             'status': 'Escalated',
-            'updated_at': datetime.now()
+            'updated_at': datetime.now(),
+            'version': firestore.Increment(1)
         })
+        record_reassignment(batch, ticket_id, ticket.get('assigned_to'), target_admin)
+        record_event(batch, 'ticket.transferred', ticket_id, {'workload': workload_changes(
+            (ticket.get('assigned_to'), -1 if ticket.get('status') in OPEN_STATUSES else 0), (target_admin, 1))})
+        batch.commit()
         
         return Response({'message': 'Ticket transferred to admin', 'assigned_to': target_admin})
 
 class SubmitFeedbackView(APIView):
     """User submits feedback after ticket resolution"""
     def post(self, request, ticket_id):
-        user_uid = request.query_params.get('uid', 'user1')
+        _, user_uid = caller(request, default_uid='user1')
         rating = request.data.get('rating')  # 1-5 stars
         feedback_text = request.data.get('feedback', '')
         
-        if not rating or rating < 1 or rating > 5:
+        # Whole stars only: the rating goes into the satisfaction histogram
+        if isinstance(rating, bool) or not isinstance(rating, int) or rating < 1 or rating > 5:
             return Response({'error': {'code': 'INVALID_RATING', 'message': 'Rating must be 1-5'}}, status=status.HTTP_400_BAD_REQUEST)
         
         doc_ref = db.collection('tickets').document(ticket_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        ticket, archived = load_ticket(ticket_id)
+        if ticket is None:
             return Response({'error': {'code': 'NOT_FOUND', 'message': 'Ticket not found'}}, status=status.HTTP_404_NOT_FOUND)
         
-        ticket = doc.to_dict()
-        
         # Only ticket creator can submit feedback
         if ticket['created_by'] != user_uid:
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Only ticket creator can submit feedback'}}, status=status.HTTP_403_FORBIDDEN)
@@ -963,48 +1353,39 @@ class SubmitFeedbackView(APIView):
         if ticket['status'] not in ['Resolved', 'Closed']:
             return Response({'error': {'code': 'INVALID_STATUS', 'message': 'Ticket must be resolved or closed'}}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Update ticket - NO timeline entry for feedback
-        doc_ref.update({
+        if archived:
+            ticket_archive.restore(ticket_id, ticket)
+
+        # Update ticket - NO timeline entry for feedback; the worker updates
+        # the assignee's stats (workload was already released when the ticket was resolved)
+        batch = db.batch()
+        batch.update(doc_ref, {
             'rating': rating,
             'feedback': feedback_text,
-            'feedback_submitted_at': datetime.now()
+            'feedback_submitted_at': datetime.now(),
+            'updated_at': datetime.now(),
+            'version': firestore.Increment(1)
         })
-        
-        # Update agent/admin stats
-        if ticket.get('assigned_to'):
-            assignee_ref = db.collection('users').document(ticket['assigned_to'])
-            assignee_ref.update({
-                'total_resolved': firestore.Increment(1),
-                'active_tickets': firestore.Increment(-1)
-            })
+        # Satisfaction aggregates commit with the rating, replacing an earlier one
+        record_rating(batch, ticket, rating, ticket.get('rating'))
+        # Only the first rating counts the ticket towards the assignee's resolved total
+        record_event(batch, 'ticket.feedback', ticket_id, {'assigned_to': ticket.get('assigned_to'), 'rating': rating,
+                                                           'first_rating': ticket.get('rating') is None})
+        batch.commit()
         
         return Response({'message': 'Feedback submitted successfully'})
 
 class UserRoleUpdateView(APIView):
     """Admin can update user roles"""
     def patch(self, request, user_uid):
-        admin_role = request.query_params.get('role', 'user')
-        admin_uid = request.query_params.get('uid', '')
+        admin_role, admin_uid = caller(request)
         
         if admin_role != 'admin':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if admin is verified
-        if admin_role == 'admin' and admin_uid:
-            try:
-                user_ref = db.collection('users').document(admin_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': 'Your admin account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
+        denied = access_denied(request, admin_role, admin_uid)
+        if denied:
+            return denied
         
         new_role = request.data.get('role')
         if new_role not in ['user', 'agent', 'admin']:
@@ -1023,12 +1404,21 @@ class UserRoleUpdateView(APIView):
             # Update role and regenerate custom_uid based on new role
             new_custom_uid = generate_uid(new_role)
             
+            # Claims first; a role change revokes the user's sessions so the old role can't be renewed
+            sync_claims(user_uid, dict(user_data, role=new_role), revoke=new_role != old_role)
             user_ref.update({
                 'role': new_role,
                 'custom_uid': new_custom_uid,
                 'updated_at': datetime.now()
             })
             
+            user_resolver.invalidate(user_uid)
+            user_search.update(user_uid, {'role': new_role, 'custom_uid': new_custom_uid})
+            
+            # custom_uid changed - refresh display snapshots on this user's tickets in the background
+            user_data['custom_uid'] = new_custom_uid
+            schedule_display_fan_out(user_uid, user_data)
+            
             return Response({
                 'message': 'User role updated successfully',
                 'uid': user_uid,
@@ -1036,34 +1426,22 @@ class UserRoleUpdateView(APIView):
                 'new_role': new_role,
                 'custom_uid': new_custom_uid
             })
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'UPDATE_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
 class UserStatusUpdateView(APIView):
     """Admin can block/activate user accounts"""
     def patch(self, request, user_uid):
-        admin_role = request.query_params.get('role', 'user')
-        admin_uid = request.query_params.get('uid', '')
+        admin_role, admin_uid = caller(request)
         
         if admin_role != 'admin':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if admin is verified
-        if admin_role == 'admin' and admin_uid:
-            try:
-                user_ref = db.collection('users').document(admin_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': 'Your admin account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
+        denied = access_denied(request, admin_role, admin_uid)
+        if denied:
+            return denied
         
         new_status = request.data.get('status')
         if new_status not in ['active', 'blocked']:
@@ -1076,26 +1454,35 @@ class UserStatusUpdateView(APIView):
             if not user_doc.exists:
                 return Response({'error': {'code': 'NOT_FOUND', 'message': 'User not found'}}, status=status.HTTP_404_NOT_FOUND)
             
+            sync_claims(user_uid, dict(user_doc.to_dict(), account_status=new_status), revoke=new_status == 'blocked')
             user_ref.update({
                 'account_status': new_status,
                 'updated_at': datetime.now()
             })
+            user_resolver.invalidate(user_uid)
+            user_search.update(user_uid, {'account_status': new_status})
             
             return Response({
                 'message': f'User account {new_status}',
                 'uid': user_uid,
                 'status': new_status
             })
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'UPDATE_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
 class AgentVerificationView(APIView):
     """Admin can verify agents and other admins"""
     def patch(self, request, user_uid):
-        admin_role = request.query_params.get('role', 'user')
+        admin_role, admin_uid = caller(request)
         
         if admin_role != 'admin':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
+
+        denied = access_denied(request, admin_role, admin_uid)
+        if denied:
+            return denied
         
         try:
             user_ref = db.collection('users').document(user_uid)
@@ -1111,47 +1498,38 @@ class AgentVerificationView(APIView):
             if user_role not in ['agent', 'admin']:
                 return Response({'error': {'code': 'INVALID_ROLE', 'message': 'User must be an agent or admin'}}, status=status.HTTP_400_BAD_REQUEST)
             
+            sync_claims(user_uid, dict(user_data, verified=True))
             user_ref.update({
                 'verified': True,
                 'verified_at': datetime.now(),
                 'updated_at': datetime.now()
             })
+            user_resolver.invalidate(user_uid)
+            user_search.update(user_uid, {'verified': True})
             
             return Response({
                 'message': f'{user_role.capitalize()} verified successfully',
                 'uid': user_uid,
                 'role': user_role
             })
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'UPDATE_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
 class AdminTransferView(APIView):
     """Admin can transfer tickets to specific agents (bidirectional transfer)"""
     def post(self, request, ticket_id):
-        user_role = request.query_params.get('role', 'user')
-        user_uid = request.query_params.get('uid', '')
+        user_role, user_uid = caller(request)
         target_uid = request.data.get('target_uid')
         reason = request.data.get('reason', 'Admin reassignment')
         
         if user_role != 'admin':
             return Response({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check if admin is verified
-        if user_role == 'admin' and user_uid:
-            try:
-                user_ref = db.collection('users').document(user_uid)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    if not user_data.get('verified', True):
-                        return Response({
-                            'error': {
-                                'code': 'VERIFICATION_REQUIRED',
-                                'message': 'Your admin account is pending verification. Please contact an administrator to verify your account.'
-                            }
-                        }, status=status.HTTP_403_FORBIDDEN)
-            except Exception as e:
-                print(f"Verification check error: {e}")
+        denied = access_denied(request, user_role, user_uid)
+        if denied:
+            return denied
         
         if not target_uid:
             return Response({'error': {'code': 'MISSING_TARGET', 'message': 'Target user UID required'}}, status=status.HTTP_400_BAD_REQUEST)
@@ -1177,9 +1555,7 @@ class AdminTransferView(APIView):
             target_username = target_user.get('username', 'Unknown')
             
             # Get admin username
-            admin_ref = db.collection('users').document(user_uid)
-            admin_doc = admin_ref.get()
-            admin_username = admin_doc.to_dict().get('username', 'Admin') if admin_doc.exists else 'Admin'
+            admin_username = display_name(user_resolver.get(user_uid), 'Admin')
             
             # Update transfer history
             transfer_history = ticket.get('transfer_history', [])
@@ -1202,31 +1578,376 @@ class AdminTransferView(APIView):
                 'comment': f'Transferred to {target_username} ({target_role}): {reason}'
             })
             
-            # Update workload counters (only if old assignee exists)
-            if old_assignee:
-                db.collection('users').document(old_assignee).update({
-                    'active_tickets': firestore.Increment(-1)
-                })
-            
-            db.collection('users').document(target_uid).update({
-                'active_tickets': firestore.Increment(1)
-            })
-            
-            # Update ticket
-            doc_ref.update({
+            # Update ticket and workload counters in one batch
+            batch = db.batch()
+            batch.update(doc_ref, {
                 'assigned_to': target_uid,
+                'assigned_to_display': display_snapshot(target_user),
                 'transfer_history': transfer_history,
                 'timeline': timeline,
                 'status': 'In Progress',
-                'updated_at': datetime.now()
+                'updated_at': datetime.now(),
+                'version': firestore.Increment(1)
             })
+            record_reassignment(batch, ticket_id, old_assignee, target_uid)
+            record_event(batch, 'ticket.transferred', ticket_id, {'workload': workload_changes(
+                (old_assignee, -1 if ticket.get('status') in OPEN_STATUSES else 0), (target_uid, 1))})
+            batch.commit()
             
             return Response({
                 'message': f'Ticket transferred to {target_username}',
                 'assigned_to': target_uid,
                 'target_role': target_role
             })
+        except UNAVAILABLE_ERRORS:
+            raise
         except Exception as e:
             return Response({'error': {'code': 'TRANSFER_ERROR', 'message': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
 
 
+async def plain_caller(request, role_param='role'):
+    """
+    (role, uid, error response) for the plain Django views: DRF authentication
+    doesn't run there, so the token comes from the header or ?token=
+    """
+    try:
+        user = await sync_to_async(request_user)(request)
+        user_role, user_uid = caller(request, role_param=role_param, user=user)
+    except (exceptions.AuthenticationFailed, exceptions.NotAuthenticated) as e:
+        return None, None, JsonResponse({'error': {'code': e.default_code.upper(), 'message': str(e.detail)}}, status=401)
+    except exceptions.PermissionDenied as e:
+        return None, None, JsonResponse({'error': {'code': e.default_code.upper(), 'message': str(e.detail)}}, status=403)
+
+    if user is not None:
+        request.user = user
+        error = account_error(user.role, user.verified, user.account_status)
+    elif user_uid and user_role in ['agent', 'admin']:
+        # Legacy query-param callers: check the user document
+        user_doc = await sync_to_async(db.collection('users').document(user_uid).get)()
+        user_data = user_doc.to_dict() if user_doc.exists else {}
+        error = account_error(user_role, user_data.get('verified', True), user_data.get('account_status', 'active'))
+    else:
+        error = None
+    if error:
+        return None, None, JsonResponse({'error': error}, status=403)
+    return user_role, user_uid, None
+
+
+async def ticket_stream(request):
+    """
+    Server-Sent Events feed of ticket changes for the Dashboard.
+    Sends one 'snapshot' event with a page of the caller's tickets (role
+    scoping and every Dashboard filter applied on the server), then 'change'
+    events (added/modified/removed) for that page. The stream ends with
+    'expired' when the caller's ID token runs out and 'denied' once the
+    account is blocked; the client reconnects with a fresh token.
+    """
+    user_role, user_uid, denied = await plain_caller(request)
+    if denied:
+        return denied
+
+    if not user_uid:
+        return JsonResponse({'error': {'code': 'FIELD_REQUIRED', 'field': 'uid', 'message': 'UID required'}}, status=400)
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return JsonResponse({'error': {'code': 'INVALID_PAGE', 'message': 'Page must be a number'}}, status=400)
+    try:
+        date_from = parse_date(request.GET.get('from'))
+        date_to = parse_date(request.GET.get('to'), end=True)
+    except ValueError:
+        return JsonResponse({'error': {'code': 'INVALID_DATE', 'message': 'Dates must be YYYY-MM-DD'}}, status=400)
+
+    filters = {key: request.GET.get(key, '') for key in ['assigned', 'search', 'status', 'priority', 'category', 'agent', 'sla']}
+    filters.update({'from': date_from, 'to': date_to})
+    subscriber = FeedSubscriber(asyncio.get_running_loop(), user_role, user_uid, filters, page=page)
+    total, initial = await sync_to_async(ticket_feed.subscribe)(subscriber)
+    user = getattr(request, 'user', None)
+    expires_at = user.expires_at if isinstance(user, FirebaseUser) else None
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    def to_json(ticket):
+        data = ticket.to_json()
+        return without_duplicate_links(data) if user_role == 'user' else data
+
+    async def still_allowed():
+        """None while the caller may keep the stream, else the event that ends it"""
+        if expires_at and time.time() >= expires_at:
+            return sse('expired', {})
+        user_data = await sync_to_async(user_resolver.get)(user_uid) or {}
+        error = account_error(user_role, user_data.get('verified', True), user_data.get('account_status', 'active'))
+        return sse('denied', error) if error else None
+
+    async def event_stream():
+        try:
+            yield 'retry: 5000\n\n'
+            yield sse('snapshot', {'tickets': [to_json(ticket) for ticket in initial], 'count': total,
+                                   'page': page, 'page_size': subscriber.page_size})
+            next_check = time.time() + STREAM_AUTH_CHECK
+            while True:
+                if time.time() >= next_check:
+                    ended = await still_allowed()
+                    if ended:
+                        yield ended
+                        break
+                    next_check = time.time() + STREAM_AUTH_CHECK
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive comment so proxies don't close idle connections
+                    yield ': keep-alive\n\n'
+                    continue
+                if 'ticket' in event:
+                    event = dict(event, ticket=to_json(event['ticket']))
+                yield sse('change', event)
+                if subscriber.overflowed and subscriber.queue.empty():
+                    # Client fell too far behind - ask it to reconnect for a fresh snapshot
+                    yield sse('resync', {})
+                    break
+        finally:
+            ticket_feed.unsubscribe(subscriber)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def ticket_export(request):
+    """
+    Admin export of tickets as CSV or JSONL (?format=csv|jsonl), streamed one
+    Firestore page at a time. Filters: from/to (created_at, YYYY-MM-DD),
+    status, agent; gzip=1 compresses the stream.
+    """
+    user_role, user_uid, denied = await plain_caller(request)
+    if denied:
+        return denied
+
+    if user_role != 'admin':
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=403)
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ['csv', 'jsonl']:
+        return JsonResponse({'error': {'code': 'INVALID_FORMAT', 'message': 'Format must be csv or jsonl'}}, status=400)
+
+    try:
+        date_from = parse_date(request.GET.get('from'))
+        date_to = parse_date(request.GET.get('to'), end=True)
+    except ValueError:
+        return JsonResponse({'error': {'code': 'INVALID_DATE', 'message': 'Dates must be YYYY-MM-DD'}}, status=400)
+
+    pages = iter_ticket_pages(date_from, date_to, request.GET.get('status'), request.GET.get('agent'))
+    if export_format == 'csv':
+        chunks = csv_chunks(pages)
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        chunks = jsonl_chunks(pages, serialize_firestore_doc)
+        content_type = 'application/x-ndjson'
+    filename = f'tickets.{export_format}'
+    if request.GET.get('gzip') in ['1', 'true']:
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    async def body():
+        # Each next() reads one Firestore page; run it off the event loop.
+        # An async iterator also stops Django from buffering the whole export.
+        next_chunk = sync_to_async(next, thread_sensitive=False)
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    response = StreamingHttpResponse(body(), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def ticket_attachment(request, ticket_id, digest):
+    """
+    Download one of a ticket's attachments. Streams the blob in chunks;
+    a single `Range: bytes=...` range is answered with 206. Blobs are
+    content-addressed, so the digest is a strong ETag and never changes.
+    """
+    user_role, user_uid, denied = await plain_caller(request)
+    if denied:
+        return denied
+
+    not_found = JsonResponse({'error': {'code': 'NOT_FOUND', 'message': 'Attachment not found'}}, status=404)
+    if not DIGEST_PATTERN.match(digest):
+        return not_found
+
+    ticket, _ = await sync_to_async(load_ticket)(ticket_id)
+    if ticket is None:
+        return not_found
+    if user_role == 'user' and ticket['created_by'] != user_uid:
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Access denied'}}, status=403)
+    if user_role == 'agent' and ticket.get('assigned_to') != user_uid:
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'You can only view assigned tickets'}}, status=403)
+
+    # Only blobs referenced by this ticket, so a digest alone doesn't grant access
+    reference = next((ref for ref in ticket.get('attachments', []) if ref.get('sha256') == digest), None)
+    if reference is None:
+        return not_found
+
+    etag = f'"{digest}"'
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, max-age=31536000, immutable',
+        'X-Content-Type-Options': 'nosniff',
+    }
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    try:
+        size = await sync_to_async(attachment_store.size)(digest)
+    except FileNotFoundError:
+        logger.error('Attachment blob missing', extra={'ticket_id': ticket_id, 'sha256': digest})
+        return not_found
+
+    # If-Range: a range only applies to the version the client already has part of
+    if_range = request.headers.get('If-Range')
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size) if not if_range or if_range == etag else None
+    except RangeNotSatisfiable:
+        response = JsonResponse({'error': {'code': 'RANGE_NOT_SATISFIABLE', 'message': 'Requested range is outside the file'}}, status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    chunks = attachment_store.iter_range(digest, start, end)
+
+    async def body():
+        # File reads run off the event loop, one chunk at a time
+        next_chunk = sync_to_async(next, thread_sensitive=False)
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    response = StreamingHttpResponse(body(), status=206 if byte_range else 200,
+                                     content_type=reference.get('content_type') or 'application/octet-stream')
+    for key, value in headers.items():
+        response[key] = value
+    response['Content-Length'] = str(end - start + 1 if size else 0)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Disposition'] = disposition(reference)
+    return response
+
+
+# Expensive admin reads: async views, so a request waiting on another's
+# computation holds no thread while it waits
+sla_report_flight = SingleFlight('sla_report')
+users_flight = SingleFlight('users')
+users_view = UsersView.as_view()
+
+
+async def coalesced(flight, key, fn, *args):
+    """fn(*args) in a worker thread, run once for the concurrent requests with this key"""
+    compute = sync_to_async(fn, thread_sensitive=False)
+    return await flight.do_async(key, lambda: compute(*args))
+
+
+async def sla_report(request):
+    """Open tickets past their SLA deadline, plus those marked Breached (admin)"""
+    user_role, user_uid, denied = await plain_caller(request)
+    if denied:
+        return denied
+
+    if user_role != 'admin':
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=403)
+
+    cache_key, cached = await sync_to_async(response_cache.lookup)('sla_report', user_role, {}, depends=['tickets'])
+    if cached is not None:
+        return JsonResponse(cached)
+
+    # Admins opening Reports together share one scan
+    return JsonResponse(await coalesced(sla_report_flight, cache_key, breached_report, cache_key))
+
+
+def breached_report(cache_key):
+    # Get all tickets and check SLA breach dynamically
+    tickets_ref = db.collection('tickets').stream()
+    breached = []
+    for doc in tickets_ref:
+        ticket = doc.to_dict()
+        ticket['id'] = doc.id
+
+        # Check if ticket has breached SLA (only for open/in-progress tickets)
+        if ticket.get('status') in ['Open', 'In Progress', 'Escalated'] and 'sla_deadline' in ticket:
+            try:
+                if datetime.now() > ticket['sla_deadline'].replace(tzinfo=None):
+                    ticket['sla_breached'] = True
+                    breached.append(ticket)
+            except (AttributeError, TypeError):
+                # Handle timezone issues gracefully
+                pass
+        # Also include tickets that are already marked as Breached
+        elif ticket.get('status') == 'Breached':
+            ticket['sla_breached'] = True
+            breached.append(ticket)
+
+    data = {'breached_tickets': breached, 'count': len(breached)}
+    response_cache.store(cache_key, data)
+    return data
+
+
+async def dashboard_summary(request):
+    """
+    Landing-page counts for admins: /api/dashboard/summary/
+    Totals by status and priority, open tickets per agent and SLA breaches,
+    from count() aggregations (a few reads each) cached for a few seconds.
+    """
+    user_role, user_uid, denied = await plain_caller(request)
+    if denied:
+        return denied
+
+    if user_role != 'admin':
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Admin only'}}, status=403)
+
+    return JsonResponse(await get_summary(refresh=request.GET.get('refresh') == 'true'))
+
+
+async def users(request):
+    """
+    GET /api/users/: the user directory (admins), or the agent list
+    (?role=agent, for agents). Other methods go to UsersView.
+    """
+    if request.method != 'GET':
+        return await sync_to_async(users_view)(request)
+
+    user_role, user_uid, denied = await plain_caller(request, role_param='user_role')
+    if denied:
+        return denied
+    filter_role = request.GET.get('role', None)
+
+    # Allow agents to fetch agent list only (for filtering), admins can fetch all
+    if user_role == 'agent':
+        # Agents can only fetch agent list
+        if filter_role != 'agent':
+            return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Agents can only fetch agent list'}}, status=403)
+    elif user_role != 'admin':
+        # Regular users can't access this endpoint
+        return JsonResponse({'error': {'code': 'FORBIDDEN', 'message': 'Admin or agent only'}}, status=403)
+
+    cache_key, cached = await sync_to_async(response_cache.lookup)('users', user_role, {'role': filter_role}, depends=['users'])
+    if cached is not None:
+        return JsonResponse(cached)
+
+    return JsonResponse(await coalesced(users_flight, cache_key, UsersView.list_users, cache_key, filter_role))
+
+
+# UsersView.post is exempt through DRF; the check runs before this view dispatches
+users.csrf_exempt = True
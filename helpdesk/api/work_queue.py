@@ -0,0 +1,56 @@
+"""
+Work-order queue for agents and admins
+Tickets store a numeric priority_rank (Critical=0 ... Low=3) so "what next"
+is one indexed query: open tickets ordered by priority_rank, sla_deadline,
+created_at instead of a full download sorted in the browser.
+"""
+
+from .counters import OPEN_STATUSES
+from .firebase_config import db
+
+PRIORITY_RANK = {'Critical': 0, 'High': 1, 'Medium': 2, 'Low': 3}
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Page size for backfill scans (also the Firestore batch write limit)
+PAGE_SIZE = 500
+
+
+def priority_rank(priority):
+    """Unknown priorities sort after Low"""
+    return PRIORITY_RANK.get(priority, len(PRIORITY_RANK))
+
+
+def next_tickets(assignee=None, limit=DEFAULT_LIMIT):
+    """Open tickets in work order, optionally only those assigned to one agent/admin"""
+    query = db.collection('tickets').where('status', 'in', OPEN_STATUSES)
+    if assignee:
+        query = query.where('assigned_to', '==', assignee)
+    query = query.order_by('priority_rank').order_by('sla_deadline').order_by('created_at')
+    return list(query.limit(limit).stream())
+
+
+def backfill_priority_rank(dry_run=False):
+    """Set priority_rank on tickets written before it existed (or with a stale value); returns how many"""
+    fixed = 0
+    query = db.collection('tickets').order_by('__name__').limit(PAGE_SIZE)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        if not page:
+            break
+        last = page[-1]
+        batch = db.batch()
+        pending = 0
+        for doc in page:
+            ticket = doc.to_dict()
+            rank = priority_rank(ticket.get('priority'))
+            if ticket.get('priority_rank') != rank:
+                batch.update(doc.reference, {'priority_rank': rank})
+                pending += 1
+        if pending and not dry_run:
+            batch.commit()
+        fixed += pending
+        if len(page) < PAGE_SIZE:
+            break
+    return fixed
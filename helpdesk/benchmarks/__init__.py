@@ -0,0 +1,6 @@
+"""
+Offline microbenchmarks for the HelpDesk API hot paths
+Runs against the in-memory Firestore stand-in (FIRESTORE_BACKEND=memory) and
+reports latency plus Firestore reads/writes/queries per operation.
+See benchmarks/run.py for usage.
+"""
@@ -0,0 +1,138 @@
+"""
+Synthetic datasets for benchmarks
+Deterministic (seeded) users and tickets shaped like the documents the API
+writes, bulk-loaded straight into the in-memory Firestore.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+FIRST_NAMES = ['john', 'jane', 'alex', 'maria', 'li', 'sam', 'priya', 'omar', 'eva', 'noah']
+LAST_NAMES = ['smith', 'khan', 'garcia', 'chen', 'jones', 'patel', 'mueller', 'rossi', 'kim', 'singh']
+PRIORITIES = ['Low', 'Medium', 'High', 'Critical']
+SLA_HOURS = {'Low': 48, 'Medium': 24, 'High': 12, 'Critical': 4}
+PRIORITY_RANK = {'Critical': 0, 'High': 1, 'Medium': 2, 'Low': 3}
+CATEGORIES = ['General', 'Technical', 'Billing', 'Account', 'Feature Request']
+# (status, weight) - roughly what a mature helpdesk looks like
+STATUSES = [('Open', 30), ('In Progress', 15), ('Escalated', 5), ('Resolved', 30), ('Closed', 20)]
+SUBJECTS = ['printer', 'vpn', 'password reset', 'invoice', 'login', 'email sync', 'laptop', 'wifi', 'export', 'dashboard']
+
+# LSH bands per ticket (api.duplicates.BANDS)
+DEDUPE_BANDS = 8
+
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def parse_size(label):
+    label = label.strip().lower()
+    if label in SIZES:
+        return SIZES[label]
+    return int(label)
+
+
+def make_users(n_users, n_agents, n_admins, rng):
+    """Returns {uid: user_data} with unique usernames and sequential custom_uids"""
+    users = {}
+    seen = {}
+    counters = {'user': 0, 'agent': 0, 'admin': 0}
+    prefix = {'user': ('U', 6), 'agent': ('AG', 5), 'admin': ('AD', 3)}
+    roles = ['admin'] * n_admins + ['agent'] * n_agents + ['user'] * n_users
+    created = datetime(2024, 1, 1)
+    for i, role in enumerate(roles):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        base = f'{first}{last}'
+        count = seen.get(base, 0)
+        seen[base] = count + 1
+        username = base if count == 0 else f'{base}{count:02d}' if count < 100 else f'{base}{count}'
+        counters[role] += 1
+        letters, digits = prefix[role]
+        data = {
+            'email': f'{username}@example.com',
+            'role': role,
+            'name': f'{first.title()} {last.title()}',
+            'custom_uid': f'{letters}{str(counters[role]).zfill(digits)}',
+            'username': username,
+            'created_at': created + timedelta(minutes=i),
+            'active_tickets': 0,
+            'total_resolved': 0,
+            'is_active': True,
+        }
+        if role in ['agent', 'admin']:
+            data['verified'] = True
+        users[f'uid{i:08d}'] = data
+    return users
+
+
+def make_tickets(n_tickets, users, rng, now=None):
+    """Returns {doc_id: ticket_data}"""
+    now = now or datetime.now()
+    agents = [uid for uid, u in users.items() if u['role'] == 'agent']
+    customers = [uid for uid, u in users.items() if u['role'] == 'user']
+    status_pool = [status for status, weight in STATUSES for _ in range(weight)]
+    tickets = {}
+    span = timedelta(days=365).total_seconds()
+    for i in range(n_tickets):
+        priority = rng.choice(PRIORITIES)
+        status = rng.choice(status_pool)
+        subject = rng.choice(SUBJECTS)
+        creator = rng.choice(customers)
+        agent = rng.choice(agents)
+        created_at = now - timedelta(seconds=rng.random() * span)
+        timeline = [
+            {'action': 'created', 'timestamp': created_at, 'user': creator},
+            {'action': 'auto_assigned', 'timestamp': created_at, 'user': agent,
+             'comment': f"Automatically assigned to {users[agent]['username']}"},
+        ]
+        if rng.random() < 0.5:
+            timeline.append({'action': 'commented', 'timestamp': created_at + timedelta(hours=1), 'user': agent,
+                             'username': users[agent]['username'], 'comment': f'Looking into the {subject} issue'})
+        ticket = {
+            'ticket_id': f'T{str(i + 1).zfill(9)}',
+            'title': f'{subject.title()} problem #{i}',
+            'description': f'Having trouble with {subject} since this morning',
+            'priority': priority,
+            'priority_rank': PRIORITY_RANK[priority],
+            'category': rng.choice(CATEGORIES),
+            'status': status,
+            'assigned_to': agent,
+            'created_by': creator,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'version': 1,
+            'sla_deadline': created_at + timedelta(hours=SLA_HOURS[priority]),
+            'timeline': timeline,
+            'idempotency_key': None,
+            'transfer_history': [],
+            'feedback': None,
+            'rating': None,
+            'contact': None,
+            'github': None,
+            'reopen_count': 0,
+        }
+        if status in ['Resolved', 'Closed']:
+            ticket['dedupe_bands'] = []
+        else:
+            # Random keys stand in for a corpus of distinct texts (the templated
+            # titles above would all land in the same buckets)
+            ticket['dedupe_bands'] = [(band << 32) | rng.getrandbits(32) for band in range(DEDUPE_BANDS)]
+        if status in ['Resolved', 'Closed']:
+            ticket['resolved_at'] = created_at + timedelta(hours=rng.random() * SLA_HOURS[priority] * 1.5)
+            ticket['resolved_by'] = agent
+        if status == 'Closed':
+            ticket['closed_at'] = ticket['resolved_at'] + timedelta(hours=1)
+        tickets[f'doc{i:09d}'] = ticket
+    return tickets
+
+
+def seed(db, n_tickets, seed_value=42):
+    """Reset the in-memory Firestore and load a dataset sized for n_tickets"""
+    rng = random.Random(seed_value)
+    n_users = max(100, n_tickets // 20)
+    n_agents = max(10, n_tickets // 2000)
+    n_admins = 5
+    users = make_users(n_users, n_agents, n_admins, rng)
+    tickets = make_tickets(n_tickets, users, rng)
+    db.reset()
+    db.load('users', users)
+    db.load('tickets', tickets)
+    return {'users': users, 'tickets': tickets}
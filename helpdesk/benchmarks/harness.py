@@ -0,0 +1,113 @@
+"""
+Timing and Firestore-cost measurement, JSON baselines and comparison
+"""
+
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+
+
+def measure(fn, db, repeat=5, budget=10.0):
+    """
+    Run fn up to `repeat` times (stopping early once `budget` seconds are spent).
+    fn may return an int - the number of operations it performed - so cheap
+    calls can be looped inside one run; any other return value counts as one
+    operation. All figures are per operation.
+    """
+    timings = []
+    ops = 0
+    before = db.stats.snapshot()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        inner = result if type(result) is int and result > 0 else 1
+        elapsed = time.perf_counter() - t0
+        timings.append(elapsed / inner)
+        ops += inner
+        if time.perf_counter() - started > budget:
+            break
+    after = db.stats.snapshot()
+
+    timings.sort()
+    p95_index = min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))
+    return {
+        'runs': len(timings),
+        'ops': ops,
+        'min_ms': timings[0] * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[p95_index] * 1000,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'reads_per_op': (after['reads'] - before['reads']) / ops,
+        'writes_per_op': (after['writes'] - before['writes']) / ops,
+        'queries_per_op': (after['queries'] - before['queries']) / ops,
+    }
+
+
+def save(results, path, sizes):
+    payload = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': sizes,
+        },
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Rows for benchmarks present in both runs. A row is a regression when the
+    median latency grows by more than `threshold` or Firestore reads/writes grow.
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        old, new = baseline[name], current[name]
+        ratio = new['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        regressed = (
+            ratio > 1 + threshold
+            or new['reads_per_op'] > old['reads_per_op']
+            or new['writes_per_op'] > old['writes_per_op']
+        )
+        rows.append({
+            'name': name,
+            'old_ms': old['median_ms'],
+            'new_ms': new['median_ms'],
+            'ratio': ratio,
+            'old_reads': old['reads_per_op'],
+            'new_reads': new['reads_per_op'],
+            'regressed': regressed,
+        })
+    return rows
+
+
+def format_results(results):
+    lines = [f"{'benchmark':<40} {'median ms':>12} {'p95 ms':>12} {'reads/op':>12} {'writes/op':>10} {'queries/op':>10}"]
+    for name in sorted(results):
+        r = results[name]
+        lines.append(
+            f"{name:<40} {r['median_ms']:>12.4f} {r['p95_ms']:>12.4f} {r['reads_per_op']:>12.1f} "
+            f"{r['writes_per_op']:>10.1f} {r['queries_per_op']:>10.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = [f"{'benchmark':<40} {'base ms':>12} {'now ms':>12} {'ratio':>8} {'base reads':>11} {'now reads':>11}"]
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        lines.append(
+            f"{row['name']:<40} {row['old_ms']:>12.4f} {row['new_ms']:>12.4f} {row['ratio']:>8.2f} "
+            f"{row['old_reads']:>11.1f} {row['new_reads']:>11.1f}{flag}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,103 @@
+"""
+Memory benchmark: raw Firestore dicts vs api.models records
+
+Usage (from the helpdesk/ directory):
+    python -m benchmarks.memory --sizes 10k,100k
+
+Each document is pickled and unpickled on its own first, so every string and
+timestamp is a separate object as it is when the client decodes a response
+(the synthetic dataset shares them). Reports traced bytes per ticket and
+per user for plain dicts, records with the timeline still raw, and records
+with the timeline and transfer history decoded, plus the time to convert
+decoded documents (measured separately, without tracing).
+"""
+
+import argparse
+import gc
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+
+
+def decoded(documents):
+    return {doc_id: pickle.loads(pickle.dumps(data)) for doc_id, data in documents.items()}
+
+
+def traced(build):
+    """Bytes still held by build()'s result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return size
+
+
+def timed(convert, documents):
+    documents = decoded(documents)
+    gc.collect()
+    started = time.perf_counter()
+    result = convert(documents)
+    elapsed = time.perf_counter() - started
+    del result
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.memory', description='Ticket/user memory footprint')
+    parser.add_argument('--sizes', default='100k', help='Comma-separated dataset sizes (1k,10k,100k,1m)')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'helpdesk_project.settings')
+    import django
+    django.setup()
+
+    from api.models import Ticket, User
+    from . import datasets
+
+    def dicts(documents):
+        return [dict(data, id=doc_id) for doc_id, data in documents.items()]
+
+    def records(documents, cls):
+        return [cls.from_dict(doc_id, data) for doc_id, data in documents.items()]
+
+    def records_decoded(documents):
+        tickets = records(documents, Ticket)
+        for ticket in tickets:
+            ticket.timeline
+            ticket.transfer_history
+        return tickets
+
+    print(f"{'representation':<36}{'bytes/doc':>12}{'vs dict':>10}{'convert us/doc':>16}")
+    for size in [s.strip() for s in args.sizes.split(',') if s.strip()]:
+        n_tickets = datasets.parse_size(size)
+        rng = random.Random(42)
+        users = datasets.make_users(max(100, n_tickets // 20), max(10, n_tickets // 2000), 5, rng)
+        print(f'Building {n_tickets} tickets...', file=sys.stderr)
+        tickets = decoded(datasets.make_tickets(n_tickets, users, rng))
+        users = decoded(users)
+
+        rows = [
+            (f'tickets@{size} dict', tickets, dicts),
+            (f'tickets@{size} Ticket (lazy timeline)', tickets, lambda documents: records(documents, Ticket)),
+            (f'tickets@{size} Ticket (decoded)', tickets, records_decoded),
+            (f'users@{size} dict', users, dicts),
+            (f'users@{size} User', users, lambda documents: records(documents, User)),
+        ]
+        baseline = None
+        for name, documents, convert in rows:
+            per_doc = traced(lambda: convert(decoded(documents))) / len(documents)
+            if name.endswith(' dict'):
+                baseline = per_doc
+            per_doc_us = timed(convert, documents) / len(documents) * 1e6
+            print(f'{name:<36}{per_doc:>12.0f}{per_doc / baseline:>9.2f}x{per_doc_us:>16.2f}')
+        del tickets, users
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark runner
+
+Usage (from the helpdesk/ directory):
+    python -m benchmarks --sizes 1k,100k --output baseline.json
+    python -m benchmarks --sizes 1k,100k --compare baseline.json
+    python -m benchmarks --sizes 1m --only sla_report,generate_ticket_id
+
+Sizes: 1k, 10k, 100k, 1m or a plain number of tickets. The 1m dataset needs
+several GB of RAM. --compare exits with status 1 when a benchmark regressed.
+"""
+
+import argparse
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='HelpDesk API microbenchmarks')
+    parser.add_argument('--sizes', default='1k,100k', help='Comma-separated dataset sizes (1k,10k,100k,1m)')
+    parser.add_argument('--only', default='', help='Comma-separated benchmark names to run')
+    parser.add_argument('--repeat', type=int, default=5, help='Max runs per benchmark')
+    parser.add_argument('--budget', type=float, default=10.0, help='Max seconds per benchmark')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed median slowdown before flagging (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    # Must be set before the api package imports firebase_config
+    os.environ['FIRESTORE_BACKEND'] = 'memory'
+    # Side effects are timed by the outbox benchmark, not in the request paths
+    os.environ['OUTBOX_WORKER'] = 'off'
+    # Benchmarks call the views with role/uid query params
+    os.environ['AUTH_ALLOW_QUERY_PARAMS'] = 'true'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'helpdesk_project.settings')
+    import django
+    django.setup()
+
+    from api.firebase_config import db
+    from . import datasets, harness
+    from .suite import BENCHMARKS
+
+    selected = [name for name in BENCHMARKS if not args.only or name in args.only.split(',')]
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    results = {}
+    unscaled_done = set()
+
+    for size in sizes:
+        n_tickets = datasets.parse_size(size)
+        print(f'Seeding {n_tickets} tickets...', file=sys.stderr)
+        dataset = datasets.seed(db, n_tickets)
+        for name in selected:
+            spec = BENCHMARKS[name]
+            if not spec['scales']:
+                if name in unscaled_done:
+                    continue
+                unscaled_done.add(name)
+                key = name
+            else:
+                key = f'{name}@{size}'
+            fn = spec['setup'](dataset)
+            results[key] = harness.measure(fn, db, repeat=args.repeat, budget=args.budget)
+            print(f'  {key}: {results[key]["median_ms"]:.4f} ms', file=sys.stderr)
+        del dataset
+
+    print(harness.format_results(results))
+
+    if args.output:
+        harness.save(results, args.output, sizes)
+        print(f'\nSaved results to {args.output}')
+
+    if args.compare:
+        rows = harness.compare(harness.load(args.compare), results, args.threshold)
+        print()
+        print(harness.format_comparison(rows))
+        if any(row['regressed'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Benchmark definitions for the api/views.py hot paths
+Each benchmark is setup(dataset) -> callable; the callable runs one operation
+(or returns how many it looped over). `scales` marks benchmarks that depend on
+the dataset size; the others run once regardless of --sizes.
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from google.api_core.exceptions import ServiceUnavailable
+from rest_framework.test import APIRequestFactory
+
+from api import analytics, views
+from api.export import csv_chunks, gzip_chunks, iter_ticket_pages
+from api.duplicates import band_keys, find_duplicates
+from api.firebase_config import db
+from api.firestore_guard import breaker
+from api.memory_firestore import FaultInjector
+from api.middleware import RateLimitMiddleware
+from api.outbox import drain, record_event
+from api.structured_logging import AsyncQueueHandler, JsonFormatter
+from api.user_search import user_search
+
+factory = APIRequestFactory()
+
+BENCHMARKS = {}
+
+
+def benchmark(name, scales=True):
+    def register(setup):
+        BENCHMARKS[name] = {'setup': setup, 'scales': scales}
+        return setup
+    return register
+
+
+def first_uid(dataset, role):
+    return next(uid for uid, user in dataset['users'].items() if user['role'] == role)
+
+
+@benchmark('generate_ticket_id')
+def bench_generate_ticket_id(dataset):
+    return views.generate_ticket_id
+
+
+@benchmark('generate_uid')
+def bench_generate_uid(dataset):
+    return lambda: views.generate_uid('user')
+
+
+@benchmark('generate_username')
+def bench_generate_username(dataset):
+    # Common name so the uniqueness loop has to probe past existing suffixes
+    return lambda: views.generate_username('John Smith', 'john.smith@example.com')
+
+
+@benchmark('serialize_firestore_doc', scales=False)
+def bench_serialize(dataset):
+    ticket = next(iter(dataset['tickets'].values()))
+
+    def run():
+        for _ in range(1000):
+            views.serialize_firestore_doc(ticket)
+        return 1000
+    return run
+
+
+def uncached(run):
+    # Measure the compute path, not the response cache
+    def wrapper():
+        caches['responses'].clear()
+        return run()
+    return wrapper
+
+
+@benchmark('ticket_list_search_admin')
+def bench_ticket_list_search(dataset):
+    view = views.TicketListView.as_view()
+    admin = first_uid(dataset, 'admin')
+    return uncached(lambda: view(factory.get('/api/tickets/', {'role': 'admin', 'uid': admin, 'search': 'printer'})))
+
+
+@benchmark('ticket_list_user')
+def bench_ticket_list_user(dataset):
+    view = views.TicketListView.as_view()
+    user = first_uid(dataset, 'user')
+    return lambda: view(factory.get('/api/tickets/', {'role': 'user', 'uid': user}))
+
+
+@benchmark('assign_to_best_agent')
+def bench_assign(dataset):
+    view = views.TicketListView()
+    return lambda: view.assign_to_best_agent('Medium')
+
+
+@benchmark('work_queue_agent')
+def bench_work_queue(dataset):
+    view = views.TicketQueueView.as_view()
+    agent = first_uid(dataset, 'agent')
+    return lambda: view(factory.get('/api/tickets/queue/', {'role': 'agent', 'uid': agent, 'limit': 20}))
+
+
+@benchmark('duplicate_lookup')
+def bench_duplicate_lookup(dataset):
+    # A cluster of near-identical outage tickets among the dataset's open tickets
+    title = 'VPN down in Berlin office'
+    description = 'Nobody in the Berlin office can connect to the VPN since 9am, error 809'
+    for i in range(20):
+        text = f'{description} (report {i})'
+        db.collection('tickets').document(f'dup{i:04d}').set({
+            'ticket_id': f'D{i:09d}', 'title': title, 'description': text, 'status': 'Open',
+            'assigned_to': first_uid(dataset, 'agent'), 'dedupe_bands': band_keys(title, text),
+        })
+    # Build the stand-in's array index outside the timed runs
+    find_duplicates(title, description)
+    return lambda: find_duplicates(title, description)
+
+
+@benchmark('dashboard_summary')
+def bench_dashboard_summary(dataset):
+    view = async_to_sync(views.dashboard_summary)
+    admin = first_uid(dataset, 'admin')
+    return lambda: view(factory.get('/api/dashboard/summary/', {'role': 'admin', 'uid': admin, 'refresh': 'true'}))
+
+
+@benchmark('sla_report')
+def bench_sla_report(dataset):
+    view = async_to_sync(views.sla_report)
+    admin = first_uid(dataset, 'admin')
+    return uncached(lambda: view(factory.get('/api/reports/sla/', {'role': 'admin', 'uid': admin})))
+
+
+@benchmark('sla_report_cached')
+def bench_sla_report_cached(dataset):
+    # Repeated dashboard load with no writes in between
+    view = async_to_sync(views.sla_report)
+    admin = first_uid(dataset, 'admin')
+    view(factory.get('/api/reports/sla/', {'role': 'admin', 'uid': admin}))
+    return lambda: view(factory.get('/api/reports/sla/', {'role': 'admin', 'uid': admin}))
+
+
+@benchmark('user_search')
+def bench_user_search(dataset):
+    # Admin lookups against the in-memory index (built outside the timed
+    # runs): prefix, two words, a typo, an email and a custom_uid
+    view = views.UserSearchView.as_view()
+    admin = first_uid(dataset, 'admin')
+    user_search.rebuild()
+    user = dataset['users'][first_uid(dataset, 'user')]
+    queries = ['jo', user['name'], user['username'][:-2] + 'xq', user['email'], user['custom_uid']]
+
+    def run():
+        for query in queries:
+            view(factory.get('/api/users/search/', {'user_role': 'admin', 'uid': admin, 'q': query}))
+        return len(queries)
+    return run
+
+
+@benchmark('outbox_deliver', scales=False)
+def bench_outbox_deliver(dataset):
+    # Record a page of ticket.created events, then apply them as the worker would
+    agent = first_uid(dataset, 'agent')
+
+    def run():
+        batch = db.batch()
+        for _ in range(100):
+            record_event(batch, 'ticket.created', 'T000000001', {'workload': {agent: 1}})
+        batch.commit()
+        return drain()
+    return run
+
+
+@benchmark('firestore_brownout', scales=False)
+def bench_firestore_brownout(dataset):
+    # Document reads while 30% of Firestore calls fail; one op per read that
+    # succeeded (retries recover all but ~3%)
+    refs = [db.collection('users').document(uid) for uid in list(dataset['users'])[:100]]
+    faults = FaultInjector(error_rate=0.3, seed=7)
+
+    def run():
+        breaker.reset()
+        db._target.set_fault_hook(faults)
+        succeeded = 0
+        try:
+            for ref in refs:
+                try:
+                    ref.get()
+                    succeeded += 1
+                except ServiceUnavailable:
+                    pass
+        finally:
+            db._target.set_fault_hook(None)
+        return succeeded
+    return run
+
+
+@benchmark('rate_limit_middleware', scales=False)
+def bench_rate_limit(dataset):
+    middleware = RateLimitMiddleware(lambda request: HttpResponse())
+    requests = [factory.get('/api/tickets/', REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}') for i in range(1000)]
+
+    def run():
+        cache.clear()
+        for request in requests:
+            middleware(request)
+        return len(requests)
+    return run
+
+
+@benchmark('ticket_export_csv_gzip')
+def bench_ticket_export(dataset):
+    # Full export through the streaming pipeline; one op per exported ticket
+    def run():
+        exported = 0
+
+        def pages():
+            nonlocal exported
+            for page in iter_ticket_pages():
+                exported += len(page)
+                yield page
+        for _ in gzip_chunks(csv_chunks(pages())):
+            pass
+        return exported
+    return run
+
+
+@benchmark('analytics_reports')
+def bench_analytics_reports(dataset):
+    # Resolution percentiles, SLA compliance by category/week and agent
+    # throughput over a snapshot of the dataset; one op per ticket covered
+    directory = tempfile.mkdtemp(prefix='helpdesk-analytics-')
+    snapshot = analytics.Snapshot(os.path.join(directory, analytics.build_snapshot(directory)['name']))
+
+    def run():
+        for report, by in (('resolution', 'agent'), ('sla', 'category'), ('throughput', None)):
+            analytics.run_report(report, by=by, snapshot=snapshot)
+        return snapshot.rows
+    return run
+
+
+# Seconds each log line takes to write, standing in for a pipe to a log
+# shipper or a disk; os.devnull costs nothing and hides the writes the queue
+# handler moves off the request thread
+LOG_WRITE_LATENCY = 0.0001
+
+
+class SlowLogSink:
+    """Log stream whose writes take LOG_WRITE_LATENCY"""
+
+    def write(self, text):
+        time.sleep(LOG_WRITE_LATENCY)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _log_loop(logger):
+    def run():
+        for i in range(1000):
+            logger.info('Login attempt', extra={'role': 'agent', 'verified': True, 'attempt': i})
+        return 1000
+    return run
+
+
+@benchmark('logging_queue_handler', scales=False)
+def bench_logging_queue(dataset):
+    # Request-path cost: enqueue only, JSON formatting runs on the listener thread
+    logger = logging.getLogger('benchmarks.logging.queue')
+    logger.handlers = [AsyncQueueHandler(max_queue=100000, stream=SlowLogSink())]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return _log_loop(logger)
+
+
+@benchmark('logging_sync_stream', scales=False)
+def bench_logging_sync(dataset):
+    # For comparison: formatting and writing on the request thread
+    logger = logging.getLogger('benchmarks.logging.sync')
+    handler = logging.StreamHandler(SlowLogSink())
+    handler.setFormatter(JsonFormatter())
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return _log_loop(logger)
+
+
+@benchmark('logging_disabled_level', scales=False)
+def bench_logging_disabled(dataset):
+    # Production default (WARNING): info calls are filtered before any work
+    logger = logging.getLogger('benchmarks.logging.disabled')
+    logger.handlers = [AsyncQueueHandler(stream=SlowLogSink())]
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+    return _log_loop(logger)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,9 +47,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',  # Outermost: request latency + Firestore ops per route
+    'api.structured_logging.RequestLoggingMiddleware',  # Request ID + JSON access log
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'api.middleware.RateLimitMiddleware',  # Rate limiting for API endpoints
+    'api.firestore_guard.DeadlineMiddleware',  # Per-request Firestore deadline, 503 when the circuit is open
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -127,7 +131,7 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Whitenoise for static files in production
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+MIDDLEWARE.insert(3, 'whitenoise.middleware.WhiteNoiseMiddleware')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Default primary key field type
@@ -146,11 +150,56 @@ CACHES = {
     }
 }
 
+# Response cache for expensive read endpoints (api/response_cache.py)
+# In-process by default; set RESPONSE_CACHE_URL (redis://...) to share it between workers
+RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL')
+if RESPONSE_CACHE_URL:
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': RESPONSE_CACHE_URL,
+        'KEY_PREFIX': 'helpdesk',
+    }
+else:
+    CACHES['responses'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000
+        }
+    }
+
+# Structured logging: records go through a bounded queue to a background JSON writer
+# LOG_LEVEL defaults to WARNING in production so info/debug calls cost almost nothing
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG' if DEBUG else 'WARNING')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queue': {
+            '()': 'api.structured_logging.AsyncQueueHandler',
+            'max_queue': 10000,
+            'sample_rate': os.environ.get('LOG_SAMPLE_RATE', '1.0'),  # Fraction of info/debug records kept
+        },
+    },
+    'loggers': {
+        'helpdesk': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'if-match', 'if-none-match', 'x-request-id')
+CORS_EXPOSE_HEADERS = ['etag', 'x-request-id']
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    # Role/verification come from Firebase ID token claims (api/authentication.py)
+    'DEFAULT_AUTHENTICATION_CLASSES': ['api.authentication.FirebaseAuthentication'],
+    'EXCEPTION_HANDLER': 'api.authentication.exception_handler',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_THROTTLE_CLASSES': [
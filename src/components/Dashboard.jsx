@@ -3,8 +3,8 @@ import axios from 'axios';
 import { Link, useSearchParams } from 'react-router-dom';
 import { useAuth } from '../AuthContext';
 import { API_BASE_URL } from '../config';
-import { onSnapshot, collection, doc, getDoc } from 'firebase/firestore';
-import { db } from '../firebase';
+import { currentIdToken } from '../firebase';
+import { fetchUserDisplays } from '../userLookup';
 import Toast from './Toast';
 import './Dashboard.css';
 
@@ -12,7 +12,9 @@ const Dashboard = () => {
   const { user, logout } = useAuth();
   const [searchParams] = useSearchParams();
   const [tickets, setTickets] = useState([]);
+  const [count, setCount] = useState(0);
   const [search, setSearch] = useState('');
+  const [query, setQuery] = useState('');
   const [page, setPage] = useState(1);
   const [showCreate, setShowCreate] = useState(false);
   const [newTicket, setNewTicket] = useState({ title: '', description: '', priority: 'Medium', category: 'General' });
@@ -28,6 +30,21 @@ const Dashboard = () => {
     setTimeout(() => setToast({ message: '', type: '' }), 3000);
   }, []);
 
+  // Any filter change starts again from the first page
+  const changeFilters = (next) => {
+    setFilters(next);
+    setPage(1);
+  };
+
+  // Search runs on the server - wait for a pause in typing before reconnecting
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setQuery(search.trim());
+      setPage(1);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
   // Real-time timer updates every second
   useEffect(() => {
     const interval = setInterval(() => {
@@ -36,173 +53,132 @@ const Dashboard = () => {
     return () => clearInterval(interval);
   }, []);
 
-  // Helper function to fetch user details and format display
-  const getUserDisplay = useCallback(async (uid) => {
-    if (!uid) return 'Unassigned';
-    if (userCache[uid]) return userCache[uid];
-    
+  // Fetch display names for any uids not cached yet - one batch request
+  const loadUserDisplays = useCallback(async (uids) => {
+    const missing = uids.filter(uid => uid && !userCache[uid]);
+    if (missing.length === 0) return;
     try {
-      const userDoc = await getDoc(doc(db, 'users', uid));
-      if (userDoc.exists()) {
-        const userData = userDoc.data();
-        const username = userData.username || userData.email?.split('@')[0] || 'User';
-        const customUid = userData.custom_uid || uid.substring(0, 8);
-        // custom_uid already includes role prefix like "User-U000001" or "AG00001"
-        const display = `@${username} (${customUid})`;
-        setUserCache(prev => ({ ...prev, [uid]: display }));
-        return display;
-      }
+      const displays = await fetchUserDisplays(missing);
+      setUserCache(prev => ({ ...prev, ...displays }));
     } catch (error) {
-      console.error('Error fetching user:', error);
+      console.error('Error fetching users:', error);
     }
-    return uid;
   }, [userCache]);
 
-  // Fetch user details for all tickets
+  // Display for created_by / assigned_to: prefer the snapshot stored on the ticket
+  const userDisplay = useCallback((ticket, field) => {
+    const snapshot = ticket[`${field}_display`];
+    if (snapshot) return `@${snapshot.username} (${snapshot.custom_uid || ticket[field].substring(0, 8)})`;
+    return userCache[ticket[field]];
+  }, [userCache]);
+
+  // Fetch user details only for older tickets without display snapshots
   useEffect(() => {
+    const uids = [];
     tickets.forEach(ticket => {
-      if (ticket.created_by) getUserDisplay(ticket.created_by);
-      if (ticket.assigned_to) getUserDisplay(ticket.assigned_to);
+      if (!ticket.created_by_display) uids.push(ticket.created_by);
+      if (!ticket.assigned_to_display) uids.push(ticket.assigned_to);
     });
-  }, [tickets, getUserDisplay]);
+    loadUserDisplays(uids);
+  }, [tickets, loadUserDisplays]);
 
-  // Fetch tickets with real-time updates from Firestore
-  const fetchTickets = useCallback(() => {
-    if (!user) return () => {};
-    
-    const q = collection(db, 'tickets');
-    const unsubscribe = onSnapshot(q, (querySnapshot) => {
-      const allTickets = [];
-      querySnapshot.forEach((doc) => {
-        const ticket = doc.data();
-        ticket.id = doc.id;
-        allTickets.push(ticket);
+  // Live ticket feed from the backend (SSE) - role scoping, every filter, search and paging are applied server-side
+  useEffect(() => {
+    if (!user) return undefined;
+
+    // Timestamps arrive as unix seconds; wrap them so existing toDate() rendering keeps working
+    const reviveTimestamps = (ticket) => {
+      ['created_at', 'updated_at', 'resolved_at', 'closed_at', 'completed_at'].forEach(field => {
+        if (typeof ticket[field] === 'number') {
+          const seconds = ticket[field];
+          ticket[field] = { toDate: () => new Date(seconds * 1000) };
+        }
       });
-      // Filter based on role and params
-      let filtered = allTickets;
-      console.log('User role:', user.role, 'Total tickets:', allTickets.length);
-      
-      if (user.role === 'user') {
-        filtered = allTickets.filter(t => t.created_by === user.uid);
-        console.log('User filtered tickets:', filtered.length, 'User UID:', user.uid);
-      } else if (user.role === 'agent' && searchParams.get('assigned') === 'true') {
-        filtered = allTickets.filter(t => t.assigned_to === user.uid);
-        console.log('Agent assigned tickets:', filtered.length);
-      } else {
-        console.log('Showing all tickets for role:', user.role);
-      }
-      
-      // UNIVERSAL SEARCH: ticket_id, title, description, category, username, date
-      if (search) {
-        const searchLower = search.toLowerCase();
-        filtered = filtered.filter(t => {
-          // Basic fields
-          const matchesBasic = 
-            (t.ticket_id || '').toLowerCase().includes(searchLower) ||
-            (t.title || '').toLowerCase().includes(searchLower) ||
-            (t.description || '').toLowerCase().includes(searchLower) ||
-            (t.category || '').toLowerCase().includes(searchLower) ||
-            (t.priority || '').toLowerCase().includes(searchLower) ||
-            (t.status || '').toLowerCase().includes(searchLower);
-          
-          // Username search - check userCache for formatted display
-          const createdByDisplay = userCache[t.created_by] || '';
-          const assignedToDisplay = userCache[t.assigned_to] || '';
-          const matchesUsername = 
-            createdByDisplay.toLowerCase().includes(searchLower) ||
-            assignedToDisplay.toLowerCase().includes(searchLower);
-          
-          // Date search - allow searching by formatted date
-          let matchesDate = false;
-          if (t.created_at) {
-            const ticketDate = t.created_at?.toDate ? t.created_at.toDate() : new Date(t.created_at);
-            const dateStr = ticketDate.toLocaleDateString();
-            const dateTimeStr = ticketDate.toLocaleString();
-            matchesDate = dateStr.includes(searchLower) || dateTimeStr.toLowerCase().includes(searchLower);
-          }
-          
-          return matchesBasic || matchesUsername || matchesDate;
-        });
-      }
-      
-      // Apply filters
-      if (filters.priority) {
-        filtered = filtered.filter(t => t.priority === filters.priority);
-      }
-      if (filters.status) {
-        filtered = filtered.filter(t => t.status === filters.status);
-      }
-      if (filters.category) {
-        filtered = filtered.filter(t => t.category === filters.category);
-      }
-      if (filters.agent) {
-        filtered = filtered.filter(t => t.assigned_to === filters.agent);
-      }
-      // Date range filter
-      if (filters.dateFrom) {
-        const fromDate = new Date(filters.dateFrom);
-        filtered = filtered.filter(t => {
-          const ticketDate = t.created_at?.toDate ? t.created_at.toDate() : new Date(t.created_at || 0);
-          return ticketDate >= fromDate;
-        });
-      }
-      if (filters.dateTo) {
-        const toDate = new Date(filters.dateTo);
-        toDate.setHours(23, 59, 59, 999);
-        filtered = filtered.filter(t => {
-          const ticketDate = t.created_at?.toDate ? t.created_at.toDate() : new Date(t.created_at || 0);
-          return ticketDate <= toDate;
-        });
-      }
-      // SLA status filter
-      if (filters.slaStatus) {
-        const now = new Date();
-        filtered = filtered.filter(t => {
-          let deadline;
-          if (typeof t.sla_deadline === 'number') {
-            deadline = new Date(t.sla_deadline * 1000);
-          } else if (t.sla_deadline?.toDate) {
-            deadline = t.sla_deadline.toDate();
-          } else {
-            deadline = new Date(t.sla_deadline);
-          }
-          const diff = deadline - now;
-          const hours = diff / (1000 * 60 * 60);
-          
-          if (filters.slaStatus === 'overdue') return diff <= 0;
-          if (filters.slaStatus === 'at-risk') return hours > 0 && hours <= 4;
-          if (filters.slaStatus === 'on-time') return hours > 4;
-          return true;
-        });
-      }
-      // Sort: Critical priority first, then by newest date
-      const priorityOrder = { 'Critical': 4, 'High': 3, 'Medium': 2, 'Low': 1 };
-      filtered.sort((a, b) => {
+      return ticket;
+    };
+
+    const params = new URLSearchParams({
+      role: user.role,
+      uid: user.uid,
+      assigned: searchParams.get('assigned') || '',
+      status: filters.status,
+      priority: filters.priority,
+      category: filters.category,
+      agent: filters.agent,
+      sla: filters.slaStatus,
+      from: filters.dateFrom,
+      to: filters.dateTo,
+      search: query,
+      page
+    });
+    const ticketMap = new Map();
+
+    // Sort: Critical priority first, then by newest date (the server's page order)
+    const priorityOrder = { 'Critical': 4, 'High': 3, 'Medium': 2, 'Low': 1 };
+    const publish = () => {
+      const sorted = Array.from(ticketMap.values());
+      sorted.sort((a, b) => {
         const priorityDiff = (priorityOrder[b.priority] || 0) - (priorityOrder[a.priority] || 0);
         if (priorityDiff !== 0) return priorityDiff;
         const dateA = a.created_at?.toDate ? a.created_at.toDate() : new Date(a.created_at || 0);
         const dateB = b.created_at?.toDate ? b.created_at.toDate() : new Date(b.created_at || 0);
         return dateB - dateA;
       });
-      // Simple pagination
-      const start = (page - 1) * 10;
-      const end = start + 10;
-      setTickets(filtered.slice(start, end));
-      setLoading(false);
-    }, () => {
-      showToast('Failed to load tickets');
-      setLoading(false);
-    });
-    return unsubscribe;
-  }, [search, page, user, searchParams, showToast, filters]);
+      setTickets(sorted);
+    };
+    let source;
+    let closed = false;
 
-  // Set up real-time listener on component mount
-  useEffect(() => {
-    if (user) {
-      const unsubscribe = fetchTickets();
-      return () => unsubscribe();
-    }
-  }, [fetchTickets, user]);
+    const connect = async () => {
+      // EventSource can't send headers, so the ID token goes in the query string
+      const token = await currentIdToken();
+      if (closed) return;
+      if (token) params.set('token', token);
+      source = new EventSource(`${API_BASE_URL}/api/tickets/stream/?${params}`);
+      source.addEventListener('snapshot', (e) => {
+        const snapshot = JSON.parse(e.data);
+        ticketMap.clear();
+        snapshot.tickets.forEach(ticket => ticketMap.set(ticket.id, reviveTimestamps(ticket)));
+        setCount(snapshot.count);
+        publish();
+        setLoading(false);
+      });
+      source.addEventListener('change', (e) => {
+        const change = JSON.parse(e.data);
+        if (change.type === 'removed') {
+          ticketMap.delete(change.id);
+        } else {
+          ticketMap.set(change.id, reviveTimestamps(change.ticket));
+        }
+        publish();
+      });
+      source.addEventListener('resync', () => {
+        source.close();
+        connect();
+      });
+      // The ID token ran out - reconnect with a fresh one
+      source.addEventListener('expired', () => {
+        source.close();
+        connect();
+      });
+      source.addEventListener('denied', (e) => {
+        source.close();
+        showToast(JSON.parse(e.data).message);
+        setLoading(false);
+      });
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+          showToast('Failed to load tickets');
+          setLoading(false);
+        }
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  }, [user, searchParams, filters, query, page, showToast]);
 
   // Fetch agents list for filter dropdown
   useEffect(() => {
@@ -228,10 +204,15 @@ const Dashboard = () => {
       return;
     }
     try {
-      await axios.post(`${API_BASE_URL}/api/tickets/`, newTicket, { params: { uid: user.uid } });
+      const response = await axios.post(`${API_BASE_URL}/api/tickets/`, newTicket, { params: { uid: user.uid } });
       setNewTicket({ title: '', description: '', priority: 'Medium', category: 'General' });
       setShowCreate(false);
-      showToast('Ticket created successfully', 'success');
+      const duplicates = response.data.possible_duplicates || [];
+      if (duplicates.length > 0) {
+        showToast(`Ticket created - looks similar to ${duplicates.map(d => d.ticket_id).join(', ')}`, 'success');
+      } else {
+        showToast('Ticket created successfully', 'success');
+      }
     } catch {
       showToast('Failed to create ticket');
     }
@@ -313,35 +294,35 @@ const Dashboard = () => {
         </div>
 
         <div className="filters-expanded">
-          <select value={filters.priority} onChange={(e) => setFilters({ ...filters, priority: e.target.value })}>
+          <select value={filters.priority} onChange={(e) => changeFilters({ ...filters, priority: e.target.value })}>
             <option value="">All Priorities</option>
             <option value="Low">Low</option>
             <option value="Medium">Medium</option>
             <option value="High">High</option>
             <option value="Critical">Critical</option>
           </select>
-          <select value={filters.status} onChange={(e) => setFilters({ ...filters, status: e.target.value })}>
+          <select value={filters.status} onChange={(e) => changeFilters({ ...filters, status: e.target.value })}>
             <option value="">All Status</option>
             <option value="Open">Open</option>
             <option value="In Progress">In Progress</option>
             <option value="Resolved">Resolved</option>
             <option value="Closed">Closed</option>
           </select>
-          <select value={filters.category} onChange={(e) => setFilters({ ...filters, category: e.target.value })}>
+          <select value={filters.category} onChange={(e) => changeFilters({ ...filters, category: e.target.value })}>
             <option value="">All Categories</option>
             <option value="General">General</option>
             <option value="Technical">Technical</option>
             <option value="Payment">Payment</option>
             <option value="Support">Support</option>
           </select>
-          <select value={filters.slaStatus} onChange={(e) => setFilters({ ...filters, slaStatus: e.target.value })}>
+          <select value={filters.slaStatus} onChange={(e) => changeFilters({ ...filters, slaStatus: e.target.value })}>
             <option value="">All SLA Status</option>
             <option value="on-time">On Time</option>
             <option value="at-risk">At Risk (&lt;4h)</option>
             <option value="overdue">Overdue</option>
           </select>
           {(user.role === 'agent' || user.role === 'admin') && (
-            <select value={filters.agent} onChange={(e) => setFilters({ ...filters, agent: e.target.value })}>
+            <select value={filters.agent} onChange={(e) => changeFilters({ ...filters, agent: e.target.value })}>
               <option value="">All Agents</option>
               {agents.map(agent => (
                 <option key={agent.uid} value={agent.uid}>
@@ -353,20 +334,20 @@ const Dashboard = () => {
           <input
             type="date"
             value={filters.dateFrom}
-            onChange={(e) => setFilters({ ...filters, dateFrom: e.target.value })}
+            onChange={(e) => changeFilters({ ...filters, dateFrom: e.target.value })}
             placeholder="From Date"
             className="date-filter"
           />
           <input
             type="date"
             value={filters.dateTo}
-            onChange={(e) => setFilters({ ...filters, dateTo: e.target.value })}
+            onChange={(e) => changeFilters({ ...filters, dateTo: e.target.value })}
             placeholder="To Date"
             className="date-filter"
           />
           {(filters.priority || filters.status || filters.category || filters.slaStatus || filters.agent || filters.dateFrom || filters.dateTo) && (
             <button 
-              onClick={() => setFilters({ priority: '', status: '', category: '', slaStatus: '', agent: '', dateFrom: '', dateTo: '' })}
+              onClick={() => changeFilters({ priority: '', status: '', category: '', slaStatus: '', agent: '', dateFrom: '', dateTo: '' })}
               className="clear-filters-btn"
             >
               Clear Filters
@@ -541,8 +522,8 @@ const Dashboard = () => {
                       <span className={`priority-badge priority-${ticket.priority.toLowerCase()}`}>{ticket.priority}</span>
                     </td>
                     <td className="td-category">{ticket.category}</td>
-                    <td className="td-assigned">{userCache[ticket.assigned_to] || 'Unassigned'}</td>
-                    <td className="td-contact">{userCache[ticket.created_by] || 'Unknown'}</td>
+                    <td className="td-assigned">{(ticket.assigned_to && userDisplay(ticket, 'assigned_to')) || 'Unassigned'}</td>
+                    <td className="td-contact">{(ticket.created_by && userDisplay(ticket, 'created_by')) || 'Unknown'}</td>
                     <td className="td-sla">
                       <span className={`sla-timer ${isOverdue ? 'sla-overdue' : ''}`}>
                         {timeRemaining}
@@ -558,7 +539,7 @@ const Dashboard = () => {
       <div className="pagination">
         <button onClick={() => setPage(page - 1)} disabled={page === 1}>Prev</button>
         <span>Page {page}</span>
-        <button onClick={() => setPage(page + 1)}>Next</button>
+        <button onClick={() => setPage(page + 1)} disabled={page * 10 >= count}>Next</button>
       </div>
     </div>
     </>
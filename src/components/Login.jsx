@@ -59,6 +59,8 @@ const Login = () => {
         const loginData = await loginResponse.json();
         
         if (loginResponse.ok) {
+          // Claims were just set on the account; fetch a token that carries them
+          if (loginData.claims_updated) await userCredential.user.getIdToken(true);
           const userData = { 
             uid: loginData.uid, 
             role: loginData.role, 
@@ -88,6 +90,7 @@ const Login = () => {
         const data = await response.json();
         
         if (response.ok) {
+          if (data.claims_updated) await userCredential.user.getIdToken(true);
           const userData = { 
             uid: data.uid, 
             role: data.role, 
@@ -2,36 +2,22 @@ import { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
 import { useAuth } from '../AuthContext';
 import { API_BASE_URL } from '../config';
-import { collection, getDocs, query, where, doc, getDoc } from 'firebase/firestore';
-import { db } from '../firebase';
+import { collection, getDocs, query, where } from 'firebase/firestore';
+import { db, currentIdToken } from '../firebase';
+import { fetchUserDisplays } from '../userLookup';
 import './Reports.css';
 
 const Reports = () => {
   const { user } = useAuth();
   const [report, setReport] = useState(null);
+  const [summary, setSummary] = useState(null);
   const [activeReport, setActiveReport] = useState('overview');
   const [loading, setLoading] = useState(true);
   const [tickets, setTickets] = useState([]);
   const [dateRange, setDateRange] = useState({ from: '', to: '' });
   const [userCache, setUserCache] = useState({});
+  const [satisfaction, setSatisfaction] = useState(null);
 
-  // Fetch user display info
-  const getUserDisplay = useCallback(async (uid) => {
-    if (userCache[uid]) return userCache[uid];
-    
-    try {
-      const userDoc = await getDoc(doc(db, 'users', uid));
-      if (userDoc.exists()) {
-        const userData = userDoc.data();
-        const displayName = `@${userData.username || userData.email?.split('@')[0]} (${userData.custom_uid || uid})`;
-        setUserCache(prev => ({ ...prev, [uid]: displayName }));
-        return displayName;
-      }
-    } catch (error) {
-      console.error('Failed to fetch user:', error);
-    }
-    return uid;
-  }, [userCache]);
 
   const fetchAllTickets = useCallback(async () => {
     try {
@@ -44,14 +30,14 @@ const Reports = () => {
       setTickets(ticketsList);
       
       // Fetch user info for all assigned agents
-      const agentIds = [...new Set(ticketsList.map(t => t.assigned_to).filter(Boolean))];
-      agentIds.forEach(agentId => getUserDisplay(agentId));
+      const displays = await fetchUserDisplays(ticketsList.map(t => t.assigned_to));
+      setUserCache(prev => ({ ...prev, ...displays }));
     } catch (error) {
       console.error('Failed to fetch tickets:', error);
     } finally {
       setLoading(false);
     }
-  }, [getUserDisplay]);
+  }, []);
 
   const fetchSLAReport = useCallback(async () => {
     try {
@@ -62,12 +48,35 @@ const Reports = () => {
     }
   }, [user]);
 
+  const fetchSummary = useCallback(async () => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/dashboard/summary/`, { params: { role: user.role, uid: user.uid } });
+      setSummary(response.data);
+    } catch (error) {
+      console.error(error);
+    }
+  }, [user]);
+
+  // Running aggregates kept by the backend; no need to scan rated tickets
+  const fetchSatisfaction = useCallback(async () => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/reports/satisfaction/`, { params: { role: user.role, uid: user.uid } });
+      setSatisfaction(response.data);
+      const displays = await fetchUserDisplays(Object.keys(response.data.agents));
+      setUserCache(prev => ({ ...prev, ...displays }));
+    } catch (error) {
+      console.error(error);
+    }
+  }, [user]);
+
   useEffect(() => {
     if (user && user.role === 'admin') {
       fetchAllTickets();
+      fetchSummary();
+      fetchSatisfaction();
       if (activeReport === 'sla') fetchSLAReport();
     }
-  }, [user, activeReport, fetchAllTickets, fetchSLAReport]);
+  }, [user, activeReport, fetchAllTickets, fetchSummary, fetchSatisfaction, fetchSLAReport]);
 
   // Calculate ticket volume by date
   const getTicketVolumeData = () => {
@@ -155,18 +164,19 @@ const Reports = () => {
 
   // Customer satisfaction
   const getSatisfactionData = () => {
-    const ratedTickets = tickets.filter(t => t.rating);
-    if (ratedTickets.length === 0) return { average: 'N/A', count: 0, distribution: {} };
-    
-    const totalRating = ratedTickets.reduce((sum, t) => sum + t.rating, 0);
-    const avgRating = (totalRating / ratedTickets.length).toFixed(2);
-    
-    const distribution = { 5: 0, 4: 0, 3: 0, 2: 0, 1: 0 };
-    ratedTickets.forEach(t => {
-      distribution[t.rating] = (distribution[t.rating] || 0) + 1;
-    });
-    
-    return { average: avgRating, count: ratedTickets.length, distribution };
+    const overall = satisfaction?.overall;
+    if (!overall || overall.count === 0) return { average: 'N/A', count: 0, csat: null, distribution: {}, agents: [] };
+
+    const agents = Object.entries(satisfaction.agents)
+      .filter(([, stats]) => stats.count > 0)
+      .sort((a, b) => b[1].mean - a[1].mean);
+    return {
+      average: overall.mean.toFixed(2),
+      count: overall.count,
+      csat: overall.csat,
+      distribution: overall.histogram,
+      agents
+    };
   };
 
   const exportToCSV = (reportType) => {
@@ -201,6 +211,19 @@ const Reports = () => {
     a.click();
   };
 
+  // Full export is streamed by the backend instead of being built from loaded tickets
+  const exportAllTickets = async (format) => {
+    const params = new URLSearchParams({ role: user.role, uid: user.uid, format });
+    // Download links can't send headers, so the ID token goes in the query string
+    const token = await currentIdToken();
+    if (token) params.set('token', token);
+    if (dateRange.from) params.set('from', dateRange.from);
+    if (dateRange.to) params.set('to', dateRange.to);
+    const a = document.createElement('a');
+    a.href = `${API_BASE_URL}/api/tickets/export/?${params}`;
+    a.click();
+  };
+
   if (!user || user.role !== 'admin') return <div>Access denied. Admin only.</div>;
   if (loading) return <div className="loading">Loading reports...</div>;
 
@@ -258,18 +281,27 @@ const Reports = () => {
       {/* Overview Report */}
       {activeReport === 'overview' && (
         <div className="report-content">
+          <div className="report-header">
+            <h3>All Tickets</h3>
+            <div>
+              <button onClick={() => exportAllTickets('csv')} className="export-btn">📥 Export CSV</button>
+              <button onClick={() => exportAllTickets('jsonl')} className="export-btn">📥 Export JSONL</button>
+            </div>
+          </div>
           <div className="overview-grid">
             <div className="stat-card">
               <h3>Total Tickets</h3>
-              <p className="stat-number">{tickets.length}</p>
+              <p className="stat-number">{summary ? summary.total : tickets.length}</p>
             </div>
             <div className="stat-card">
               <h3>Open Tickets</h3>
-              <p className="stat-number">{tickets.filter(t => t.status === 'Open').length}</p>
+              <p className="stat-number">{summary ? summary.by_status.Open : tickets.filter(t => t.status === 'Open').length}</p>
             </div>
             <div className="stat-card">
               <h3>Resolved Tickets</h3>
-              <p className="stat-number">{tickets.filter(t => t.status === 'Resolved' || t.status === 'Closed').length}</p>
+              <p className="stat-number">
+                {summary ? summary.by_status.Resolved + summary.by_status.Closed : tickets.filter(t => t.status === 'Resolved' || t.status === 'Closed').length}
+              </p>
             </div>
             <div className="stat-card">
               <h3>Avg Resolution Time</h3>
@@ -284,7 +316,7 @@ const Reports = () => {
             </div>
             <div className="stat-card">
               <h3>SLA Breached</h3>
-              <p className="stat-number">{report?.count || 0}</p>
+              <p className="stat-number">{summary ? summary.breached : report?.count || 0}</p>
             </div>
           </div>
         </div>
@@ -427,6 +459,12 @@ const Reports = () => {
               <p>Average Rating</p>
               <small>{satisfactionData.count} total ratings</small>
             </div>
+            {satisfactionData.csat !== null && (
+              <div className="big-stat">
+                <h2>{satisfactionData.csat}%</h2>
+                <p>CSAT (4-5 stars)</p>
+              </div>
+            )}
           </div>
           <table className="data-table">
             <thead>
@@ -446,6 +484,30 @@ const Reports = () => {
               ))}
             </tbody>
           </table>
+          {satisfactionData.agents.length > 0 && (
+            <table className="data-table">
+              <thead>
+                <tr>
+                  <th>Agent</th>
+                  <th>Ratings</th>
+                  <th>Average</th>
+                  <th>Std Dev</th>
+                  <th>CSAT</th>
+                </tr>
+              </thead>
+              <tbody>
+                {satisfactionData.agents.map(([uid, stats]) => (
+                  <tr key={uid}>
+                    <td>{userCache[uid] || uid}</td>
+                    <td>{stats.count}</td>
+                    <td>{stats.mean.toFixed(2)}</td>
+                    <td>{Math.sqrt(stats.variance).toFixed(2)}</td>
+                    <td>{stats.csat}%</td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          )}
         </div>
       )}
     </div>
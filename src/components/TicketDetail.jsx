@@ -3,11 +3,15 @@ import { useParams, Link } from 'react-router-dom';
 import axios from 'axios';
 import { useAuth } from '../AuthContext';
 import { API_BASE_URL } from '../config';
-import { onSnapshot, doc, getDoc } from 'firebase/firestore';
-import { db } from '../firebase';
+import { onSnapshot, doc } from 'firebase/firestore';
+import { db, currentIdToken } from '../firebase';
+import { fetchUserDisplays } from '../userLookup';
 import Toast from './Toast';
 import './TicketDetail.css';
 
+// Optimistic locking: the ticket's ETag (id + version) goes in If-Match
+const ifMatch = (ticket) => (ticket ? { 'If-Match': `W/"${ticket.id}-v${ticket.version}"` } : {});
+
 const TicketDetail = () => {
   const { id } = useParams();
   const { user } = useAuth();
@@ -34,50 +38,43 @@ const TicketDetail = () => {
   const [showGithubForm, setShowGithubForm] = useState(false);
   const [replyTo, setReplyTo] = useState(null); // For threading: stores parent event index
   const [replyText, setReplyText] = useState(''); // Reply comment text
+  const [uploading, setUploading] = useState(false);
 
   const showToast = useCallback((message, type = 'error') => {
     setToast({ message, type });
     setTimeout(() => setToast({ message: '', type: '' }), 3000);
   }, []);
 
-  // Helper function to fetch and format user display
-  const getUserDisplay = useCallback(async (uid) => {
-    if (!uid) return 'Unassigned';
-    if (userCache[uid]) return userCache[uid];
-    
+  // Fetch display names for any uids not cached yet - one batch request
+  const loadUserDisplays = useCallback(async (uids) => {
+    const missing = uids.filter(uid => uid && !userCache[uid]);
+    if (missing.length === 0) return;
     try {
-      const userDoc = await getDoc(doc(db, 'users', uid));
-      if (userDoc.exists()) {
-        const userData = userDoc.data();
-        const username = userData.username || userData.email?.split('@')[0] || 'User';
-        const customUid = userData.custom_uid || uid.substring(0, 8);
-        // custom_uid already includes role prefix like "User-U000001" or "AG00001"
-        const display = `@${username} (${customUid})`;
-        setUserCache(prev => ({ ...prev, [uid]: display }));
-        return display;
-      }
+      const displays = await fetchUserDisplays(missing);
+      setUserCache(prev => ({ ...prev, ...displays }));
     } catch (error) {
-      console.error('Error fetching user:', error);
+      console.error('Error fetching users:', error);
     }
-    return uid;
   }, [userCache]);
 
   const addTimelineEvent = useCallback(async (action) => {
     try {
-      await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, { comment: action, version: ticket?.version }, { params: { role: user?.role, uid: user?.uid } });
+      await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, { comment: action }, { params: { role: user?.role, uid: user?.uid }, headers: ifMatch(ticket) });
     } catch {
       // Silent fail for timeline events
     }
-  }, [id, ticket?.version, user?.role, user?.uid]);
+  }, [id, ticket, user?.role, user?.uid]);
 
   const fetchAgents = useCallback(async () => {
     try {
-      const response = await axios.get('${API_BASE_URL}/api/users/?role=admin');
-      setAgents(response.data.users.filter(u => u.role === 'agent'));
+      const response = await axios.get(`${API_BASE_URL}/api/users/`, {
+        params: { role: 'agent', user_role: user?.role, uid: user?.uid }
+      });
+      setAgents(response.data.users || []);
     } catch {
       showToast('Failed to fetch agents');
     }
-  }, [showToast]);
+  }, [showToast, user?.role, user?.uid]);
 
   const fetchTicket = useCallback(() => {
     const docRef = doc(db, 'tickets', id);
@@ -115,16 +112,14 @@ const TicketDetail = () => {
   // Fetch user display names for ticket participants
   useEffect(() => {
     if (ticket) {
-      if (ticket.created_by) getUserDisplay(ticket.created_by);
-      if (ticket.assigned_to) getUserDisplay(ticket.assigned_to);
-      if (ticket.resolved_by) getUserDisplay(ticket.resolved_by);
-      if (ticket.timeline) {
-        ticket.timeline.forEach(entry => {
-          if (entry.user) getUserDisplay(entry.user);
-        });
-      }
+      loadUserDisplays([
+        ticket.created_by,
+        ticket.assigned_to,
+        ticket.resolved_by,
+        ...(ticket.timeline || []).map(entry => entry.user)
+      ]);
     }
-  }, [ticket, getUserDisplay]);
+  }, [ticket, loadUserDisplays]);
 
   // Timer for SLA countdown
   useEffect(() => {
@@ -260,17 +255,14 @@ const TicketDetail = () => {
     }
     try {
       // If replying to an event, include parent_id
-      const commentData = { 
-        comment, 
-        version: ticket.version 
-      };
+      const commentData = { comment };
       
       // Add reply metadata if this is a reply
       if (replyTo !== null) {
         commentData.reply_to = replyTo; // Index of parent event in timeline
       }
       
-      await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, commentData, { params: { role: user.role, uid: user.uid } });
+      await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, commentData, { params: { role: user.role, uid: user.uid }, headers: ifMatch(ticket) });
       setComment('');
       setReplyTo(null); // Reset reply state
     } catch {
@@ -288,10 +280,9 @@ const TicketDetail = () => {
         `${API_BASE_URL}/api/tickets/${id}/`, 
         { 
           comment: replyText, 
-          version: ticket.version,
           reply_to: parentIndex
         }, 
-        { params: { role: user.role, uid: user.uid } }
+        { params: { role: user.role, uid: user.uid }, headers: ifMatch(ticket) }
       );
       showToast('Reply added successfully', 'success');
       setReplyText('');
@@ -322,8 +313,8 @@ const TicketDetail = () => {
   const updateTicket = async () => {
     try {
       // Only send status update, NOT assigned_to (manual reassignment is separate)
-      const updates = { status, version: ticket.version };
-      await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, updates, { params: { role: user.role, uid: user.uid } });
+      const updates = { status };
+      await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, updates, { params: { role: user.role, uid: user.uid }, headers: ifMatch(ticket) });
       showToast('Ticket updated successfully', 'success');
     } catch {
       showToast('Failed to update ticket');
@@ -397,8 +388,8 @@ const TicketDetail = () => {
     }
     try {
       await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, 
-        { contact, version: ticket.version }, 
-        { params: { role: user.role, uid: user.uid } }
+        { contact }, 
+        { params: { role: user.role, uid: user.uid }, headers: ifMatch(ticket) }
       );
       showToast('Contact added successfully', 'success');
       setShowContactForm(false);
@@ -415,8 +406,8 @@ const TicketDetail = () => {
     }
     try {
       await axios.patch(`${API_BASE_URL}/api/tickets/${id}/`, 
-        { github, version: ticket.version }, 
-        { params: { role: user.role, uid: user.uid } }
+        { github }, 
+        { params: { role: user.role, uid: user.uid }, headers: ifMatch(ticket) }
       );
       showToast('GitHub link added successfully', 'success');
       setShowGithubForm(false);
@@ -426,6 +417,37 @@ const TicketDetail = () => {
     }
   };
 
+  const uploadAttachment = async (file) => {
+    if (!file) return;
+    const form = new FormData();
+    form.append('file', file);
+    setUploading(true);
+    try {
+      await axios.post(`${API_BASE_URL}/api/tickets/${id}/attachments/`, form,
+        { params: { role: user.role, uid: user.uid } }
+      );
+      showToast('File attached', 'success');
+    } catch (error) {
+      showToast(error.response?.data?.error?.message || 'Failed to attach file');
+    } finally {
+      setUploading(false);
+    }
+  };
+
+  const openAttachment = async (attachment) => {
+    const params = new URLSearchParams({ role: user.role, uid: user.uid });
+    // Download links can't send headers, so the ID token goes in the query string
+    const token = await currentIdToken();
+    if (token) params.set('token', token);
+    window.open(`${API_BASE_URL}/api/tickets/${id}/attachments/${attachment.sha256}/?${params}`, '_blank');
+  };
+
+  const formatSize = (bytes) => {
+    if (bytes < 1024) return `${bytes} B`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+    return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+  };
+
   if (!user) return <div>Please login</div>;
   if (!ticket) return <div className="loading">Loading...</div>;
 
@@ -590,6 +612,8 @@ const TicketDetail = () => {
                       actionText = 'added contact';
                     } else if (entry.action === 'github_added') {
                       actionText = 'linked GitHub';
+                    } else if (entry.action === 'attached') {
+                      actionText = 'attached a file';
                     } else if (entry.action === 'rating_submitted') {
                       actionText = 'rated ticket';
                     } else {
@@ -996,6 +1020,32 @@ const TicketDetail = () => {
             </div>
             )}
 
+            {/* Attachments - stored once per content, the ticket only keeps references */}
+            {(user.role === 'admin' || ticket.assigned_to === user.uid || ticket.created_by === user.uid) && (
+            <div className="sidebar-section">
+              <div className="sidebar-label">Attachments</div>
+              {(ticket.attachments || []).map(attachment => (
+                <button
+                  key={`${attachment.sha256}-${attachment.name}`}
+                  onClick={() => openAttachment(attachment)}
+                  className="btn-link attachment-link"
+                  title={attachment.name}
+                >
+                  {attachment.name} <span className="attachment-size">({formatSize(attachment.size)})</span>
+                </button>
+              ))}
+              <label className="btn-link attachment-upload">
+                {uploading ? 'Uploading...' : 'Attach File'}
+                <input
+                  type="file"
+                  hidden
+                  disabled={uploading}
+                  onChange={(e) => { uploadAttachment(e.target.files[0]); e.target.value = ''; }}
+                />
+              </label>
+            </div>
+            )}
+
             {(user.role === 'agent' || user.role === 'admin') && (
               <div className="sidebar-actions">
                 <select value={status} onChange={(e) => setStatus(e.target.value)} className="sidebar-select">
@@ -1090,8 +1140,8 @@ const TicketDetail = () => {
                     try {
                       await axios.patch(
                         `${API_BASE_URL}/api/tickets/${id}/`, 
-                        { status: 'Open', version: ticket.version }, 
-                        { params: { role: user.role, uid: user.uid } }
+                        { status: 'Open' }, 
+                        { params: { role: user.role, uid: user.uid }, headers: ifMatch(ticket) }
                       );
                       showToast('Ticket reopened successfully', 'success');
                     } catch (error) {
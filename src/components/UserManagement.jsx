@@ -13,6 +13,7 @@ const UserManagement = () => {
   const [toast, setToast] = useState({ message: '', type: '' });
   const [searchTerm, setSearchTerm] = useState('');
   const [filterRole, setFilterRole] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
 
   const showToast = (message, type = 'error') => {
     setToast({ message, type });
@@ -44,6 +45,28 @@ const UserManagement = () => {
     }
   };
 
+  // Searches run on the server's user index, not over the loaded list
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (user?.role !== 'admin' || !term) {
+      setSearchResults(null);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API_BASE_URL}/api/users/search/`, {
+          params: { q: term, role: filterRole || undefined, limit: 100, user_role: user.role, uid: user.uid }
+        });
+        setSearchResults(response.data.users.map(u => ({ firebaseUid: u.uid, ...u })));
+      } catch (error) {
+        showToast('Search failed');
+        console.error(error);
+      }
+    }, 200);
+    return () => clearTimeout(timer);
+    // users: search again after a change reloads the list
+  }, [searchTerm, filterRole, user, users]);
+
   const updateUserRole = async (firebaseUid, newRole) => {
     try {
       await axios.patch(`${API_BASE_URL}/api/users/${firebaseUid}/role/`, 
@@ -84,16 +107,7 @@ const UserManagement = () => {
     }
   };
 
-  const filteredUsers = users.filter(u => {
-    const matchesSearch = 
-      (u.email?.toLowerCase().includes(searchTerm.toLowerCase())) ||
-      (u.custom_uid?.toLowerCase().includes(searchTerm.toLowerCase())) ||
-      (u.name?.toLowerCase().includes(searchTerm.toLowerCase()));
-    
-    const matchesRole = !filterRole || u.role === filterRole;
-    
-    return matchesSearch && matchesRole;
-  });
+  const filteredUsers = searchResults ?? users.filter(u => !filterRole || u.role === filterRole);
 
   if (user?.role !== 'admin') {
     return (
@@ -124,7 +138,7 @@ const UserManagement = () => {
           </svg>
           <input
             type="text"
-            placeholder="Search by email, name, or UID..."
+            placeholder="Search by email, name, username, or UID..."
             value={searchTerm}
             onChange={(e) => setSearchTerm(e.target.value)}
             className="search-input"
@@ -35,12 +35,15 @@ const Users = () => {
       showToast('Please fill all fields');
       return;
     }
-    // Check for duplicate email
-    if (users.some(u => u.email === newUser.email)) {
-      showToast('User with this email already exists');
-      return;
-    }
     try {
+      // Check for duplicate email
+      const { data } = await axios.get(`${API_BASE_URL}/api/users/search/`, {
+        params: { q: newUser.email, limit: 5, user_role: user.role, uid: user.uid }
+      });
+      if (data.users.some(u => u.email?.toLowerCase() === newUser.email.toLowerCase())) {
+        showToast('User with this email already exists');
+        return;
+      }
       await axios.post(`${API_BASE_URL}/api/users/`, newUser, { params: { role: user.role, uid: user.uid } });
       setNewUser({ email: '', role: 'user' });
       setShowCreate(false);
@@ -1,6 +1,7 @@
 import { initializeApp } from 'firebase/app';
 import { getAuth } from 'firebase/auth';
 import { getFirestore } from 'firebase/firestore';
+import axios from 'axios';
 
 // Firebase configuration from environment variables
 const firebaseConfig = {
@@ -14,4 +15,16 @@ const firebaseConfig = {
 
 const app = initializeApp(firebaseConfig);
 export const auth = getAuth(app);
-export const db = getFirestore(app);
\ No newline at end of file
+export const db = getFirestore(app);
+
+// The API authorizes requests from the ID token's custom claims (role, verified, account_status)
+export const currentIdToken = async () => {
+  await auth.authStateReady();
+  return auth.currentUser ? auth.currentUser.getIdToken() : null;
+};
+
+axios.interceptors.request.use(async (config) => {
+  const token = await currentIdToken();
+  if (token) config.headers.Authorization = `Bearer ${token}`;
+  return config;
+});
\ No newline at end of file
@@ -0,0 +1,18 @@
+import axios from 'axios';
+import { API_BASE_URL } from './config';
+
+// Resolve many users in one request via /api/users/batch/
+// Returns { uid: '@username (custom_uid)' } for every requested uid
+export const fetchUserDisplays = async (uids) => {
+  const unique = [...new Set(uids.filter(Boolean))];
+  if (unique.length === 0) return {};
+
+  const response = await axios.get(`${API_BASE_URL}/api/users/batch/`, { params: { uids: unique.join(',') } });
+  const displays = {};
+  Object.entries(response.data.users || {}).forEach(([uid, userData]) => {
+    displays[uid] = userData
+      ? `@${userData.username || 'User'} (${userData.custom_uid || uid.substring(0, 8)})`
+      : uid;
+  });
+  return displays;
+};